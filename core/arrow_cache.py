@@ -0,0 +1,67 @@
+import os
+from typing import List, Optional
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.ipc as ipc
+
+
+class ArrowMirror:
+    """
+    加工数据的内存映射镜像: 在 {symbol}.parquet 旁边写一份未压缩的 Arrow IPC 文件 ({symbol}.arrow)
+    读取时用 mmap 打开, 数值列直接引用映射的页 (零拷贝、无解压解码),
+    多个进程与多次运行共享操作系统的页缓存. parquet 仍是唯一的数据源, 镜像过期时自动重建
+    """
+
+    SUFFIX = ".arrow"
+    # 记录生成镜像时 parquet 的 (修改时间, 大小), 不一致即视为过期
+    SOURCE_KEY = b"source_parquet"
+
+    @classmethod
+    def path_for(cls, parquet_path: str) -> str:
+        return os.path.splitext(parquet_path)[0] + cls.SUFFIX
+
+    @staticmethod
+    def _fingerprint(parquet_path: str) -> bytes:
+        st = os.stat(parquet_path)
+        return f"{st.st_mtime_ns}:{st.st_size}".encode()
+
+    @classmethod
+    def write(cls, df: pd.DataFrame, parquet_path: str):
+        """根据刚写入的 parquet 生成镜像 (先写临时文件再替换, 读者不会看到半个文件)"""
+        table = pa.Table.from_pandas(df, preserve_index=True)
+        metadata = dict(table.schema.metadata or {})
+        metadata[cls.SOURCE_KEY] = cls._fingerprint(parquet_path)
+        table = table.replace_schema_metadata(metadata)
+
+        path = cls.path_for(parquet_path)
+        tmp_path = path + ".tmp"
+        with pa.OSFile(tmp_path, "wb") as sink:
+            with ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, parquet_path: str, columns: Optional[List[str]] = None) -> Optional[pd.DataFrame]:
+        """
+        以内存映射方式读取镜像
+        :param columns: 只转换这些列 (不存在的列忽略)
+        :return: 镜像不存在或已过期时返回 None
+        """
+        path = cls.path_for(parquet_path)
+        if not os.path.exists(path):
+            return None
+
+        # 离开 with 即关闭文件句柄 (过期时调用方会马上重写该文件); 已转换的列仍持有映射区域的引用, 零拷贝不受影响
+        with pa.memory_map(path, "r") as source:
+            table = ipc.open_file(source).read_all()
+            if (table.schema.metadata or {}).get(cls.SOURCE_KEY) != cls._fingerprint(parquet_path):
+                return None
+
+            if columns is not None:
+                index_cols = [c for c in table.schema.pandas_metadata.get("index_columns", [])
+                              if isinstance(c, str)]
+                keep = set(columns) | set(index_cols)
+                table = table.select([c for c in table.column_names if c in keep])
+            # split_blocks: 每列单独成块, 无空值的数值列可以直接引用映射内存而不合并拷贝
+            return table.to_pandas(split_blocks=True)
@@ -1,112 +1,270 @@
+import os
+from typing import Callable, Iterable
+
 import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
 
+from core.dtypes import compact_frame
+from core.kernels import backtest_kernel, backtest_kernel_batch, new_carry
+from core.resampler import infer_bars_per_year
 from core.risk_manager import RiskManager
+from core.trades import extract_trades, trade_metrics
+
+# run() 在输入数据之后追加的回测结果列 (顺序即输出顺序)
+RESULT_COLUMNS = [
+    "Market_Return",
+    "Position",
+    "Strategy_Return",
+    "Trades",
+    "Cumulative_Return",
+    "Equity_Curve",
+    "Peak",
+    "Drawdown",
+]
+
+# calculate_advanced_metrics 中基于逐笔交易表的指标
+TRADE_METRICS = ["Win Rate", "Profit Factor", "Expectancy", "Avg Hold", "Trade Count"]
 
 
 class BacktestEngine:
-    def __init__(self, initial_capital: float = 100000.0, commission: float = 0.001):
+    def __init__(self, initial_capital: float = 100000.0, commission: float = 0.001,
+                 compact: bool = False, bars_per_year: float = None):
         """
         :param initial_capital: 初始资金
         :param commission: 手续费率（如 0.001 代表 0.1%）
+        :param compact: 紧凑类型模式, 结果中的 Signal/Position 为 int8, 特征列为 float32,
+                        收益、资金曲线等累计量仍为 float64
+        :param bars_per_year: 年化系数 (每年 K 线数), None 表示按结果的时间间隔推断 (日线 252)
         """
         self.initial_capital = initial_capital
         self.commission = commission
+        self.compact = compact
+        self.bars_per_year = bars_per_year
+
+    def annualization(self, results: pd.DataFrame) -> float:
+        """该结果使用的年化系数"""
+        return self.bars_per_year or infer_bars_per_year(results.index)
 
     def run(self, symbol: str, df: pd.DataFrame, pos_size: float = 1.0) -> pd.DataFrame:
         """
         运行回测
         """
-        # 0. 加入风险管理
+        # 0. 加入风险管理 (calculate_atr_exits 内部已复制一份，后续直接在其上写列)
         risk_mgr = RiskManager()
         df = risk_mgr.calculate_atr_exits(df)
 
-        position = 0
-        entry_price = 0
-        stop_loss_price = 0
-        take_profit_price = 0
-
         if "Signal" not in df.columns:
             raise ValueError(f"数据集中缺少 Signal 列，请先运行策略逻辑。")
 
-        signals = df["Signal"].values
-        close_prices = df["Close"].values
-        sl_prices = df["Initial_SL"].values
-        tp_prices = df["Initial_TP"].values
-
-        exit_signals = np.zeros(len(df))
-        for i in range(1, len(df)):
-            # --- 场景 A: 当前持仓，检查是否需要止损或止盈 ---
-            if position == 1:
-                if (
-                    close_prices[i] <= stop_loss_price
-                    or close_prices[i] >= take_profit_price
-                ):
-                    position = 0
-                    exit_signals[i] = -1  # 强制平仓信号
+        # 1. 编译内核单次遍历：止损/止盈状态机、持仓、手续费、资金曲线与回撤
+        out = backtest_kernel(
+            df["Signal"].values,
+            df["Close"].values,
+            df["Initial_SL"].values,
+            df["Initial_TP"].values,
+            pos_size=pos_size,
+            commission=self.commission,
+            initial_capital=self.initial_capital,
+        )
+
+        # 2. 强制平仓点回写为卖出信号，再一次性组装结果列
+        results = df
+        results["Signal"] = np.where(out["Exit"] == -1, -1, results["Signal"].values)
+        for col in RESULT_COLUMNS:
+            results[col] = out[col]
+
+        return compact_frame(results) if self.compact else results
+
+    def run_stream(self, symbol: str, chunks: Iterable[pd.DataFrame], out_path: str,
+                   pos_size: float = 1.0, signal_fn: Callable = None, warmup: int = 0) -> dict:
+        """
+        流式回测: 逐块处理超出内存的长序列 (如分钟线), 结果逐块追加写入 parquet, 峰值内存只与块大小有关
+        持仓、止损/止盈、净值与峰值等状态跨块延续, 拼接后的结果与 run() 对整个序列的结果一致
+        (ATR 由上一块末尾的历史行预热; Wilder 口径的截断误差不超过 EMA_TOLERANCE)
+        :param chunks: 按时间顺序的 DataFrame 块, 如 DataEngine.iter_chunks
+        :param out_path: 结果 parquet 路径, 每块写成一个或多个行组
+        :param signal_fn: 为块生成 Signal 列的函数 (输入输出均为 DataFrame, 行不变);
+                          None 表示块内已有 Signal
+        :param warmup: signal_fn 需要的历史行数, 从上一块末尾带入, 只参与计算不重复输出
+        :return: 汇总 {symbol, path, chunks, rows, final_equity, max_drawdown}
+        """
+        risk_mgr = RiskManager()
+        history = max(risk_mgr.atr_plan().lookback(), warmup)
+        carry = new_carry()
+        tail = None
+        writer = None
+        summary = {"symbol": symbol, "path": out_path, "chunks": 0, "rows": 0,
+                   "final_equity": self.initial_capital, "max_drawdown": 0.0}
+
+        os.makedirs(os.path.dirname(os.path.abspath(out_path)), exist_ok=True)
+        try:
+            for chunk in chunks:
+                n = len(chunk)
+                if n == 0:
                     continue
+                # 0. 上一块末尾的历史行只用于预热 ATR 与信号, 不参与回测与输出
+                frame = chunk if tail is None else pd.concat([tail, chunk])
+                tail = frame.iloc[-history:] if history else None
+                if signal_fn is not None:
+                    frame = signal_fn(frame)
+                if "Signal" not in frame.columns:
+                    raise ValueError("数据集中缺少 Signal 列，请先运行策略逻辑。")
+                frame = risk_mgr.calculate_atr_exits(frame).iloc[-n:]
+
+                # 1. 从上一块结束时的状态继续
+                out = backtest_kernel(
+                    frame["Signal"].values,
+                    frame["Close"].values,
+                    frame["Initial_SL"].values,
+                    frame["Initial_TP"].values,
+                    pos_size=pos_size,
+                    commission=self.commission,
+                    initial_capital=self.initial_capital,
+                    carry=carry,
+                )
+                results = frame.copy()
+                results["Signal"] = np.where(out["Exit"] == -1, -1, results["Signal"].values)
+                for col in RESULT_COLUMNS:
+                    results[col] = out[col]
+                if self.compact:
+                    results = compact_frame(results)
+
+                # 2. 追加写入; 各块的列类型统一为第一块的 schema
+                table = pa.Table.from_pandas(results, preserve_index=True)
+                if writer is None:
+                    writer = pq.ParquetWriter(out_path, table.schema)
+                elif table.schema != writer.schema:
+                    table = table.select(writer.schema.names).cast(writer.schema)
+                writer.write_table(table)
+
+                summary["chunks"] += 1
+                summary["rows"] += n
+                summary["final_equity"] = float(out["Equity_Curve"][-1])
+                summary["max_drawdown"] = min(summary["max_drawdown"], float(np.min(out["Drawdown"])))
+        finally:
+            if writer is not None:
+                writer.close()
+        return summary
 
-            # --- 场景 B: 当前空仓，检查 AI 买入信号 ---
-            if position == 0 and signals[i] == 1:
-                position = 1
-                entry_price = close_prices[i]
-                stop_loss_price = sl_prices[i]
-                take_profit_price = tp_prices[i]
+    @staticmethod
+    def build_panel(signals_dict: dict, fields: list = None) -> dict:
+        """
+        把 {symbol: DataFrame} 对齐成 {field: (日期 x 股票) DataFrame} 面板
+        :param fields: 需要的列，默认取所有股票列的并集 (按出现顺序);
+                       各股票自己的列清单见 panel_columns, 传给 run_batch 以免结果带上其他股票才有的列
+        """
+        symbols = list(signals_dict.keys())
+        if fields is None:
+            fields = []
+            for df in signals_dict.values():
+                fields += [c for c in df.columns if c not in fields]
+
+        # 所有字段共用同一个日期索引 (某些股票缺少的字段整列为 NaN)
+        index = pd.DatetimeIndex([])
+        for df in signals_dict.values():
+            index = index.union(df.index)
+
+        panel = {}
+        for f in fields:
+            wide = pd.concat(
+                {s: df[f] for s, df in signals_dict.items() if f in df.columns}, axis=1
+            )
+            panel[f] = wide.reindex(index=index, columns=symbols)
+        return panel
+
+    @staticmethod
+    def panel_columns(signals_dict: dict) -> dict:
+        """{symbol: 该股票自己的列 (原顺序)}, 配合 build_panel / run_batch 使用"""
+        return {s: list(df.columns) for s, df in signals_dict.items()}
+
+    def run_batch(self, panel: dict, pos_size=1.0, columns: dict = None) -> dict:
+        """
+        批量回测：一次性对整个股票池做 ATR 止损/止盈、持仓、收益、资金曲线与回撤
+        :param panel: {field: (日期 x 股票) DataFrame}，至少包含 Close/High/Low/Signal
+        :param pos_size: 标量，或 {symbol: 仓位} 字典 / 按列顺序的数组
+        :param columns: {symbol: 原始列清单} (见 panel_columns), 每只股票的结果只包含自己的列;
+                        None 表示面板中的全部字段 (各股票列不同时, 缺少的字段为全 NaN 列)
+        :return: {symbol: 与 run() 一致的结果 DataFrame}
+        """
+        if "Signal" not in panel:
+            raise ValueError("数据集中缺少 Signal 列，请先运行策略逻辑。")
 
-        df.loc[exit_signals == -1, "Signal"] = -1
+        close_df = panel["Close"]
+        symbols = list(close_df.columns)
+        present = close_df.notna().to_numpy()
+        counts = present.sum(axis=0)
+        if isinstance(pos_size, dict):
+            pos_size = [pos_size[s] for s in symbols]
 
-        results = df.copy()
+        # 0. 把每列的有效行压到顶部：逐列运算因此只看该股票自己的交易日，与 run() 行序一致
+        order = np.argsort(~present, axis=0, kind="stable")
 
-        # 1. 计算每日收益率
-        results["Market_Return"] = results["Close"].pct_change()
+        def packed(field):
+            values = panel[field].to_numpy(dtype=np.float64, na_value=np.nan)
+            return np.take_along_axis(values, order, axis=0)
 
-        # 2. 计算持仓状态 (Position)
-        # 将信号（1, -1, 0）转换为持仓（1代表持仓，0代表空仓）
-        # 这里使用 ffill() 模拟：一旦买入信号出现，就一直持仓直到卖出信号出现
-        results["Position"] = results["Signal"].replace(0, np.nan).ffill().fillna(0)
-        # 限制持仓只能是 1（多头）或 0（空仓），暂不支持做空
-        results["Position"] = results["Position"].apply(lambda x: 1 if x == 1 else 0)
+        close = packed("Close")
 
-        # 3. 计算策略收益 (昨天的持仓决定了今天的收益)
-        results["Strategy_Return"] = (
-            results["Position"].shift(1) * results["Market_Return"] * pos_size
+        # 1. 风险管理：整个面板一次算出 ATR 与止损/止盈价
+        risk_mgr = RiskManager()
+        atr_in = packed(risk_mgr.atr_col) if risk_mgr.atr_col in panel else None
+        atr, sl, tp = risk_mgr.calculate_atr_exits_panel(
+            close, packed("High"), packed("Low"), atr=atr_in
         )
 
-        # 4. 扣除手续费 (当持仓发生变化时产生交易)
-        results["Trades"] = results["Position"].diff().abs()
-        results["Strategy_Return"] -= results["Trades"] * self.commission
+        # 2. 逐列编译内核：状态机、持仓、手续费、资金曲线与回撤
+        out = backtest_kernel_batch(
+            packed("Signal"),
+            close,
+            sl,
+            tp,
+            pos_size=pos_size,
+            commission=self.commission,
+            initial_capital=self.initial_capital,
+        )
 
-        # 5. 计算累计收益和资金曲线
-        results["Cumulative_Return"] = (
-            1 + results["Strategy_Return"].fillna(0)
-        ).cumprod()
-        results["Equity_Curve"] = results["Cumulative_Return"] * self.initial_capital
+        # 3. 拆回每只股票的结果表 (列顺序与 run() 相同)
+        extra = {risk_mgr.atr_col: atr, "Initial_SL": sl, "Initial_TP": tp}
 
-        # 6. 计算回撤 (Drawdown)
-        results["Peak"] = results["Equity_Curve"].cummax()
-        results["Drawdown"] = (results["Equity_Curve"] - results["Peak"]) / results[
-            "Peak"
-        ]
+        all_results = {}
+        for j, s in enumerate(symbols):
+            n, rows = counts[j], present[:, j]
+            own = panel if columns is None else [f for f in columns[s] if f in panel]
+            data = {f: panel[f][s].to_numpy()[rows] for f in own}
+            data["Signal"] = np.where(
+                out["Exit"][:n, j] == -1, -1, panel["Signal"][s].to_numpy()[rows]
+            )
+            for col, values in extra.items():
+                data[col] = values[:n, j]
+            for col in RESULT_COLUMNS:
+                data[col] = out[col][:n, j]
+            all_results[s] = pd.DataFrame(data, index=close_df.index[rows])
+            if self.compact:
+                all_results[s] = compact_frame(all_results[s])
 
-        return results
+        return all_results
 
     @staticmethod
-    def get_performance_summary(symbol: str, results: pd.DataFrame):
+    def get_performance_summary(symbol: str, results: pd.DataFrame, bars_per_year: float = None):
         """
         计算核心指标：年化收益、夏普比率、最大回撤
+        :param bars_per_year: 年化系数, None 表示按结果的时间间隔推断
         """
+        bars_per_year = bars_per_year or infer_bars_per_year(results.index)
         # 基础数据准备
         total_return = results["Cumulative_Return"].iloc[-1] - 1
 
         # 计算年化收益 (使用更严谨的复利计算方式)
         days = len(results)
         if days > 0:
-            annualized_return = (1 + total_return) ** (252 / days) - 1
+            annualized_return = (1 + total_return) ** (bars_per_year / days) - 1
         else:
             annualized_return = 0
 
         # 计算波动率和夏普比率
-        annualized_vol = results["Strategy_Return"].std() * np.sqrt(252)
+        annualized_vol = results["Strategy_Return"].std() * np.sqrt(bars_per_year)
         # 假设无风险利率为 2% (0.02)
         risk_free_rate = 0.02
         if annualized_vol > 0:
@@ -118,7 +276,7 @@ class BacktestEngine:
 
         print(f"\n" + "=" * 30)
         print(f"      回测报告: {symbol}")
-        print(f"博弈天数: {days} 天")
+        print(f"博弈周期: {days} 根 K 线")
         print("-" * 30)
         print(f"总 收益 率: {total_return:>10.2%}")
         print(f"年化收益率: {annualized_return:>10.2%}")
@@ -129,41 +287,30 @@ class BacktestEngine:
 
     def calculate_advanced_metrics(self, symbol: str, results: pd.DataFrame) -> dict:
         """
-        计算高级统计指标
+        计算高级统计指标 (交易类指标基于 extract_trades 提取的逐笔交易表)
         """
-        # 获取每笔交易的收益 (基于 Position 变化的差值)
-        # 我们寻找 Position 从 0 变 1 (买入) 到从 1 变 0 (卖出) 的区间收益
-        trades = results[results["Trades"] > 0].copy()
-        trade_returns = []
-
-        # 简单逻辑：提取所有卖出点的累计收益变化
-        # 这是一种向量化模拟每笔交易收益的方法
-        if len(trades) >= 2:
-            # 简化计算：取持仓期间的净值变化
-            equity_at_trades = results.loc[trades.index, "Equity_Curve"]
-            trade_returns = equity_at_trades.pct_change().iloc[1::2]  # 取卖出点的变化
-
-        win_rate = (
-            len([r for r in trade_returns if r > 0]) / len(trade_returns)
-            if len(trade_returns) > 0
-            else 0
-        )
-
-        gross_profit = sum([r for r in trade_returns if r > 0])
-        gross_loss = abs(sum([r for r in trade_returns if r < 0]))
-        profit_factor = gross_profit / gross_loss if gross_loss != 0 else float("inf")
-
         # 封装指标
+        bars_per_year = self.annualization(results)
         metrics = {
             "Symbol": symbol,
             "Total Return": f"{results['Cumulative_Return'].iloc[-1]-1:.2%}",
-            "Annual Return": f"{(results['Cumulative_Return'].iloc[-1]**(252/len(results))-1):.2%}",
+            "Annual Return": f"{(results['Cumulative_Return'].iloc[-1]**(bars_per_year/len(results))-1):.2%}",
             "Max Drawdown": f"{results['Drawdown'].min():.2%}",
             "Sharpe Ratio": f"{self.calculate_sharpe(results):.2f}",
-            "Win Rate": f"{win_rate:.2%}",
-            "Profit Factor": f"{profit_factor:.2f}",
-            "Trade Count": len(trade_returns),
         }
+        if "Position" not in results.columns:
+            # 组合结果没有单一的持仓序列, 逐笔交易指标无从定义, 显示 N/A 而不是 0 笔交易
+            metrics.update(dict.fromkeys(TRADE_METRICS, "N/A"))
+            return metrics
+
+        t = trade_metrics(extract_trades(results))
+        metrics.update({
+            "Win Rate": f"{t['win_rate']:.2%}",
+            "Profit Factor": f"{t['profit_factor']:.2f}",
+            "Expectancy": f"{t['expectancy']:.2%}",
+            "Avg Hold": f"{t['avg_hold']:.1f}",
+            "Trade Count": t["count"],
+        })
         return metrics
 
     def calculate_sharpe(self, results):
@@ -171,4 +318,4 @@ class BacktestEngine:
         ret = results["Strategy_Return"]
         if ret.std() == 0:
             return 0
-        return (ret.mean() / ret.std()) * np.sqrt(252)
+        return (ret.mean() / ret.std()) * np.sqrt(self.annualization(results))
@@ -1,22 +1,66 @@
 # 数据引擎
 import os
-from typing import List, Dict, Optional
+from typing import List, Optional
 
 import pandas as pd
 
+from core.arrow_cache import ArrowMirror
+from core.dtypes import MemoryReport
+from core.frame_cache import LRUFrameCache
+from core.panel_store import PanelStore
+from core.resampler import TIMEFRAMES, BarResampler, timeframe_length
 from data.data_loader import DataLoader
+from data.sources import DataSource
+
+
+def copy_on_write_enabled() -> bool:
+    """pandas 3 起写时复制始终开启, 更早的版本取决于 mode.copy_on_write 选项"""
+    return int(pd.__version__.split(".")[0]) >= 3 or pd.get_option("mode.copy_on_write") is True
+
+
+def enable_copy_on_write():
+    """
+    开启 pandas 的写时复制 (进程级设置, 影响所有 pandas 代码), 应在程序启动时、创建 DataEngine 之前调用一次
+    DataEngine 的只读模式 (read_only) 依赖它才能返回浅拷贝
+    """
+    if int(pd.__version__.split(".")[0]) < 3:
+        pd.set_option("mode.copy_on_write", True)
 
 
 class DataEngine:
     def __init__(self, symbols: List[str],
                  raw_path: str = "storage/raw",
                  processed_path: str = "storage/processed",
-                 cache_size: int = 50):
+                 cache_size: int = 50,
+                 cache_bytes: Optional[int] = None,
+                 read_only: bool = False,
+                 source: DataSource = None,
+                 download_workers: int = 8,
+                 min_interval: float = 0.0,
+                 retries: int = 3,
+                 panel_path: Optional[str] = None,
+                 mmap_processed: bool = False,
+                 compact: bool = False,
+                 base_timeframe: str = "1D"):
         """
         :param symbols: 初始股票池
         :param raw_path:
         :param processed_path:
         :param cache_size: 内存中最多保留多少只股票的数据, 防止溢出
+        :param cache_bytes: 缓存的内存预算 (字节), None 表示只按条目数限制
+        :param read_only: 只读模式, 返回写时复制 (copy-on-write) 的视图而非深拷贝;
+                          写时复制未启用时 (pandas < 3 且未调用 enable_copy_on_write) 仍返回深拷贝
+        :param source: 行情数据源, 默认 Yahoo Finance
+        :param download_workers: 批量同步的最大并发数
+        :param min_interval: 两次下载请求之间的最小间隔 (秒)
+        :param retries: 下载失败的重试次数
+        :param panel_path: 分区面板存储目录 (如 storage/panel), None 表示不启用.
+                           启用后单文件 parquet 仍然保留, 面板作为按年份分区的镜像供下推读取
+        :param mmap_processed: 为加工数据维护未压缩的 Arrow IPC 镜像并以内存映射方式读取,
+                               免去 parquet 的解压与解码, 多进程/多次运行共享页缓存
+        :param compact: 紧凑类型模式, 读入的指标/PCA 列转为 float32, Signal 转为 int8,
+                        价格列保持 float64; 节省的内存记录在 memory_report 中
+        :param base_timeframe: 本地原始数据的基础分辨率 (如 1m / 5m / 1D), 更粗的周期由 get_bars 聚合得到
         """
         self.symbols = symbols
         # 使用更稳健的路径获取方式
@@ -24,68 +68,236 @@ class DataEngine:
         self.raw_path = os.path.join(project_root, raw_path)
         self.processed_path = os.path.join(project_root, processed_path)
 
-        self.loader = DataLoader(raw_path=self.raw_path)
+        self.loader = DataLoader(raw_path=self.raw_path, source=source,
+                                 max_workers=download_workers,
+                                 min_interval=min_interval, retries=retries)
 
-        # 内存缓存
-        self._cache: Dict[str, pd.DataFrame] = {}
+        # 内存缓存 (LRU + 字节预算), key 为 (数据类型, symbol), 避免 raw/processed 串用
+        self._cache = LRUFrameCache(max_items=cache_size, max_bytes=cache_bytes)
         self.cache_size = cache_size
 
+        # 只读模式依赖 pandas 的写时复制: 浅拷贝/切片在被修改时才真正复制.
+        # 写时复制是进程级设置, 这里不做修改; 需要时在程序启动时调用 enable_copy_on_write()
+        self.read_only = read_only
+
         # 确保目录存在
         os.makedirs(self.processed_path, exist_ok=True)
 
-    def _manage_cache(self, symbol: str, df: pd.DataFrame):
-        """简单的缓存淘汰机制"""
-        if len(self._cache) >= self.cache_size:
-            first_key = next(iter(self._cache))
-            del self._cache[first_key]
-        self._cache[symbol] = df
+        self.panel = PanelStore(os.path.join(project_root, panel_path)) if panel_path else None
+        self.mmap_processed = mmap_processed
+        self.compact = compact
+        self.memory_report = MemoryReport()
+
+        if base_timeframe not in TIMEFRAMES:
+            raise ValueError(f"未知的周期: {base_timeframe}, 可选: {list(TIMEFRAMES)}")
+        self.base_timeframe = base_timeframe
+        # 聚合 K 线缓存, 同一周期只聚合一次, 原始数据追加后增量更新
+        self.resampler = BarResampler()
+
+    def _manage_cache(self, key: tuple, df: pd.DataFrame):
+        """写入 LRU 缓存 (淘汰最久未使用的条目)"""
+        self._cache.put(key, df)
+
+    def cache_stats(self) -> dict:
+        """缓存命中/未命中/淘汰统计"""
+        return self._cache.stats()
+
+    def _export(self, df: pd.DataFrame) -> pd.DataFrame:
+        """只读模式且写时复制已启用时返回浅拷贝, 否则返回深拷贝 (保证调用方的修改不会污染缓存)"""
+        return df.copy(deep=not (self.read_only and copy_on_write_enabled()))
+
+    def find_file(self, symbol: str, use_processed: bool = False) -> Optional[str]:
+        """本地数据文件路径 (兼容 parquet 和 csv), 不存在时返回 None"""
+        folder = self.processed_path if use_processed else self.raw_path
+        for ext in ['parquet', 'csv']:
+            path = os.path.join(folder, f"{symbol}.{ext}")
+            if os.path.exists(path):
+                return path
+        return None
+
+    def _panel_ready(self, kind: str, symbol: str) -> bool:
+        return self.panel is not None and self.panel.has(kind, symbol)
+
+    def _cache_key(self, kind: str, symbol: str, columns: Optional[List[str]]) -> tuple:
+        """整表缓存能满足任意列子集的请求; 否则每个列子集使用自己的缓存条目"""
+        full = (kind, symbol)
+        if columns is None or full in self._cache:
+            return full
+        return (kind, symbol, tuple(columns))
+
+    def _read(self, kind: str, symbol: str, start=None, end=None,
+              columns: Optional[List[str]] = None) -> Optional[pd.DataFrame]:
+        """从磁盘读取, 紧凑模式下转换类型后再进入缓存"""
+        df = self._read_disk(kind, symbol, start, end, columns)
+        return self.memory_report.compact(df) if self.compact else df
+
+    def _read_disk(self, kind: str, symbol: str, start=None, end=None,
+                   columns: Optional[List[str]] = None) -> Optional[pd.DataFrame]:
+        """从磁盘读取, 列投影与日期区间下推到 Parquet 读取器 (面板存储或单文件)"""
+        if self._panel_ready(kind, symbol):
+            return self.panel.read(kind, [symbol], start, end, columns)[symbol]
+        path = self.find_file(symbol, use_processed=(kind == "processed"))
+        if path is None:
+            return None
+        if kind == "processed" and self.mmap_processed and path.endswith(".parquet"):
+            return self._read_mapped(path, start, end, columns)
+        df = self.loader.load_local(path, columns=columns, start=start, end=end)
+        # 入缓存前排好序, 之后的切片无需再 sort_index
+        if not df.index.is_monotonic_increasing:
+            df = df.sort_index()
+        return df
+
+    def _read_mapped(self, path: str, start=None, end=None,
+                     columns: Optional[List[str]] = None) -> pd.DataFrame:
+        """内存映射读取 Arrow 镜像; 镜像缺失或落后于 parquet 时先从 parquet 重建"""
+        df = ArrowMirror.load(path, columns)
+        if df is None:
+            ArrowMirror.write(self.loader.load_local(path), path)
+            df = ArrowMirror.load(path, columns)
+        if not df.index.is_monotonic_increasing:
+            df = df.sort_index()
+        return df.loc[start:end] if (start or end) else df
+
+    @staticmethod
+    def _project(df: pd.DataFrame, columns: Optional[List[str]], start, end) -> pd.DataFrame:
+        """从缓存的整表/子集中取所需的列与日期区间 (不存在的列忽略)"""
+        if columns is not None:
+            df = df[[c for c in columns if c in df.columns]]
+        if start or end:
+            df = df.loc[start:end]
+        return df
 
     def get_symbol_data(self, symbol: str, start: str = None, end: str = None,
-                        use_processed: bool = False) -> Optional[pd.DataFrame]:
-        """获取单只股票数据, 并自动按日期切片"""
-        df = None
-
-        # 1. 优先看内存缓存
-        if symbol in self._cache:
-            df = self._cache[symbol]
-        else:
-            # 2. 尝试加载文件 (优先 processed)
-            folder = self.processed_path if use_processed else self.raw_path
-            # 兼容 parquet 和 csv
-            for ext in ['parquet', 'csv']:
-                path = os.path.join(folder, f"{symbol}.{ext}")
-                if os.path.exists(path):
-                    df = self.loader.load_local(path)
-                    self._manage_cache(symbol, df)
-                    break
+                        use_processed: bool = False,
+                        columns: Optional[List[str]] = None) -> Optional[pd.DataFrame]:
+        """
+        获取单只股票数据, 并自动按日期切片
+        :param columns: 只读取这些列 (不存在的列忽略), None 表示全部
+        """
+        kind = "processed" if use_processed else "raw"
+        key = self._cache_key(kind, symbol, columns)
+
+        # 1. 优先看内存缓存 (整表或同一列子集)
+        df = self._cache.get(key)
+        if df is None:
+            # 2. 只从磁盘读需要的列与行组; 完整日期范围的结果入缓存, 区间读取不缓存
+            df = self._read(kind, symbol, start, end, columns)
+            if df is not None and not (start or end):
+                self._manage_cache(key, df)
 
         if df is None:
             print(f"[DataEngine] 错误: 找不到 {symbol} 的本地数据")
             return None
 
-        # 3. 按日期切片 (Slice)
-        if start or end:
-            # 确保索引是日期类型且排序
-            df = df.sort_index()
-            return df.loc[start:end].copy()
+        # 3. 按列与日期切片 (Slice)
+        return self._export(self._project(df, columns, start, end))
+
+    def get_bars(self, symbol: str, timeframe: str = None, start: str = None,
+                 end: str = None) -> Optional[pd.DataFrame]:
+        """
+        获取某个周期的 OHLCV K 线 (由基础分辨率的原始数据聚合, 结果缓存)
+        多周期策略可反复调用, 同一周期只在原始数据变化后才重新聚合 (尾部追加时只重算最后一根)
+        :param timeframe: 目标周期 (如 5m / 1h / 1D / 1W), None 表示基础分辨率, 不能比基础分辨率更细
+        """
+        timeframe = timeframe or self.base_timeframe
+        if timeframe == self.base_timeframe:
+            return self.get_symbol_data(symbol, start, end)
+        if timeframe_length(timeframe) < timeframe_length(self.base_timeframe):
+            raise ValueError(f"无法从 {self.base_timeframe} 数据得到更细的 {timeframe} K 线")
+
+        base = self._cache.get(("raw", symbol))
+        if base is None:
+            base = self._read("raw", symbol)
+            if base is None:
+                print(f"[DataEngine] 错误: 找不到 {symbol} 的本地数据")
+                return None
+            self._manage_cache(("raw", symbol), base)
+        bars = self.resampler.get(symbol, base, timeframe)
+        return self._export(bars.loc[start:end] if (start or end) else bars)
+
+    def get_universe_data(self, symbols: List[str] = None, start: str = None, end: str = None,
+                          use_processed: bool = False,
+                          columns: Optional[List[str]] = None) -> dict:
+        """
+        批量获取多只股票数据 (顺序与 symbols 一致, 缺失的股票跳过)
+        启用面板存储时缓存未命中的股票只扫描一次数据集, 否则逐只调用 get_symbol_data
+        """
+        symbols = self.symbols if symbols is None else symbols
+        kind = "processed" if use_processed else "raw"
+
+        pending = [s for s in symbols
+                   if self._cache_key(kind, s, columns) not in self._cache and self._panel_ready(kind, s)]
+        loaded = self.panel.read(kind, pending, start, end, columns) if pending else {}
+        if self.compact:
+            loaded = {s: self.memory_report.compact(df) for s, df in loaded.items()}
 
-        return df.copy()
+        data = {}
+        for s in symbols:
+            if s in loaded:
+                if not (start or end):
+                    self._manage_cache(self._cache_key(kind, s, columns), loaded[s])
+                data[s] = self._export(loaded[s])
+            else:
+                df = self.get_symbol_data(s, start, end, use_processed=use_processed, columns=columns)
+                if df is not None:
+                    data[s] = df
+        return data
 
-    def update_universe(self, start: str, end: str, force: bool = False):
-        """批量同步股票池到本地"""
+    def update_universe(self, start: str, end: str, force: bool = False,
+                        incremental: bool = False) -> dict:
+        """
+        批量同步股票池到本地 (并发下载)
+        :param incremental: 增量模式, 只下载缺失的头尾区间
+        :return: {symbol: 变化的日期区间 (start, end) 或 None}
+        """
         print(f"[DataEngine] 开始批量同步 {len(self.symbols)} 只股票...")
-        for s in self.symbols:
-            self.loader.fetch_and_save(s, start, end, force_download=force)
+        self.loader.batch_fetch(self.symbols, start, end, force_download=force,
+                                incremental=incremental)
+
+        changes = {s: self.loader.sync_changes.get(s) for s in self.symbols}
+        # 原始数据有变化的股票, 缓存中的旧数据作废
+        for s, window in changes.items():
+            if window is not None:
+                self._cache.invalidate_prefix(("raw", s))
+                # 变化区间落在已聚合部分之内时作废聚合缓存; 纯尾部追加则保留, 下次读取时增量更新
+                self.resampler.invalidate(s, since=window[0])
+            # 面板存储镜像: 有变化或尚未写入的股票重新写入
+            if self.panel is not None and (window is not None or not self.panel.has("raw", s)):
+                path = self.find_file(s)
+                if path is not None:
+                    self.panel.write("raw", s, self.loader.load_local(path).sort_index())
+        return changes
+
+    def has_processed(self, symbol: str) -> bool:
+        """本地是否已有该股票的加工数据"""
+        return os.path.exists(os.path.join(self.processed_path, f"{symbol}.parquet"))
 
     def save_processed(self, symbol: str, df: pd.DataFrame):
         """保存加工后的数据, 不再使用时间戳, 采用覆盖写模式"""
         # 推荐使用 parquet 提升后续回测速度
         save_path = os.path.join(self.processed_path, f"{symbol}.parquet")
-        df.to_parquet(save_path)
-        # 更新缓存
-        self._cache[symbol] = df
+        df.to_parquet(save_path, row_group_size=self.loader.row_group_size)
+        if self.mmap_processed:
+            ArrowMirror.write(df, save_path)
+        if self.panel is not None:
+            self.panel.write("processed", symbol, df)
+        # 更新缓存 (旧的列子集一并作废)
+        self._cache.invalidate_prefix(("processed", symbol))
+        self._manage_cache(("processed", symbol), df)
         print(f"[DataEngine] 已保存加工数据: {save_path}")
 
+    def iter_chunks(self, symbol: str, chunk_rows: int = 65536, use_processed: bool = False,
+                    columns: Optional[List[str]] = None, start: str = None, end: str = None):
+        """
+        按行组分块读取单只股票 (不经过内存缓存), 供流式回测使用, 峰值内存只与 chunk_rows 有关
+        :return: 按时间顺序产出 DataFrame 块的生成器, 找不到数据时不产出
+        """
+        path = self.find_file(symbol, use_processed)
+        if path is None:
+            print(f"[DataEngine] 错误: 找不到 {symbol} 的本地数据")
+            return
+        yield from self.loader.iter_local(path, chunk_rows, columns, start, end)
+
     def get_universe_generator(self, start: str = None, end: str = None):
         """
         高级功能: 生成器模式.
@@ -0,0 +1,67 @@
+"""
+紧凑数据类型模式: 指标与 PCA 特征用 float32, 信号/持仓用 int8, 价格与资金类累计量保持 float64
+"""
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+# 保持 float64 的列: 行情价格 (止损/止盈与收益率直接依赖) 与回测中的累计量
+FLOAT64_COLUMNS = {
+    "Open", "High", "Low", "Close", "Adj Close", "Volume",
+    "Market_Return", "Strategy_Return", "Cumulative_Return", "Equity_Curve",
+    "Peak", "Drawdown", "Total_Equity", "Initial_SL", "Initial_TP",
+}
+
+# 取值只有 -1 / 0 / 1 的离散列
+INT8_COLUMNS = {"Signal", "Position"}
+
+
+def compact_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    返回紧凑类型的 DataFrame (不修改原表)
+    float64 特征列 -> float32; 无空值且为整数值的 Signal / Position -> int8
+    """
+    casts = {}
+    for col, dtype in df.dtypes.items():
+        if col in INT8_COLUMNS:
+            values = df[col].to_numpy()
+            if dtype != np.int8 and not pd.isna(values).any() and np.array_equal(values, np.round(values)):
+                casts[col] = np.int8
+        elif col not in FLOAT64_COLUMNS and dtype == np.float64:
+            casts[col] = np.float32
+    return df.astype(casts) if casts else df
+
+
+class MemoryReport:
+    """累计记录紧凑模式节省的内存"""
+
+    def __init__(self):
+        self.frames = 0
+        self.bytes_before = 0
+        self.bytes_after = 0
+
+    def compact(self, df: Optional[pd.DataFrame]) -> Optional[pd.DataFrame]:
+        """转换为紧凑类型并计入统计"""
+        if df is None:
+            return None
+        out = compact_frame(df)
+        self.frames += 1
+        self.bytes_before += int(df.memory_usage(deep=True).sum())
+        self.bytes_after += int(out.memory_usage(deep=True).sum())
+        return out
+
+    def summary(self) -> dict:
+        saved = self.bytes_before - self.bytes_after
+        return {
+            "frames": self.frames,
+            "bytes_before": self.bytes_before,
+            "bytes_after": self.bytes_after,
+            "bytes_saved": saved,
+            "saved_ratio": saved / self.bytes_before if self.bytes_before else 0.0,
+        }
+
+    def __str__(self):
+        s = self.summary()
+        return (f"紧凑类型: {s['frames']} 个表, {s['bytes_before'] / 2 ** 20:.1f} MB -> "
+                f"{s['bytes_after'] / 2 ** 20:.1f} MB (节省 {s['saved_ratio']:.1%})")
@@ -0,0 +1,473 @@
+import time
+
+import numpy as np
+import pandas as pd
+
+from core.kernels import njit
+
+# ---------- 账本的记录类型 (预分配的结构化数组, 每条记录定长) ----------
+ORDER_DTYPE = np.dtype([
+    ("bar", np.int64),  # 下单的 K 线行号
+    ("symbol", np.int32),  # 股票在股票池中的位置
+    ("qty", np.float64),  # 委托股数, 正为买入、负为卖出
+    ("price", np.float64),  # 下单时的参考价 (收盘价)
+    ("status", np.int8),  # 见 ORDER_STATUS
+])
+
+FILL_DTYPE = np.dtype([
+    ("order", np.int64),  # 对应的委托编号
+    ("bar", np.int64),  # 成交的 K 线行号
+    ("symbol", np.int32),
+    ("qty", np.float64),  # 成交股数, 正为买入、负为卖出
+    ("price", np.float64),  # 含滑点的成交价
+    ("commission", np.float64),
+    ("slippage", np.float64),  # 滑点成本 (金额)
+])
+
+POSITION_DTYPE = np.dtype([
+    ("qty", np.float64),
+    ("avg_cost", np.float64),  # 持仓均价 (含滑点, 不含手续费)
+    ("realized_pnl", np.float64),  # 已实现盈亏 (不含手续费)
+])
+
+PENDING, FILLED, PARTIAL, REJECTED = 0, 1, 2, 3
+ORDER_STATUS = {PENDING: "pending", FILLED: "filled", PARTIAL: "partial", REJECTED: "rejected"}
+
+
+# ---------- 可插拔的成本模型 ----------
+class CommissionModel:
+    """
+    手续费 = max(minimum, 成交额 * rate + 股数 * per_share)
+    子类只需给出三个参数, 事件循环在编译内核中按同一公式计算, 不逐笔回调 Python
+    """
+
+    def __init__(self, rate: float = 0.0, per_share: float = 0.0, minimum: float = 0.0):
+        self.rate = rate
+        self.per_share = per_share
+        self.minimum = minimum
+
+    def params(self) -> tuple:
+        return float(self.rate), float(self.per_share), float(self.minimum)
+
+    def cost(self, qty: float, price: float) -> float:
+        """单笔成交的手续费 (与内核公式一致)"""
+        if qty == 0:
+            return 0.0
+        return max(self.minimum, abs(qty) * (price * self.rate + self.per_share))
+
+
+class PercentCommission(CommissionModel):
+    """按成交额比例收费, 与 BacktestEngine.commission 同口径"""
+
+    def __init__(self, rate: float = 0.001):
+        super().__init__(rate=rate)
+
+
+class PerShareCommission(CommissionModel):
+    """按股数收费, 可设单笔最低"""
+
+    def __init__(self, per_share: float = 0.005, minimum: float = 1.0):
+        super().__init__(per_share=per_share, minimum=minimum)
+
+
+class SlippageModel:
+    """
+    成交价 = 参考价 * (1 ± (bps / 10000 + impact * 成交股数 / 当根成交量)), 买入向上、卖出向下
+    bps 为固定价差, impact 为按成交量占比的冲击系数 (成交量缺失时只计固定价差)
+    """
+
+    def __init__(self, bps: float = 0.0, impact: float = 0.0):
+        self.bps = bps
+        self.impact = impact
+
+    def params(self) -> tuple:
+        return float(self.bps), float(self.impact)
+
+    def price(self, qty: float, price: float, volume: float = 0.0) -> float:
+        """含滑点的成交价 (与内核公式一致)"""
+        frac = self.bps * 1e-4 + (self.impact * abs(qty) / volume if volume > 0 else 0.0)
+        return price * (1 + np.sign(qty) * frac)
+
+
+class FixedSlippage(SlippageModel):
+    """固定价差 (基点)"""
+
+    def __init__(self, bps: float = 5.0):
+        super().__init__(bps=bps)
+
+
+class VolumeImpactSlippage(SlippageModel):
+    """固定价差 + 与成交量占比成正比的冲击成本"""
+
+    def __init__(self, impact: float = 0.1, bps: float = 0.0):
+        super().__init__(bps=bps, impact=impact)
+
+
+class Ledger:
+    """委托、成交与持仓账本: 预分配的结构化数组 + 已用条数, 不为每个事件创建 Python 对象"""
+
+    __slots__ = ("orders", "fills", "positions", "n_orders", "n_fills")
+
+    def __init__(self, order_capacity: int, n_symbols: int):
+        self.orders = np.zeros(order_capacity, dtype=ORDER_DTYPE)
+        # 每笔委托至多一笔成交
+        self.fills = np.zeros(order_capacity, dtype=FILL_DTYPE)
+        self.positions = np.zeros(n_symbols, dtype=POSITION_DTYPE)
+        self.n_orders = 0
+        self.n_fills = 0
+
+    def orders_frame(self, dates: pd.DatetimeIndex, symbols: list) -> pd.DataFrame:
+        """已用部分的委托明细 (行号/股票位置换成日期/代码)"""
+        o = self.orders[:self.n_orders]
+        return pd.DataFrame({
+            "Date": dates[o["bar"]],
+            "Symbol": np.asarray(symbols, dtype=object)[o["symbol"]],
+            "Qty": o["qty"],
+            "Price": o["price"],
+            "Status": pd.Categorical.from_codes(o["status"], list(ORDER_STATUS.values())),
+        })
+
+    def fills_frame(self, dates: pd.DatetimeIndex, symbols: list) -> pd.DataFrame:
+        """已用部分的成交明细"""
+        f = self.fills[:self.n_fills]
+        return pd.DataFrame({
+            "Date": dates[f["bar"]],
+            "Symbol": np.asarray(symbols, dtype=object)[f["symbol"]],
+            "Order": f["order"],
+            "Qty": f["qty"],
+            "Price": f["price"],
+            "Commission": f["commission"],
+            "Slippage": f["slippage"],
+        })
+
+    def positions_frame(self, symbols: list) -> pd.DataFrame:
+        return pd.DataFrame(self.positions, index=pd.Index(symbols, name="Symbol"))
+
+
+@njit(cache=True)
+def _execute(qty, px, volume, cash, rate, per_share, minimum, bps, impact):
+    """
+    按成本模型撮合一笔市价单; 买入资金不足时缩减股数
+    :return: (成交股数, 成交价, 手续费)
+    """
+    side = 1.0 if qty > 0 else -1.0
+    frac = bps * 1e-4
+    if volume > 0:
+        frac += impact * abs(qty) / volume
+    fill_px = px * (1.0 + side * frac)
+    fee_per_share = fill_px * rate + per_share
+    if side > 0:
+        if qty * fill_px + max(minimum, qty * fee_per_share) > cash:
+            q = np.floor(cash / (fill_px + fee_per_share))
+            if q * fee_per_share < minimum:
+                q = np.floor((cash - minimum) / fill_px)
+            qty = min(qty, q)
+        if qty <= 0:
+            return 0.0, fill_px, 0.0
+    fee = max(minimum, abs(qty) * fee_per_share)
+    return qty, fill_px, fee
+
+
+@njit(cache=True)
+def _event_kernel(open_, close, volume, has_bar, signals, max_weight, initial_capital, fill_delay,
+                  rate, per_share, minimum, bps, impact,
+                  o_bar, o_sym, o_qty, o_price, o_status,
+                  f_order, f_bar, f_sym, f_qty, f_price, f_comm, f_slip,
+                  p_qty, p_cost, p_realized,
+                  equity, cash_out, fills_out, comm_out, slip_out, weights):
+    """
+    逐 K 线的事件循环 (numba 编译); 每根 K 线依次处理:
+        行情事件 -> 撮合上一根 K 线挂出的委托 (fill_delay=1, 以本根开盘价成交)
+        -> 按收盘价生成调仓委托 (fill_delay=0 时立即以收盘价成交) -> 记账
+    调仓规则与 PortfolioEngine 相同: 信号消失的持仓清仓, 活跃信号等权 (不超过 max_weight) 补足到目标市值
+    :return: (委托数, 成交数, 容量是否不足)
+    """
+    n, m = close.shape
+    cash = initial_capital
+    last_px = np.zeros(m)
+    # 每只股票至多一笔未成交的清仓单 (委托序号, -1 表示没有); 停牌/退市期间保持挂单, 不重复下单
+    live_sell = np.full(m, -1, dtype=np.int64)
+    n_orders, n_fills = 0, 0
+    pending_lo, pending_hi = 0, 0
+    capacity = len(o_bar)
+
+    for t in range(n):
+        fills_t, comm_t, slip_t = 0, 0.0, 0.0
+        for j in range(m):
+            if has_bar[t, j]:
+                last_px[j] = close[t, j]
+
+        # 1. 撮合挂出的委托: 先卖后买, 卖出回笼的现金可用于买入
+        if fill_delay > 0:
+            for side in (-1.0, 1.0):
+                # 卖单按股票取仍在挂单的清仓单 (可能来自更早的 K 线), 买单取上一根 K 线挂出的委托
+                lo, hi = (0, m) if side < 0 else (pending_lo, pending_hi)
+                for i in range(lo, hi):
+                    if side < 0:
+                        k = live_sell[i]
+                        if k < 0 or not has_bar[t, i]:
+                            continue
+                        live_sell[i] = -1
+                    else:
+                        k = i
+                        if o_qty[k] <= 0:
+                            continue
+                    j = o_sym[k]
+                    if not has_bar[t, j]:
+                        # 买单只在下一根 K 线有效, 该股票没有行情时作废
+                        o_status[k] = 3
+                        continue
+                    px = open_[t, j] if open_[t, j] > 0 else close[t, j]
+                    qty = o_qty[k]
+                    if qty < 0:
+                        qty = -min(-qty, p_qty[j])
+                    q, fill_px, fee = _execute(qty, px, volume[t, j], cash, rate, per_share, minimum, bps, impact)
+                    if q == 0:
+                        o_status[k] = 3
+                        continue
+                    o_status[k] = 1 if q == o_qty[k] else 2
+                    cash -= q * fill_px + fee
+                    if q > 0:
+                        p_cost[j] = (p_cost[j] * p_qty[j] + q * fill_px) / (p_qty[j] + q)
+                    else:
+                        p_realized[j] += (fill_px - p_cost[j]) * -q
+                    p_qty[j] += q
+                    if p_qty[j] == 0:
+                        p_cost[j] = 0.0
+                    f_order[n_fills], f_bar[n_fills], f_sym[n_fills] = k, t, j
+                    f_qty[n_fills], f_price[n_fills], f_comm[n_fills] = q, fill_px, fee
+                    f_slip[n_fills] = abs(q) * abs(fill_px - px)
+                    fills_t += 1
+                    comm_t += fee
+                    slip_t += f_slip[n_fills]
+                    n_fills += 1
+            pending_lo = pending_hi
+
+        # 2. 按收盘价估值, 生成调仓委托
+        total_equity = cash
+        n_active = 0
+        for j in range(m):
+            total_equity += p_qty[j] * last_px[j]
+            if signals[t, j] and last_px[j] > 0:
+                n_active += 1
+        # 延迟成交时, 下单的资金检查基于预计的现金 (含待成交卖单的回款)
+        projected = cash
+
+        for phase in range(2):
+            if phase == 1 and n_active == 0:
+                break
+            target_val = total_equity * min(1.0 / max(n_active, 1), max_weight)
+            for j in range(m):
+                active = signals[t, j] and last_px[j] > 0
+                px = last_px[j]
+                qty = 0.0
+                if phase == 0:
+                    if p_qty[j] > 0 and not active and live_sell[j] < 0:
+                        qty = -p_qty[j]
+                elif active:
+                    current_val = p_qty[j] * px
+                    if target_val > current_val:
+                        can_buy_val = target_val - current_val
+                        if projected >= can_buy_val:
+                            qty = can_buy_val // px
+                if qty == 0:
+                    continue
+                if n_orders >= capacity:
+                    # 账本已满: 立即返回, 由调用方扩容后重跑
+                    return n_orders, n_fills, True
+                k = n_orders
+                o_bar[k], o_sym[k], o_qty[k], o_price[k], o_status[k] = t, j, qty, px, 0
+                n_orders += 1
+                if fill_delay > 0:
+                    projected -= qty * px
+                    if qty < 0:
+                        live_sell[j] = k
+                    continue
+
+                q, fill_px, fee = _execute(qty, px, volume[t, j], cash, rate, per_share, minimum, bps, impact)
+                if q == 0:
+                    o_status[k] = 3
+                    continue
+                o_status[k] = 1 if q == qty else 2
+                cash -= q * fill_px + fee
+                projected = cash
+                if q > 0:
+                    p_cost[j] = (p_cost[j] * p_qty[j] + q * fill_px) / (p_qty[j] + q)
+                else:
+                    p_realized[j] += (fill_px - p_cost[j]) * -q
+                p_qty[j] += q
+                if p_qty[j] == 0:
+                    p_cost[j] = 0.0
+                f_order[n_fills], f_bar[n_fills], f_sym[n_fills] = k, t, j
+                f_qty[n_fills], f_price[n_fills], f_comm[n_fills] = q, fill_px, fee
+                f_slip[n_fills] = abs(q) * abs(fill_px - px)
+                fills_t += 1
+                comm_t += fee
+                slip_t += f_slip[n_fills]
+                n_fills += 1
+        pending_hi = n_orders
+
+        # 3. 记账: 成交之后按收盘价估值
+        value = cash
+        for j in range(m):
+            value += p_qty[j] * last_px[j]
+        for j in range(m):
+            weights[t, j] = p_qty[j] * last_px[j] / value if value != 0 else 0.0
+        weights[t, m] = cash / value if value != 0 else 0.0
+        equity[t] = value
+        cash_out[t] = cash
+        fills_out[t] = fills_t
+        comm_out[t] = comm_t
+        slip_out[t] = slip_t
+
+    # 回测结束时仍未成交的委托 (如退市后无法卖出的清仓单) 保持 pending
+    return n_orders, n_fills, False
+
+
+class EventEngine:
+    """
+    事件驱动的组合回测: 委托 -> 撮合 (滑点 + 手续费) -> 持仓, 全部记入预分配的账本 (Ledger)
+    调仓规则与 PortfolioEngine 一致; fill_delay=0 且无成本时结果与 run_portfolio_matrix 相同
+    """
+
+    def __init__(self, initial_capital=100000, max_stock_weight=0.2,
+                 commission: CommissionModel = None, slippage: SlippageModel = None,
+                 fill_delay: int = 1):
+        """
+        :param commission: 手续费模型, 默认不收费; 与单股回测同口径时使用 PercentCommission(BacktestEngine.commission)
+        :param slippage: 滑点模型, 默认无滑点
+        :param fill_delay: 0 表示信号当根以收盘价成交 (与 PortfolioEngine 一致), 1 表示下一根 K 线开盘成交
+        """
+        if fill_delay not in (0, 1):
+            raise ValueError("fill_delay 只能为 0 或 1")
+        self.initial_capital = initial_capital
+        self.max_stock_weight = max_stock_weight
+        self.commission = commission if commission is not None else CommissionModel()
+        self.slippage = slippage if slippage is not None else SlippageModel()
+        self.fill_delay = fill_delay
+        self.weights_df = pd.DataFrame()
+        self.ledger = None
+        self.dates = None
+        self.symbols = []
+        self.stats = {}
+
+    @staticmethod
+    def align_events(all_signals_dict: dict):
+        """
+        把各股票对齐成 (日期 x 股票) 矩阵
+        :return: (all_dates, symbols, open, close, volume, has_bar, signals)
+            has_bar: 该股票当天是否有自己的 K 线 (行情事件); 没有时不撮合, 估值沿用最近收盘价
+        """
+        symbols = list(all_signals_dict.keys())
+        all_dates = pd.DatetimeIndex([])
+        for df in all_signals_dict.values():
+            all_dates = all_dates.union(df.index)
+        all_dates = all_dates.sort_values()
+
+        shape = (len(all_dates), len(symbols))
+        open_ = np.zeros(shape)
+        close = np.zeros(shape)
+        volume = np.zeros(shape)
+        has_bar = np.zeros(shape, dtype=np.bool_)
+        signals = np.zeros(shape, dtype=np.bool_)
+        for j, s in enumerate(symbols):
+            df = all_signals_dict[s]
+            rows = all_dates.get_indexer(df.index)
+            close[rows, j] = df["Close"].to_numpy(dtype=np.float64)
+            if "Open" in df.columns:
+                open_[rows, j] = df["Open"].to_numpy(dtype=np.float64)
+            if "Volume" in df.columns:
+                volume[rows, j] = df["Volume"].to_numpy(dtype=np.float64)
+            has_bar[rows, j] = df["Close"].notna().to_numpy() & (close[rows, j] > 0)
+            signals[rows, j] = (df["Signal"] == 1).to_numpy()
+        np.nan_to_num(open_, copy=False)
+        np.nan_to_num(volume, copy=False)
+        return all_dates, symbols, open_, close, volume, has_bar, signals
+
+    @staticmethod
+    def _order_capacity(signals: np.ndarray) -> int:
+        """
+        账本的初始容量: 每个活跃格至多一笔买单, 每段连续信号结束后至多一笔清仓单
+        (清仓单成交前不会重复下单); 仍不够时 run_portfolio 扩容重跑
+        """
+        ends = signals.copy()
+        ends[:-1] &= ~signals[1:]
+        return int(signals.sum() + ends.sum()) + 1
+
+    def run_portfolio(self, all_signals_dict: dict) -> pd.DataFrame:
+        """
+        :return: 与 PortfolioEngine 同结构的组合结果 (另含 Commission / Slippage 列, Trades 为当日成交笔数);
+                 委托、成交与持仓明细见 self.ledger
+        """
+        t0 = time.perf_counter()
+        all_dates, symbols, open_, close, volume, has_bar, signals = self.align_events(all_signals_dict)
+        n, m = close.shape
+
+        equity = np.empty(n)
+        cash = np.empty(n)
+        fills = np.zeros(n, dtype=np.int64)
+        comm = np.zeros(n)
+        slip = np.zeros(n)
+        weights = np.empty((n, m + 1))
+
+        capacity = self._order_capacity(signals)
+        while True:
+            ledger = Ledger(capacity, m)
+            o, f, p = ledger.orders, ledger.fills, ledger.positions
+            n_orders, n_fills, overflow = _event_kernel(
+                open_, close, volume, has_bar, signals,
+                float(self.max_stock_weight), float(self.initial_capital), int(self.fill_delay),
+                *self.commission.params(), *self.slippage.params(),
+                o["bar"], o["symbol"], o["qty"], o["price"], o["status"],
+                f["order"], f["bar"], f["symbol"], f["qty"], f["price"], f["commission"], f["slippage"],
+                p["qty"], p["avg_cost"], p["realized_pnl"],
+                equity, cash, fills, comm, slip, weights,
+            )
+            if not overflow:
+                break
+            # 账本不够用: 加倍容量后从头重跑 (各输出数组会被完整覆盖)
+            capacity *= 2
+        ledger.n_orders, ledger.n_fills = int(n_orders), int(n_fills)
+
+        index = pd.DatetimeIndex(all_dates.to_numpy(), name="Date")
+        res_df = pd.DataFrame(
+            {
+                "Total_Equity": equity,
+                "Cash": cash,
+                "Trades": fills,
+                "Commission": comm,
+                "Slippage": slip,
+            },
+            index=index,
+        )
+        prev = np.concatenate([[float(self.initial_capital)], equity[:-1]])
+        res_df["Strategy_Return"] = np.where(prev > 0, equity / prev - 1, 0.0)
+        res_df["Cumulative_Return"] = res_df["Total_Equity"] / self.initial_capital
+        res_df["Drawdown"] = (
+            res_df["Total_Equity"] / res_df["Total_Equity"].cummax()
+        ) - 1
+        res_df["Equity_Curve"] = res_df["Total_Equity"]
+
+        self.weights_df = pd.DataFrame(weights, columns=symbols + ["Cash"], index=index)
+        self.ledger, self.dates, self.symbols = ledger, index, symbols
+
+        elapsed = time.perf_counter() - t0
+        events = int(has_bar.sum()) + ledger.n_orders + ledger.n_fills
+        self.stats = {
+            "bars": int(has_bar.sum()),
+            "orders": ledger.n_orders,
+            "fills": ledger.n_fills,
+            "events": events,
+            "seconds": elapsed,
+            "events_per_sec": events / elapsed if elapsed > 0 else float("inf"),
+        }
+        return res_df
+
+    def orders(self) -> pd.DataFrame:
+        return self.ledger.orders_frame(self.dates, self.symbols)
+
+    def fills(self) -> pd.DataFrame:
+        return self.ledger.fills_frame(self.dates, self.symbols)
+
+    def positions(self) -> pd.DataFrame:
+        return self.ledger.positions_frame(self.symbols)
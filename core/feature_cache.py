@@ -0,0 +1,72 @@
+import hashlib
+import json
+import os
+from typing import List, Optional
+
+
+class FeatureCache:
+    """
+    特征流水线结果缓存: key = 原始数据内容哈希 + 指标链配置哈希
+    命中时直接复用 processed 目录下已保存的加工数据, 跳过指标计算与 PCA
+    """
+
+    MANIFEST = "_feature_manifest.json"
+
+    def __init__(self, processed_path: str):
+        """
+        :param processed_path: 加工数据目录, 清单文件与 parquet 存放在一起
+        """
+        self.manifest_path = os.path.join(processed_path, self.MANIFEST)
+        self._manifest = {}
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                self._manifest = json.load(f)
+
+    @staticmethod
+    def file_hash(path: str, chunk_size: int = 1 << 20) -> str:
+        """原始数据文件的内容哈希"""
+        h = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(chunk_size), b''):
+                h.update(chunk)
+        return h.hexdigest()
+
+    @staticmethod
+    def spec_hash(spec: dict) -> str:
+        """指标链配置 (周期、窗口、PCA 维度等) 的哈希"""
+        payload = json.dumps(spec, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def is_hit(self, symbol: str, raw_hash: str, spec_hash: str) -> bool:
+        entry = self._manifest.get(symbol)
+        return entry is not None and entry["raw"] == raw_hash and entry["spec"] == spec_hash
+
+    def spec_matches(self, symbol: str, spec_hash: str) -> bool:
+        """上次的加工结果是否由同一套指标配置生成 (决定能否增量计算)"""
+        entry = self._manifest.get(symbol)
+        return entry is not None and entry["spec"] == spec_hash
+
+    def record(self, symbol: str, raw_hash: str, spec_hash: str):
+        self._manifest[symbol] = {"raw": raw_hash, "spec": spec_hash}
+        self._write()
+
+    def invalidate(self, symbols: Optional[List[str]] = None) -> List[str]:
+        """
+        使缓存失效, 下次运行会重新计算
+        :param symbols: 需要失效的股票, None 表示全部
+        :return: 实际被移除的股票
+        """
+        targets = list(self._manifest) if symbols is None else symbols
+        removed = [s for s in targets if self._manifest.pop(s, None) is not None]
+        self._write()
+        return removed
+
+    def entries(self) -> dict:
+        return dict(self._manifest)
+
+    def _write(self):
+        # 先写临时文件再替换, 避免中断时留下损坏的清单
+        tmp_path = self.manifest_path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self._manifest, f, indent=4)
+        os.replace(tmp_path, self.manifest_path)
@@ -0,0 +1,80 @@
+from collections import OrderedDict
+from typing import Hashable, Optional
+
+import pandas as pd
+
+
+class LRUFrameCache:
+    """LRU 缓存: 同时按条目数和内存字节数限制, 并记录命中/未命中/淘汰次数"""
+
+    def __init__(self, max_items: int = 50, max_bytes: Optional[int] = None):
+        """
+        :param max_items: 最多缓存多少个 DataFrame
+        :param max_bytes: 内存预算 (按 memory_usage(deep=True) 统计), None 表示不限
+        """
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __contains__(self, key) -> bool:
+        return key in self._data
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key) -> Optional[pd.DataFrame]:
+        """命中时刷新最近使用顺序"""
+        entry = self._data.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self._data.move_to_end(key)
+        self.hits += 1
+        return entry[0]
+
+    def put(self, key, df: pd.DataFrame):
+        """写入缓存并按 LRU 淘汰, 超出整个预算的单个对象不缓存"""
+        nbytes = int(df.memory_usage(deep=True).sum())
+        self.invalidate(key)
+        if self.max_bytes is not None and nbytes > self.max_bytes:
+            return
+
+        self._data[key] = (df, nbytes)
+        self.current_bytes += nbytes
+        while len(self._data) > self.max_items or (
+            self.max_bytes is not None and self.current_bytes > self.max_bytes
+        ):
+            _, (_, freed) = self._data.popitem(last=False)
+            self.current_bytes -= freed
+            self.evictions += 1
+
+    def invalidate(self, key):
+        """移除单个条目 (不计入淘汰次数)"""
+        entry = self._data.pop(key, None)
+        if entry is not None:
+            self.current_bytes -= entry[1]
+
+    def invalidate_prefix(self, prefix: tuple):
+        """移除所有以 prefix 开头的元组键 (如某只股票的整表与各列子集)"""
+        for key in [k for k in self._data if isinstance(k, tuple) and k[:len(prefix)] == prefix]:
+            self.invalidate(key)
+
+    def clear(self):
+        self._data.clear()
+        self.current_bytes = 0
+
+    def stats(self) -> dict:
+        """缓存统计信息"""
+        total = self.hits + self.misses
+        return {
+            "items": len(self._data),
+            "bytes": self.current_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
@@ -0,0 +1,374 @@
+import numpy as np
+
+try:
+    from numba import njit
+
+    HAS_NUMBA = True
+except ImportError:  # numba 为可选依赖，缺失时退回纯 NumPy 实现
+    HAS_NUMBA = False
+
+    def njit(*args, **kwargs):
+        """numba 不可用时的占位装饰器，直接返回原函数"""
+        if len(args) == 1 and callable(args[0]):
+            return args[0]
+        return lambda func: func
+
+
+# 内核返回数组的顺序，对应回测结果列名 (Exit: -1 表示强制平仓)
+KERNEL_OUTPUTS = (
+    "Exit",
+    "Market_Return",
+    "Position",
+    "Strategy_Return",
+    "Trades",
+    "Cumulative_Return",
+    "Equity_Curve",
+    "Peak",
+    "Drawdown",
+)
+
+
+# 跨块延续的回测状态 (流式回测逐块调用内核时传递), 各字段在 carry 数组中的位置
+CARRY_FIELDS = (
+    "has_prev",  # 是否已处理过 K 线 (首根 K 线不交易、无收益)
+    "state",  # 止损/止盈状态机: 1 为持仓中
+    "stop_loss",
+    "take_profit",
+    "last_signal",  # 最近一个非零信号
+    "cum",  # 累计净值
+    "peak",  # 资金曲线峰值
+    "prev_close",
+    "prev_position",
+)
+_HAS_PREV, _STATE, _SL, _TP, _LAST_SIGNAL, _CUM, _PEAK, _PREV_CLOSE, _PREV_POSITION = range(len(CARRY_FIELDS))
+_N_CARRY = len(CARRY_FIELDS)
+
+
+def new_carry() -> np.ndarray:
+    """空仓、净值为 1 的初始状态"""
+    carry = np.zeros(_N_CARRY)
+    carry[_CUM] = 1.0
+    carry[_PEAK] = -np.inf
+    return carry
+
+
+@njit(cache=True)
+def _backtest_kernel_jit_carry(signals, close, sl, tp, pos_size, commission, initial_capital, carry):
+    """
+    单次遍历完成止损/止盈状态机、持仓、收益与资金曲线 (numba 编译)
+    从 carry 中的状态继续, 结束时把状态写回 carry (原地修改)
+    """
+    n = len(close)
+    exits = np.zeros(n)
+    position = np.zeros(n, dtype=np.int64)
+    market_ret = np.empty(n)
+    strategy_ret = np.empty(n)
+    trades = np.empty(n)
+    cum_ret = np.empty(n)
+    equity = np.empty(n)
+    peak = np.empty(n)
+    drawdown = np.empty(n)
+
+    has_prev = carry[_HAS_PREV] != 0
+    state = int(carry[_STATE])
+    stop_loss_price = carry[_SL]
+    take_profit_price = carry[_TP]
+    last_signal = carry[_LAST_SIGNAL]
+    cum = carry[_CUM]
+    running_peak = carry[_PEAK]
+    prev_close = carry[_PREV_CLOSE]
+    prev_position = int(carry[_PREV_POSITION])
+
+    for i in range(n):
+        sig = signals[i]
+
+        # 1. 状态机：持仓时检查止损/止盈，空仓时检查买入信号
+        if has_prev:
+            if state == 1:
+                if close[i] <= stop_loss_price or close[i] >= take_profit_price:
+                    state = 0
+                    exits[i] = -1
+                    sig = -1.0
+            elif sig == 1:
+                state = 1
+                stop_loss_price = sl[i]
+                take_profit_price = tp[i]
+
+        # 2. 持仓：沿用最近一个非零信号，只有 1 才算多头
+        if sig != 0 and sig == sig:
+            last_signal = sig
+        position[i] = 1 if last_signal == 1 else 0
+
+        # 3. 收益、手续费与资金曲线 (昨天的持仓决定今天的收益)
+        if not has_prev:
+            market_ret[i] = np.nan
+            trades[i] = np.nan
+            strategy_ret[i] = np.nan
+        else:
+            market_ret[i] = close[i] / prev_close - 1
+            trades[i] = abs(position[i] - prev_position)
+            strategy_ret[i] = (
+                prev_position * market_ret[i] * pos_size - trades[i] * commission
+            )
+            if strategy_ret[i] == strategy_ret[i]:
+                cum = cum * (1 + strategy_ret[i])
+
+        cum_ret[i] = cum
+        equity[i] = cum * initial_capital
+        if equity[i] > running_peak:
+            running_peak = equity[i]
+        peak[i] = running_peak
+        drawdown[i] = (equity[i] - running_peak) / running_peak
+
+        has_prev = True
+        prev_close = close[i]
+        prev_position = position[i]
+
+    carry[_HAS_PREV] = 1.0 if has_prev else 0.0
+    carry[_STATE] = state
+    carry[_SL] = stop_loss_price
+    carry[_TP] = take_profit_price
+    carry[_LAST_SIGNAL] = last_signal
+    carry[_CUM] = cum
+    carry[_PEAK] = running_peak
+    carry[_PREV_CLOSE] = prev_close
+    carry[_PREV_POSITION] = prev_position
+
+    return (
+        exits,
+        market_ret,
+        position,
+        strategy_ret,
+        trades,
+        cum_ret,
+        equity,
+        peak,
+        drawdown,
+    )
+
+
+@njit(cache=True)
+def _backtest_kernel_jit(signals, close, sl, tp, pos_size, commission, initial_capital):
+    """从空仓状态开始的单股内核"""
+    carry = np.zeros(_N_CARRY)
+    carry[_CUM] = 1.0
+    carry[_PEAK] = -np.inf
+    return _backtest_kernel_jit_carry(
+        signals, close, sl, tp, pos_size, commission, initial_capital, carry
+    )
+
+
+@njit(cache=True)
+def _backtest_kernel_jit_2d(signals, close, sl, tp, pos_sizes, commission, initial_capital):
+    """
+    (日期 x 股票) 面板版本：逐列调用单股内核，输出同形状的二维数组
+    """
+    n, m = close.shape
+    exits = np.zeros((n, m))
+    market_ret = np.empty((n, m))
+    position = np.zeros((n, m), dtype=np.int64)
+    strategy_ret = np.empty((n, m))
+    trades = np.empty((n, m))
+    cum_ret = np.empty((n, m))
+    equity = np.empty((n, m))
+    peak = np.empty((n, m))
+    drawdown = np.empty((n, m))
+    for j in range(m):
+        col = _backtest_kernel_jit(
+            signals[:, j],
+            close[:, j],
+            sl[:, j],
+            tp[:, j],
+            pos_sizes[j],
+            commission,
+            initial_capital,
+        )
+        exits[:, j] = col[0]
+        market_ret[:, j] = col[1]
+        position[:, j] = col[2]
+        strategy_ret[:, j] = col[3]
+        trades[:, j] = col[4]
+        cum_ret[:, j] = col[5]
+        equity[:, j] = col[6]
+        peak[:, j] = col[7]
+        drawdown[:, j] = col[8]
+    outs = (
+        exits,
+        market_ret,
+        position,
+        strategy_ret,
+        trades,
+        cum_ret,
+        equity,
+        peak,
+        drawdown,
+    )
+    return outs
+
+
+def _exit_loop(signals: list, close: list, sl: list, tp: list, carry: np.ndarray = None) -> np.ndarray:
+    """
+    纯 Python 状态机，只负责找出强制平仓点 (输入为 list，避免 NumPy 标量开销)
+    :param carry: 跨块状态 (见 CARRY_FIELDS), 给出时从中继续并原地写回状态机部分
+    """
+    exits = np.zeros(len(close))
+    position = 0
+    stop_loss_price = 0
+    take_profit_price = 0
+    first = 1
+    if carry is not None:
+        position = int(carry[_STATE])
+        stop_loss_price, take_profit_price = carry[_SL], carry[_TP]
+        first = 0 if carry[_HAS_PREV] else 1
+    for i in range(first, len(close)):
+        if position == 1:
+            if close[i] <= stop_loss_price or close[i] >= take_profit_price:
+                position = 0
+                exits[i] = -1
+                continue
+        if position == 0 and signals[i] == 1:
+            position = 1
+            stop_loss_price = sl[i]
+            take_profit_price = tp[i]
+    if carry is not None:
+        carry[_STATE], carry[_SL], carry[_TP] = position, stop_loss_price, take_profit_price
+    return exits
+
+
+def _backtest_kernel_numpy(signals, close, sl, tp, pos_size, commission, initial_capital, carry=None):
+    """
+    NumPy 回退实现：状态机用纯 Python 循环，其余步骤沿 axis=0 向量化
+    同时支持 1-D (单只股票) 与 2-D (日期 x 股票，pos_size 可按列给出)
+    :param carry: 跨块状态 (仅 1-D), 给出时从中继续并原地写回
+    """
+    is_1d = close.ndim == 1
+    signals, close, sl, tp = (a.reshape(len(a), -1) for a in (signals, close, sl, tp))
+    n, m = close.shape
+    if carry is None:
+        has_prev, prev_close, prev_position = False, np.nan, 0
+        last_signal_in, cum_in, peak_in = 0.0, 1.0, -np.inf
+    else:
+        has_prev = bool(carry[_HAS_PREV])
+        prev_close, prev_position = carry[_PREV_CLOSE], int(carry[_PREV_POSITION])
+        last_signal_in, cum_in, peak_in = carry[_LAST_SIGNAL], carry[_CUM], carry[_PEAK]
+
+    exits = np.zeros((n, m))
+    for j in range(m):
+        exits[:, j] = _exit_loop(
+            signals[:, j].tolist(), close[:, j].tolist(), sl[:, j].tolist(), tp[:, j].tolist(), carry
+        )
+    sig = np.where(exits == -1, -1.0, signals)
+
+    # 持仓：非零信号的向前填充
+    valid = (sig != 0) & ~np.isnan(sig)
+    rows = np.arange(n)[:, None]
+    last_idx = np.maximum.accumulate(np.where(valid, rows, -1), axis=0)
+    last_signal = np.where(
+        last_idx >= 0, np.take_along_axis(sig, np.maximum(last_idx, 0), axis=0), last_signal_in
+    )
+    position = (last_signal == 1).astype(np.int64)
+
+    market_ret = np.full((n, m), np.nan)
+    trades = np.full((n, m), np.nan)
+    strategy_ret = np.full((n, m), np.nan)
+    if n > 1:
+        market_ret[1:] = close[1:] / close[:-1] - 1
+        trades[1:] = np.abs(np.diff(position, axis=0))
+        strategy_ret[1:] = (
+            position[:-1] * market_ret[1:] * pos_size - trades[1:] * commission
+        )
+    if has_prev and n > 0:
+        # 块首与上一块最后一根 K 线衔接
+        market_ret[0] = close[0] / prev_close - 1
+        trades[0] = np.abs(position[0] - prev_position)
+        strategy_ret[0] = prev_position * market_ret[0] * pos_size - trades[0] * commission
+
+    cum_ret = cum_in * np.cumprod(1 + np.nan_to_num(strategy_ret, nan=0.0), axis=0)
+    equity = cum_ret * initial_capital
+    peak = np.maximum(np.maximum.accumulate(equity, axis=0), peak_in)
+    drawdown = (equity - peak) / peak
+
+    if carry is not None and n > 0:
+        carry[_HAS_PREV] = 1.0
+        carry[_LAST_SIGNAL] = last_signal[-1, 0]
+        carry[_CUM] = cum_ret[-1, 0]
+        carry[_PEAK] = peak[-1, 0]
+        carry[_PREV_CLOSE] = close[-1, 0]
+        carry[_PREV_POSITION] = position[-1, 0]
+
+    outs = (
+        exits,
+        market_ret,
+        position,
+        strategy_ret,
+        trades,
+        cum_ret,
+        equity,
+        peak,
+        drawdown,
+    )
+    if is_1d:
+        return tuple(a[:, 0] for a in outs)
+    return outs
+
+
+def backtest_kernel(
+    signals: np.ndarray,
+    close: np.ndarray,
+    sl: np.ndarray,
+    tp: np.ndarray,
+    pos_size: float = 1.0,
+    commission: float = 0.001,
+    initial_capital: float = 100000.0,
+    carry: np.ndarray = None,
+) -> dict:
+    """
+    止损/止盈状态机 + 资金曲线的统一入口
+    :param carry: 流式回测的跨块状态 (new_carry() 创建), 给出时从中继续并原地更新; None 表示从空仓开始
+    :return: 以回测结果列名为 key 的数组字典 (额外包含 Exit: -1 表示强制平仓)
+    """
+    args = (
+        np.ascontiguousarray(signals, dtype=np.float64),
+        np.ascontiguousarray(close, dtype=np.float64),
+        np.ascontiguousarray(sl, dtype=np.float64),
+        np.ascontiguousarray(tp, dtype=np.float64),
+        float(pos_size),
+        float(commission),
+        float(initial_capital),
+    )
+    if carry is None:
+        kernel = _backtest_kernel_jit if HAS_NUMBA else _backtest_kernel_numpy
+        return dict(zip(KERNEL_OUTPUTS, kernel(*args)))
+    kernel = _backtest_kernel_jit_carry if HAS_NUMBA else _backtest_kernel_numpy
+    return dict(zip(KERNEL_OUTPUTS, kernel(*args, carry)))
+
+
+def backtest_kernel_batch(
+    signals: np.ndarray,
+    close: np.ndarray,
+    sl: np.ndarray,
+    tp: np.ndarray,
+    pos_size=1.0,
+    commission: float = 0.001,
+    initial_capital: float = 100000.0,
+) -> dict:
+    """
+    backtest_kernel 的面板版本，输入为 (日期 x 股票) 二维数组
+    :param pos_size: 标量或长度为股票数的数组 (每只股票独立的仓位比例)
+    :return: 与 backtest_kernel 相同的 key，值为二维数组
+    """
+    pos_sizes = np.broadcast_to(
+        np.asarray(pos_size, dtype=np.float64), (np.shape(close)[1],)
+    ).copy()
+    arrays = [
+        np.asfortranarray(a, dtype=np.float64) for a in (signals, close, sl, tp)
+    ]
+    if HAS_NUMBA:
+        outs = _backtest_kernel_jit_2d(
+            *arrays, pos_sizes, float(commission), float(initial_capital)
+        )
+    else:
+        outs = _backtest_kernel_numpy(
+            *arrays, pos_sizes, float(commission), float(initial_capital)
+        )
+    return dict(zip(KERNEL_OUTPUTS, outs))
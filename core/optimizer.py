@@ -0,0 +1,114 @@
+import time
+
+import numpy as np
+import pandas as pd
+
+from core.backtest_engine import BacktestEngine
+from core.kernels import backtest_kernel_batch
+from core.resampler import infer_bars_per_year
+from core.risk_manager import RiskManager
+
+
+class ParameterSweep:
+    """参数扫描引擎: 所有参数组合作为矩阵的列，一次向量化回测"""
+
+    def __init__(self, backtester: BacktestEngine, chunk_size: int = 512):
+        """
+        :param backtester: 提供初始资金与手续费设置
+        :param chunk_size: 每批回测的组合数，限制 (日期 x 组合) 矩阵的内存占用
+        """
+        self.backtester = backtester
+        self.chunk_size = chunk_size
+
+    def run(self, strategy, symbol: str, df: pd.DataFrame, param_grid: dict) -> pd.DataFrame:
+        """
+        对单只股票扫描参数网格
+        :param strategy: 实现了 sweep_signals 的策略实例
+        :return: 按夏普比率降序排列的结果表 (每行一个参数组合)
+        """
+        self._check_strategy(strategy)
+        params_df, signals = strategy.sweep_signals(df, param_grid)
+
+        # 止损/止盈价与组合无关，只算一次
+        exits_df = RiskManager().calculate_atr_exits(df)
+        close = exits_df["Close"].to_numpy(dtype=np.float64)[:, None]
+        sl = exits_df["Initial_SL"].to_numpy(dtype=np.float64)[:, None]
+        tp = exits_df["Initial_TP"].to_numpy(dtype=np.float64)[:, None]
+
+        bars_per_year = self.backtester.bars_per_year or infer_bars_per_year(df.index)
+        metrics = []
+        for start in range(0, signals.shape[1], self.chunk_size):
+            block = signals[:, start:start + self.chunk_size]
+            shape = block.shape
+            out = backtest_kernel_batch(
+                block,
+                np.broadcast_to(close, shape),
+                np.broadcast_to(sl, shape),
+                np.broadcast_to(tp, shape),
+                commission=self.backtester.commission,
+                initial_capital=self.backtester.initial_capital,
+            )
+            metrics.append(self._column_metrics(out, bars_per_year))
+
+        table = pd.concat([params_df, pd.concat(metrics, ignore_index=True)], axis=1)
+        table.insert(0, "Symbol", symbol)
+        return table.sort_values("Sharpe Ratio", ascending=False, ignore_index=True)
+
+    def run_universe(self, strategy, data: dict, param_grid: dict) -> pd.DataFrame:
+        """
+        对多只股票扫描同一个参数网格
+        :param data: {symbol: processed DataFrame}
+        :return: 所有股票、所有组合的结果表，按夏普比率降序
+        """
+        self._check_strategy(strategy)
+        t0 = time.perf_counter()
+        tables = [self.run(strategy, s, df, param_grid) for s, df in data.items()]
+        table = pd.concat(tables, ignore_index=True)
+        print(
+            f"🔍 参数扫描完成: {len(data)} 只股票 x {len(table) // max(len(data), 1)} 组参数, "
+            f"耗时 {time.perf_counter() - t0:.2f}s"
+        )
+        return table.sort_values("Sharpe Ratio", ascending=False, ignore_index=True)
+
+    @staticmethod
+    def _check_strategy(strategy):
+        if not getattr(strategy, "supports_sweep", False):
+            raise ValueError(
+                f"{strategy.name} 不支持向量化参数扫描 (需实现 sweep_signals 并设置 supports_sweep = True)"
+            )
+
+    @staticmethod
+    def summarize(table: pd.DataFrame) -> pd.DataFrame:
+        """跨股票汇总：每组参数取各指标的均值，按平均夏普比率排序"""
+        param_cols = [
+            c for c in table.columns
+            if c not in ("Symbol", "Total Return", "Annual Return", "Max Drawdown",
+                         "Sharpe Ratio", "Trade Count")
+        ]
+        summary = table.groupby(param_cols, as_index=False).mean(numeric_only=True)
+        return summary.sort_values("Sharpe Ratio", ascending=False, ignore_index=True)
+
+    @staticmethod
+    def _column_metrics(out: dict, bars_per_year: float = 252) -> pd.DataFrame:
+        """按列计算总收益、年化收益、夏普比率和最大回撤 (口径与 BacktestEngine 一致)"""
+        cum = out["Cumulative_Return"]
+        ret = out["Strategy_Return"]
+        days = cum.shape[0]
+
+        total_return = cum[-1] - 1
+        annual_return = cum[-1] ** (bars_per_year / days) - 1
+
+        std = np.nanstd(ret, axis=0, ddof=1)
+        mean = np.nanmean(ret, axis=0)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            sharpe = np.where(std > 0, mean / std * np.sqrt(bars_per_year), 0.0)
+
+        return pd.DataFrame(
+            {
+                "Total Return": total_return,
+                "Annual Return": annual_return,
+                "Max Drawdown": out["Drawdown"].min(axis=0),
+                "Sharpe Ratio": sharpe,
+                "Trade Count": np.nansum(out["Trades"], axis=0).astype(np.int64),
+            }
+        )
@@ -0,0 +1,159 @@
+import glob
+import os
+from typing import Dict, List, Optional
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+
+class PanelStore:
+    """
+    跨股票的分区面板存储: 每类数据 (raw / processed) 是一个按年份分区的 Parquet 数据集
+        {root}/{kind}/year=YYYY/{symbol}.parquet
+    长表布局 (Date + Symbol + 字段列), 读取时把日期区间、股票列表与列投影下推到 pyarrow,
+    只扫描命中的年份目录、行组与列
+    """
+
+    INDEX = "Date"
+    SYMBOL = "Symbol"
+
+    def __init__(self, root: str, row_group_size: int = 64 * 1024):
+        """
+        :param root: 面板存储根目录
+        :param row_group_size: 每个行组的最大行数, 行组统计信息 (min/max) 用于跳过不相关的数据
+        """
+        self.root = os.path.abspath(root)
+        self.row_group_size = row_group_size
+        # 数据集与各股票的列清单只在写入后重建, 避免每次读取都扫描所有文件的元数据
+        self._datasets: Dict[str, ds.Dataset] = {}
+        self._columns: Dict[str, Dict[str, List[str]]] = {}
+
+    def _dir(self, kind: str) -> str:
+        return os.path.join(self.root, kind)
+
+    def _files(self, kind: str, symbol: str = "*") -> List[str]:
+        return sorted(glob.glob(os.path.join(self._dir(kind), "year=*", f"{symbol}.parquet")))
+
+    def has(self, kind: str, symbol: str) -> bool:
+        return bool(self._files(kind, symbol))
+
+    def symbols(self, kind: str) -> List[str]:
+        return sorted({os.path.splitext(os.path.basename(f))[0] for f in self._files(kind)})
+
+    def write(self, kind: str, symbol: str, df: pd.DataFrame):
+        """写入 (覆盖) 一只股票: 按年份拆分到各分区目录"""
+        for path in self._files(kind, symbol):
+            os.remove(path)
+        self._datasets.pop(kind, None)
+        self._columns.pop(kind, None)
+
+        table = df.rename_axis(self.INDEX).reset_index()
+        # 统一时间精度, 保证各文件的 schema 可以合并
+        table[self.INDEX] = table[self.INDEX].astype("datetime64[ns]")
+        # 股票代码以字典编码 (pandas 中为 category) 存储, 长表中每行只占一个整数编码
+        table.insert(1, self.SYMBOL, pd.Categorical([symbol] * len(table)))
+        for year, part in table.groupby(table[self.INDEX].dt.year, sort=True):
+            part_dir = os.path.join(self._dir(kind), f"year={year}")
+            os.makedirs(part_dir, exist_ok=True)
+            pq.write_table(
+                pa.Table.from_pandas(part, preserve_index=False),
+                os.path.join(part_dir, f"{symbol}.parquet"),
+                row_group_size=self.row_group_size,
+            )
+
+    def _columns_of(self, kind: str, symbol: str) -> List[str]:
+        """该股票自身的字段列 (只读 Parquet 元数据), 用于剔除其他股票才有的列"""
+        columns = self._columns.setdefault(kind, {})
+        if symbol not in columns:
+            names = pq.read_schema(self._files(kind, symbol)[0]).names
+            columns[symbol] = [c for c in names if c not in (self.INDEX, self.SYMBOL)]
+        return columns[symbol]
+
+    def _dataset(self, kind: str) -> Optional[ds.Dataset]:
+        if kind in self._datasets:
+            return self._datasets[kind]
+        files = self._files(kind)
+        if not files:
+            return None
+        # 不同股票的加工数据列可能不同 (如 PCA 维度), 精度也可能不同 (紧凑模式写入 float32), 合并所有文件的 schema
+        schema = pa.unify_schemas([pq.read_schema(f) for f in files], promote_options="permissive")
+        schema = schema.append(pa.field("year", pa.int32()))
+        self._datasets[kind] = ds.dataset(
+            files, schema=schema, format="parquet",
+            partitioning=ds.partitioning(pa.schema([schema.field("year")]), flavor="hive"),
+            partition_base_dir=self._dir(kind),
+        )
+        return self._datasets[kind]
+
+    def _filter(self, symbols: Optional[List[str]], start, end):
+        expr = None
+
+        def add(e):
+            return e if expr is None else expr & e
+
+        if symbols is not None:
+            expr = add(ds.field(self.SYMBOL).isin(symbols))
+        if start is not None:
+            start = pd.Timestamp(start)
+            expr = add(ds.field("year") >= start.year)
+            expr = add(ds.field(self.INDEX) >= start)
+        if end is not None:
+            end = pd.Timestamp(end)
+            # 粗筛到 end 次日 (与 df.loc 对日期字符串的包含语义一致), 精确切片在读取后完成
+            expr = add(ds.field("year") <= end.year)
+            expr = add(ds.field(self.INDEX) < end + pd.Timedelta(days=1))
+        return expr
+
+    def read(self, kind: str, symbols: Optional[List[str]] = None, start: str = None,
+             end: str = None, columns: Optional[List[str]] = None) -> Dict[str, pd.DataFrame]:
+        """
+        一次扫描读取多只股票
+        :param symbols: 股票列表, None 表示全部
+        :param start: 起始日期 (含)
+        :param end: 结束日期 (含), 与 df.loc[start:end] 一致
+        :param columns: 需要的字段列, None 表示全部
+        :return: {symbol: 以日期为索引、按日期排序的 DataFrame}
+        """
+        dataset = self._dataset(kind)
+        if dataset is None:
+            return {}
+        present = {os.path.splitext(os.path.basename(f))[0] for f in dataset.files}
+        wanted = symbols if symbols is not None else sorted(present)
+
+        projection = None
+        if columns is not None:
+            projection = [self.INDEX, self.SYMBOL] + [c for c in columns if c in dataset.schema.names]
+        table = dataset.to_table(columns=projection, filter=self._filter(symbols, start, end))
+        df = table.to_pandas()
+        if "year" in df.columns:
+            df = df.drop(columns="year")
+
+        frames = {}
+        groups = dict(tuple(df.groupby(self.SYMBOL, sort=False, observed=True)))
+        for s in wanted:
+            if s not in present:
+                continue
+            own = self._columns_of(kind, s)
+            if columns is not None:
+                own = [c for c in columns if c in own]
+            part = groups.get(s)
+            if part is None:
+                part = df.iloc[:0]
+            frame = part.set_index(self.INDEX)[own].sort_index()
+            frames[s] = frame.loc[start:end] if (start or end) else frame
+        return frames
+
+    def read_panel(self, kind: str, fields: List[str], symbols: Optional[List[str]] = None,
+                   start: str = None, end: str = None) -> Dict[str, pd.DataFrame]:
+        """读取宽表面板: {field: (日期 x 股票) DataFrame}"""
+        frames = self.read(kind, symbols, start, end, columns=fields)
+        if not frames:
+            return {}
+        symbols = list(frames)
+        return {
+            f: pd.concat({s: df[f] for s, df in frames.items() if f in df.columns}, axis=1)
+            .reindex(columns=symbols).sort_index()
+            for f in fields
+        }
@@ -1,3 +1,4 @@
+import numpy as np
 import pandas as pd
 
 
@@ -101,3 +102,111 @@ class PortfolioEngine:
         self.weights_df = pd.DataFrame(weights_history).set_index("Date")
 
         return res_df
+
+    @staticmethod
+    def align_panel(all_signals_dict: dict):
+        """
+        一次性把所有股票对齐成 (日期 x 股票) 的稠密矩阵
+        :return: (all_dates, symbols, prices, signals)
+            prices: 向前填充后的收盘价，未上市前为 0
+            signals: 仅在该股票自身存在的交易日上为 True (与逐日模式的 `date in df.index` 一致)
+        """
+        symbols = list(all_signals_dict.keys())
+        all_dates = pd.DatetimeIndex([])
+        for df in all_signals_dict.values():
+            all_dates = all_dates.union(df.index)
+        all_dates = all_dates.sort_values()
+
+        prices = np.zeros((len(all_dates), len(symbols)), dtype=np.float64)
+        signals = np.zeros((len(all_dates), len(symbols)), dtype=bool)
+        for j, s in enumerate(symbols):
+            df = all_signals_dict[s].sort_index()
+            # method="ffill" 按位置取 <= date 的最后一行，与 .loc[:date].iloc[-1] 等价
+            prices[:, j] = (
+                df["Close"].reindex(all_dates, method="ffill").fillna(0).to_numpy()
+            )
+            signals[:, j] = (
+                (df["Signal"] == 1).reindex(all_dates, fill_value=False).to_numpy()
+            )
+
+        return all_dates, symbols, prices, signals
+
+    def run_portfolio_matrix(self, all_signals_dict: dict):
+        """
+        矩阵模式的组合回测：先对齐成 NumPy 矩阵，再按整数行号逐日调仓
+        结果 (res_df / weights_df) 与 run_portfolio 保持一致，但不再每天做 .loc 切片
+        """
+        # 1. 对齐价格与信号矩阵 (只做一次)
+        all_dates, symbols, prices, signals = self.align_panel(all_signals_dict)
+        n_days, n_symbols = prices.shape
+
+        # 2. 预分配结果数组
+        holdings = np.zeros(n_symbols, dtype=np.float64)
+        cash = float(self.initial_capital)
+        equity_arr = np.empty(n_days, dtype=np.float64)
+        cash_arr = np.empty(n_days, dtype=np.float64)
+        trades_arr = np.zeros(n_days, dtype=np.int64)
+        weights = np.empty((n_days, n_symbols + 1), dtype=np.float64)
+
+        # 3. 按行号逐日滚动
+        for t in range(n_days):
+            row_prices = prices[t]
+
+            # A/B. 今日开盘前总资产 (按股票顺序累加，保证与逐日模式逐位一致)
+            total_equity = cash + sum((holdings * row_prices).tolist())
+
+            # C. 今日有效买入信号 (保持字典顺序)
+            active = np.flatnonzero(signals[t] & (row_prices > 0))
+
+            # D. 先卖出：不在活跃列表中的持仓全部平仓
+            to_sell = holdings > 0
+            to_sell[active] = False
+            if to_sell.any():
+                for value in (holdings[to_sell] * row_prices[to_sell]).tolist():
+                    cash += value
+                holdings[to_sell] = 0
+
+            # 再买入：现金依次分配给活跃信号，顺序会影响剩余现金，因此逐只处理
+            if len(active) > 0:
+                target_weight = min(1.0 / len(active), self.max_stock_weight)
+                target_val = total_equity * target_weight
+                for j in active:
+                    price = row_prices[j]
+                    current_val = holdings[j] * price
+                    if target_val > current_val:
+                        can_buy_val = target_val - current_val
+                        if cash >= can_buy_val:
+                            shares_to_buy = can_buy_val // price
+                            holdings[j] += shares_to_buy
+                            cash -= shares_to_buy * price
+
+            # E/F. 记录持仓分布与总账
+            weights[t, :n_symbols] = holdings * row_prices / total_equity
+            weights[t, n_symbols] = cash / total_equity
+            equity_arr[t] = total_equity
+            cash_arr[t] = cash
+            trades_arr[t] = len(active)
+
+        # 4. 结果包装
+        index = pd.DatetimeIndex(all_dates.to_numpy(), name="Date")
+        res_df = pd.DataFrame(
+            {
+                "Total_Equity": equity_arr,
+                "Cash": cash_arr,
+                "Trades": trades_arr,
+                # 与逐日模式一致：prev_equity 与 total_equity 取自同一时点
+                "Strategy_Return": np.where(
+                    equity_arr > 0, equity_arr / equity_arr - 1, 0.0
+                ),
+            },
+            index=index,
+        )
+        res_df["Cumulative_Return"] = res_df["Total_Equity"] / self.initial_capital
+        res_df["Drawdown"] = (
+            res_df["Total_Equity"] / res_df["Total_Equity"].cummax()
+        ) - 1
+        res_df["Equity_Curve"] = res_df["Total_Equity"]
+
+        self.weights_df = pd.DataFrame(weights, columns=symbols + ["Cash"], index=index)
+
+        return res_df
@@ -0,0 +1,145 @@
+"""
+多周期 K 线: 从基础分辨率 (如 1 分钟 / 日线) 聚合出任意更粗的周期, 并按周期给出年化所用的每年 K 线数
+"""
+from typing import Dict, Optional, Tuple
+
+import pandas as pd
+
+# 周期名 -> pandas 重采样规则; 每根 K 线以起始时刻为标签 (左闭右开)
+TIMEFRAMES = {
+    "1m": "1min",
+    "5m": "5min",
+    "15m": "15min",
+    "30m": "30min",
+    "1h": "1h",
+    "4h": "4h",
+    "1D": "1D",
+    "1W": "W-MON",
+    "1M": "MS",
+}
+
+TRADING_DAYS = 252
+# 每个交易日的交易分钟数 (美股常规时段 6.5 小时)
+SESSION_MINUTES = 390
+
+# OHLCV 的聚合方式, 其他列取区间内最后一个值
+AGGREGATION = {"Open": "first", "High": "max", "Low": "min", "Close": "last", "Volume": "sum"}
+
+
+def timeframe_length(timeframe: str) -> pd.Timedelta:
+    """周期的 (近似) 长度, 用于比较周期粗细; 周线 7 天, 月线按 28 天计"""
+    if timeframe not in TIMEFRAMES:
+        raise ValueError(f"未知的周期: {timeframe}, 可选: {list(TIMEFRAMES)}")
+    if timeframe == "1W":
+        return pd.Timedelta(days=7)
+    if timeframe == "1M":
+        return pd.Timedelta(days=28)
+    return pd.Timedelta(TIMEFRAMES[timeframe])
+
+
+def bars_per_year(timeframe: str) -> float:
+    """每年的 K 线数: 日线 252, 周线 52, 月线 12, 日内周期按每天 390 个交易分钟折算"""
+    length = timeframe_length(timeframe)
+    if timeframe == "1D":
+        return float(TRADING_DAYS)
+    if timeframe == "1W":
+        return 52.0
+    if timeframe == "1M":
+        return 12.0
+    minutes = length.total_seconds() / 60
+    return TRADING_DAYS * SESSION_MINUTES / minutes
+
+
+def infer_timeframe(index: pd.Index) -> str:
+    """按相邻 K 线的中位间隔推断周期 (取不超过该间隔的最粗周期), 无法推断时视为日线"""
+    if not isinstance(index, pd.DatetimeIndex) or len(index) < 2:
+        return "1D"
+    step = index.to_series().diff().median()
+    # 日线的间隔含周末与节假日, 中位数仍为 1 天
+    coarse_first = sorted(TIMEFRAMES, key=timeframe_length, reverse=True)
+    return next((tf for tf in coarse_first if timeframe_length(tf) <= step), "1m")
+
+
+def infer_bars_per_year(index: pd.Index) -> float:
+    """由结果索引推断年化系数, 日线数据得到 252, 与原先的口径一致"""
+    return bars_per_year(infer_timeframe(index))
+
+
+def resample_ohlcv(df: pd.DataFrame, timeframe: str) -> pd.DataFrame:
+    """把 OHLCV 聚合到 timeframe; 区间内没有任何 K 线的周期 (周末、休市) 不输出"""
+    rule = TIMEFRAMES[timeframe]
+    how = {c: AGGREGATION.get(c, "last") for c in df.columns}
+    out = df.resample(rule, closed="left", label="left").agg(how)
+    # 以区间内 K 线的数量判断空周期, 不依赖 Close 是否有缺失值
+    counts = df.iloc[:, 0].resample(rule, closed="left", label="left").size()
+    return out[counts.to_numpy() > 0]
+
+
+class BarResampler:
+    """
+    聚合 K 线缓存: 每个 (symbol, 周期) 只完整聚合一次
+    基础数据在末尾追加新 K 线后, 只重新聚合最后一根 (可能未走完的) 聚合 K 线及之后的部分;
+    基础数据的开头或已缓存部分发生变化时完整重算
+    """
+
+    def __init__(self):
+        # (symbol, timeframe) -> (聚合结果, 基础数据首个时间, 已覆盖的基础数据最后时间, 已覆盖的行数)
+        self._bars: Dict[Tuple[str, str], tuple] = {}
+        self.full = 0
+        self.incremental = 0
+        self.hits = 0
+
+    def get(self, symbol: str, base: pd.DataFrame, timeframe: str) -> pd.DataFrame:
+        """
+        :param base: 该股票基础分辨率的完整数据 (按时间排序)
+        :return: 聚合后的 K 线 (缓存对象本身, 调用方不应修改)
+        """
+        key = (symbol, timeframe)
+        if len(base) == 0:
+            return base
+        first, last = base.index[0], base.index[-1]
+        cached = self._bars.get(key)
+        if cached is not None:
+            bars, c_first, c_last, c_rows = cached
+            if c_first == first and c_last == last and c_rows == len(base):
+                self.hits += 1
+                return bars
+            # 只追加: 开头不变, 已覆盖的最后一根基础 K 线仍在原位置
+            if (c_first == first and len(bars) and c_rows < len(base)
+                    and base.index[c_rows - 1] == c_last):
+                tail_start = bars.index[-1]
+                tail = resample_ohlcv(base.loc[tail_start:], timeframe)
+                bars = pd.concat([bars.iloc[:-1], tail])
+                self._bars[key] = (bars, first, last, len(base))
+                self.incremental += 1
+                return bars
+
+        bars = resample_ohlcv(base, timeframe)
+        self._bars[key] = (bars, first, last, len(base))
+        self.full += 1
+        return bars
+
+    def invalidate(self, symbol: Optional[str] = None, since=None):
+        """
+        丢弃某只股票 (None 表示全部) 的聚合缓存
+        :param since: 基础数据从该时间起发生了变化; 晚于已缓存部分时 (纯尾部追加) 保留缓存, None 表示无条件丢弃
+        """
+        if symbol is None:
+            self._bars.clear()
+            return
+        for key in [k for k in self._bars if k[0] == symbol]:
+            if since is None or pd.Timestamp(since) <= self._bars[key][2]:
+                del self._bars[key]
+
+    def stats(self) -> dict:
+        return {"full": self.full, "incremental": self.incremental, "hits": self.hits}
+
+
+def align_to(bars: pd.DataFrame, index: pd.DatetimeIndex, timeframe: str) -> pd.DataFrame:
+    """
+    把粗周期的 K 线 (或其上计算的指标) 对齐到细周期的时间轴, 供多周期策略使用
+    每根聚合 K 线在走完之后 (起始时刻 + 周期长度) 才可见, 避免用到未来数据
+    """
+    offset = pd.tseries.frequencies.to_offset(TIMEFRAMES[timeframe])
+    visible = bars.set_axis(bars.index + offset)
+    return visible.reindex(index, method="ffill")
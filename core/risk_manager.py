@@ -1,32 +1,63 @@
 import numpy as np
 import pandas as pd
 
+from indicators.plan import IndicatorPlan, resolve_features
+
 
 class RiskManager:
-    def __init__(self, stop_loss_mult=2.0, take_profit_mult=3.0):
+    def __init__(self, stop_loss_mult=2.0, take_profit_mult=3.0, atr_period=14, atr_method="sma"):
         """
         :param stop_loss_mult: ATR 的倍数作为止损距离 (常见为 1.5 - 2.5)
         :param take_profit_mult: ATR 的倍数作为止盈距离
+        :param atr_period: ATR 周期
+        :param atr_method: "sma" -- 真实波幅的简单移动平均 (默认, 列名 ATR / ATR_SMA_{atr_period});
+                           "wilder" -- Wilder 平滑 (RMA), 与 IndicatorCalculator 的 ATR_{atr_period} 一致并复用该列
         """
+        if atr_method not in ("sma", "wilder"):
+            raise ValueError(f"未知的 ATR 口径: {atr_method}, 可选: sma / wilder")
         self.stop_loss_mult = stop_loss_mult
         self.take_profit_mult = take_profit_mult
+        self.atr_period = atr_period
+        self.atr_method = atr_method
+        self.atr_col = self.atr_plan().outputs[0]
+
+    def atr_plan(self) -> IndicatorPlan:
+        """计算 atr_col 的指标计划 (流式回测也用它确定预热长度)"""
+        if self.atr_method == "wilder":
+            return IndicatorPlan().add_atr(self.atr_period)
+        return IndicatorPlan().add_atr_sma(self.atr_period)
 
     def calculate_atr_exits(self, df: pd.DataFrame):
         """为每一行计算基于 ATR 的动态止损价和止盈价"""
         df = df.copy()
 
-        # 计算 ATR (通常使用 14 天)
-        # 如果 IndicatorCalculator 还没算过 ATR，这里可以补算
-        if "ATR" not in df.columns:
-            high_low = df["High"] - df["Low"]
-            high_cp = np.abs(df["High"] - df["Close"].shift())
-            low_cp = np.abs(df["Low"] - df["Close"].shift())
-            tr = pd.concat([high_low, high_cp, low_cp], axis=1).max(axis=1)
-            df["ATR"] = tr.rolling(window=14).mean()
+        # ATR 通过指标计划按规范列名解析: 已有 atr_col 列时直接复用，否则补算
+        atr = resolve_features(df, [self.atr_col])[self.atr_col]
+        if self.atr_col not in df.columns:
+            df[self.atr_col] = atr
 
         # 买入时的初始止损位 = 现价 - (ATR * 倍数)
-        df["Initial_SL"] = df["Close"] - (df["ATR"] * self.stop_loss_mult)
+        df["Initial_SL"] = df["Close"] - (atr * self.stop_loss_mult)
         # 买入时的初始止盈位 = 现价 + (ATR * 倍数)
-        df["Initial_TP"] = df["Close"] + (df["ATR"] * self.take_profit_mult)
+        df["Initial_TP"] = df["Close"] + (atr * self.take_profit_mult)
 
         return df
+
+    def calculate_atr_exits_panel(self, close, high, low, atr=None):
+        """
+        面板版本：输入 (日期 x 股票) 二维数组，按列一次算出 ATR 与止损/止盈价
+        :param atr: 已有的 ATR 面板，为 None (或某列全为 NaN) 时按 atr_period 补算
+        :return: (atr, initial_sl, initial_tp)
+        """
+        atr = np.full(close.shape, np.nan) if atr is None else atr.copy()
+        plan = self.atr_plan()
+        for j in np.flatnonzero(np.isnan(atr).all(axis=0)):
+            # 逐列只取该股票自己的交易日求值，与 calculate_atr_exits 的结果一致
+            rows = ~np.isnan(close[:, j])
+            columns = {"Close": close[rows, j], "High": high[rows, j], "Low": low[rows, j]}
+            atr[rows, j] = plan.evaluate(columns.__getitem__)[self.atr_col]
+
+        initial_sl = close - (atr * self.stop_loss_mult)
+        initial_tp = close + (atr * self.take_profit_mult)
+
+        return atr, initial_sl, initial_tp
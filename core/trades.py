@@ -0,0 +1,107 @@
+"""
+逐笔交易 (round trip) 提取: 由 Position 的差分一次找出所有开仓/平仓点, 交易指标全部用 NumPy 归约计算
+"""
+import numpy as np
+import pandas as pd
+
+# 交易表的列 (顺序即输出顺序)
+TRADE_COLUMNS = [
+    "Entry_Index",
+    "Exit_Index",
+    "Entry_Date",
+    "Exit_Date",
+    "Entry_Price",
+    "Exit_Price",
+    "Return",  # 净收益率: 含手续费与仓位比例, 与资金曲线口径一致
+    "Holding",  # 持仓 K 线数
+    "MAE",  # 最大不利波动 (相对开仓价, <= 0)
+    "MFE",  # 最大有利波动 (相对开仓价, >= 0)
+    "Open",  # 截至最后一根 K 线仍未平仓 (按最后收盘价计)
+]
+
+
+def _segment_reduce(ufunc, values: np.ndarray, starts: np.ndarray, stops: np.ndarray) -> np.ndarray:
+    """对若干互不重叠、按顺序排列的区间 [start, stop) 做归约 (一次 reduceat, 区间非空)"""
+    # 末尾补一个元素, stop 等于数组长度时仍是合法下标; 奇数位的结果是区间之间的空隙, 丢弃
+    padded = np.append(values, values[-1])
+    bounds = np.column_stack([starts, stops]).ravel()
+    return ufunc.reduceat(padded, bounds)[::2]
+
+
+def extract_trades(results: pd.DataFrame) -> pd.DataFrame:
+    """
+    从回测结果提取交易表
+    Position[t] = 1 表示 t 收盘时持仓: 开仓点为 Position 由 0 变 1 的 K 线 (以收盘价成交),
+    平仓点为由 1 变 0 的 K 线; 第一根 K 线即持仓的视为在该 K 线开仓, 最后仍持仓的按最后一根 K 线结算
+    :param results: BacktestEngine.run / run_batch 的结果 (需含 Position、Close、Cumulative_Return)
+    :return: 每笔交易一行的 DataFrame (列见 TRADE_COLUMNS); 没有 Position 列 (如组合结果) 时为空表
+    """
+    if "Position" not in results.columns or len(results) == 0:
+        return pd.DataFrame(columns=TRADE_COLUMNS)
+
+    position = np.nan_to_num(results["Position"].to_numpy(dtype=np.float64)) > 0
+    # 前后各补一个空仓, 差分 +1 为开仓、-1 为平仓的下一根
+    change = np.diff(np.concatenate([[False], position, [False]]).astype(np.int8))
+    entries = np.flatnonzero(change == 1)
+    exits = np.flatnonzero(change == -1)
+    n = len(results)
+    is_open = exits == n
+    exits = np.minimum(exits, n - 1)
+
+    close = results["Close"].to_numpy(dtype=np.float64)
+    cum = results["Cumulative_Return"].to_numpy(dtype=np.float64)
+    # 开仓前一根的净值 (第一根即开仓时为初始净值 1), 平仓 K 线的净值已扣除平仓手续费
+    before = np.where(entries > 0, cum[np.maximum(entries - 1, 0)], 1.0)
+    trade_return = cum[exits] / before - 1
+
+    # 持仓期间 (开仓 K 线之后到平仓 K 线) 的最高/最低价, 无 High/Low 时用收盘价
+    high = results["High"].to_numpy(dtype=np.float64) if "High" in results.columns else close
+    low = results["Low"].to_numpy(dtype=np.float64) if "Low" in results.columns else close
+    entry_price = close[entries]
+    mae = np.zeros(len(entries))
+    mfe = np.zeros(len(entries))
+    held = exits > entries
+    if held.any():
+        starts, stops = entries[held] + 1, exits[held] + 1
+        mae[held] = _segment_reduce(np.fmin, low, starts, stops) / entry_price[held] - 1
+        mfe[held] = _segment_reduce(np.fmax, high, starts, stops) / entry_price[held] - 1
+
+    index = results.index
+    return pd.DataFrame({
+        "Entry_Index": entries,
+        "Exit_Index": exits,
+        "Entry_Date": index[entries],
+        "Exit_Date": index[exits],
+        "Entry_Price": entry_price,
+        "Exit_Price": close[exits],
+        "Return": trade_return,
+        "Holding": exits - entries,
+        "MAE": np.minimum(mae, 0.0),
+        "MFE": np.maximum(mfe, 0.0),
+        "Open": is_open,
+    }, columns=TRADE_COLUMNS)
+
+
+def trade_metrics(trades: pd.DataFrame) -> dict:
+    """
+    交易表的汇总指标 (数值形式)
+    :return: {win_rate, profit_factor, expectancy, avg_hold, avg_mae, avg_mfe, count}
+        profit_factor: 盈利交易收益之和 / 亏损交易收益之和的绝对值, 没有亏损时为 inf
+        expectancy: 每笔交易的平均净收益率
+    """
+    ret = trades["Return"].to_numpy(dtype=np.float64)
+    count = len(ret)
+    if count == 0:
+        return {"win_rate": 0.0, "profit_factor": float("inf"), "expectancy": 0.0,
+                "avg_hold": 0.0, "avg_mae": 0.0, "avg_mfe": 0.0, "count": 0}
+    gross_profit = ret[ret > 0].sum()
+    gross_loss = -ret[ret < 0].sum()
+    return {
+        "win_rate": float(np.count_nonzero(ret > 0) / count),
+        "profit_factor": float(gross_profit / gross_loss) if gross_loss > 0 else float("inf"),
+        "expectancy": float(ret.mean()),
+        "avg_hold": float(trades["Holding"].to_numpy().mean()),
+        "avg_mae": float(trades["MAE"].to_numpy().mean()),
+        "avg_mfe": float(trades["MFE"].to_numpy().mean()),
+        "count": count,
+    }
@@ -1,106 +1,309 @@
 import os
 
+import numpy as np
 import pandas as pd
 
 from core.backtest_engine import BacktestEngine
 from core.data_engine import DataEngine
+from core.feature_cache import FeatureCache
+from core.optimizer import ParameterSweep
 from core.position_manager import PositionManager
+from data.sources import build_source
 from indicators.indicator_calculator import IndicatorCalculator
 from machine_learning.feature_importance import FeatureImportanceEngine
 from machine_learning.feature_processor import FeatureProcessor
 from utils.dashboard import DashboardGenerator
-from utils.helpers import load_config
+from utils.helpers import load_config, parallel_map
 from utils.html_report import HTMLVisualizer
 
+# 默认的指标链配置 (settings.yaml 中的 features 可覆盖), 同时作为特征缓存 key 的一部分
+DEFAULT_FEATURE_SPEC = {
+    "sma": [20, 60, 120],
+    "rsi": [14],
+    "macd": [12, 26, 9],
+    "bbands": [20, 2],
+    "pca_components": 0.95,
+    "pca_fit_ratio": 0.8,
+    "pca_incremental": False,
+}
+
+# 持久化的标准化 + PCA 处理器 (保存在加工数据目录)
+PROCESSOR_FILE = "_feature_processor.joblib"
+
+# 各环节在策略所需列之外还要读取的列 (列投影)
+PORTFOLIO_COLUMNS = ["Close"]
+SWEEP_COLUMNS = ["Close", "High", "Low"]
+
 
 class WorkflowManager:
     def __init__(self):
         self.cfg = load_config()
-        self.engine = DataEngine(symbols=self.cfg["backtest"]["symbols"])
+        cache_cfg = self.cfg.get("cache", {})
+        data_cfg = self.cfg.get("data", {})
+        self.engine = DataEngine(
+            symbols=self.cfg["backtest"]["symbols"],
+            cache_size=cache_cfg.get("max_items", 50),
+            cache_bytes=cache_cfg.get("max_bytes"),
+            read_only=cache_cfg.get("read_only", False),
+            source=build_source(
+                data_cfg.get("source", "yahoo"), timeframe=data_cfg.get("base_timeframe", "1D"),
+                **data_cfg.get("source_params", {})
+            ),
+            download_workers=data_cfg.get("max_workers", 8),
+            min_interval=data_cfg.get("min_interval", 0.0),
+            retries=data_cfg.get("retries", 3),
+            panel_path=self.cfg["paths"].get("panel_data") if data_cfg.get("panel_store") else None,
+            mmap_processed=cache_cfg.get("mmap_processed", False),
+            compact=cache_cfg.get("compact_dtypes", False),
+            base_timeframe=data_cfg.get("base_timeframe", "1D"),
+        )
         self.backtester = BacktestEngine(
             initial_capital=self.cfg["backtest"]["initial_capital"],
             commission=self.cfg["backtest"]["commission"],
+            compact=cache_cfg.get("compact_dtypes", False),
+            bars_per_year=self.cfg["backtest"].get("bars_per_year"),
         )
+        self.feature_cache = FeatureCache(self.engine.processed_path)
         self.html_viz = HTMLVisualizer(report_path=self.cfg["paths"]["reports"])
         self.dashboard = DashboardGenerator(report_path=self.cfg["paths"]["reports"])
         self.ai_engine = FeatureImportanceEngine(
-            report_path=self.cfg["paths"]["reports"]
+            report_path=self.cfg["paths"]["reports"],
+            method=self.cfg["strategy"].get("importance_method", "model"),
         )
         self.all_metrics = []
+        # 最近一次同步的变化区间 {symbol: (start, end) 或 None}, 未同步时为 None
+        self.sync_changes = None
+        # 按股票并行的进程数 (1 为串行, -1 为全部核心)
+        self.workers = self.cfg["backtest"].get("workers", 1)
 
     def sync_data(self):
         """第一步：同步原始数据"""
         print(f"🔄 同步数据池: {self.cfg['backtest']['symbols']}")
-        self.engine.update_universe(
+        self.sync_changes = self.engine.update_universe(
             start=self.cfg["backtest"]["start_date"],
             end=self.cfg["backtest"]["end_date"],
+            incremental=self.cfg.get("data", {}).get("incremental", False),
         )
 
     def prepare_features(self):
         """第二步：特征工程与 PCA 因子合成"""
         print("🧬 构建特征矩阵与因子合成...")
-        processor = FeatureProcessor(n_components=0.95)
+        spec = dict(self.cfg.get("features", DEFAULT_FEATURE_SPEC))
+        if self.engine.compact:
+            # 紧凑模式: 指标与 PCA 特征以 float32 保存 (dtype 参与特征缓存的 key)
+            spec["dtype"] = "float32"
+        spec_hash = FeatureCache.spec_hash(spec)
+        symbols = self.cfg["backtest"]["symbols"]
+
+        # PCA 在整个股票池上拟合一次并持久化; 配置或股票池变化时才重新拟合
+        processor_path = os.path.join(self.engine.processed_path, PROCESSOR_FILE)
+        processor_key = FeatureCache.spec_hash({"spec": spec, "symbols": sorted(symbols)})
+        processor = FeatureProcessor.load(processor_path, processor_key)
+
+        tasks, raw_hashes = {}, {}
+        for s in symbols:
+            raw_file = self.engine.find_file(s)
+            if raw_file is None:
+                print(f"[DataEngine] 错误: 找不到 {s} 的本地数据")
+                continue
+
+            # 原始数据内容与指标配置都没变: 直接复用已有的加工数据
+            raw_hashes[s] = FeatureCache.file_hash(raw_file)
+            if processor is not None and self.engine.has_processed(s) and self.feature_cache.is_hit(
+                s, raw_hashes[s], spec_hash
+            ):
+                print(f"⏭️ [{s}] 特征缓存命中, 跳过特征工程")
+                continue
+
+            # 只在尾部追加了新 K 线且配置未变: 指标只为新增行计算, 旧行沿用上次结果
+            window = self.sync_changes.get(s) if self.sync_changes is not None else None
+            if (
+                window is not None
+                and self.engine.has_processed(s)
+                and self.feature_cache.spec_matches(s, spec_hash)
+            ):
+                prev = self.engine.get_symbol_data(s, use_processed=True)
+                if prev is not None and window[0] > prev.index[-1]:
+                    new_rows = self.engine.get_symbol_data(s, start=window[0])
+                    print(f"➕ [{s}] 增量计算指标: 新增 {len(new_rows)} 根 K 线")
+                    tasks[s] = (new_rows, prev, spec)
+                    continue
 
-        for s in self.cfg["backtest"]["symbols"]:
             df = self.engine.get_symbol_data(s)
             if df is not None:
-                calc = IndicatorCalculator(df)
-                processed_df = (
-                    calc.add_sma([20, 60, 120])
-                    .add_rsi([14])
-                    .add_macd()
-                    .add_bollinger_bands()
-                    .clean_data()
-                    .get_result()
-                )
-                # 因子正交化，提取 PCA 特征
-                df_synthesized, _ = processor.fit_transform(processed_df)
-                self.engine.save_processed(s, df_synthesized)
+                tasks[s] = (df, None, spec)
+
+        # 指标计算各股票相互独立，可以分发到进程池
+        results = parallel_map(_build_features, tasks.values(), self.workers)
+        built = dict(zip(tasks, results))
+        if not built:
+            return
+
+        if processor is None:
+            processor = self._fit_processor(spec, built, raw_hashes)
+            processor.key = processor_key
+            processor.save(processor_path)
+
+        # 因子合成: 所有股票一次批量变换；保存仍在主进程按股票池顺序进行
+        dtype = np.dtype(spec.get("dtype", "float64"))
+        factors = processor.transform_many(built)
+        for s, df in built.items():
+            df_synthesized = pd.concat([df, factors[s].astype(dtype, copy=False)], axis=1)
+            self.engine.save_processed(s, df_synthesized)
+            self.feature_cache.record(s, raw_hashes[s], spec_hash)
+
+    def _fit_processor(self, spec: dict, built: dict, raw_hashes: dict) -> FeatureProcessor:
+        """
+        在整个股票池训练区间的样本上拟合标准化与 PCA
+        未重算指标的股票也要参与拟合 (其 PCA 列随之更新), 直接读取已加工数据中的指标列加入 built
+        """
+        for s in raw_hashes:
+            if s not in built and self.engine.has_processed(s):
+                df = self.engine.get_symbol_data(s, use_processed=True)
+                built[s] = df.drop(columns=[c for c in df.columns if c.startswith("PCA_")])
+
+        # 训练区间: 全股票池日期的前 pca_fit_ratio (与 MLStrategy 默认的 train_size 一致), 之后的数据不参与拟合
+        dates = np.unique(np.concatenate([df.index.to_numpy() for df in built.values()]))
+        fit_end = pd.Timestamp(dates[max(int(len(dates) * spec.get("pca_fit_ratio", 1.0)) - 1, 0)])
+        processor = FeatureProcessor(
+            n_components=spec["pca_components"], incremental=spec.get("pca_incremental", False)
+        )
+        processor.fit(lambda: iter(built.values()), fit_end=fit_end)
+        print(
+            f"🧮 PCA 因子拟合完成: {len(built)} 只股票 {fit_end:%Y-%m-%d} 之前的样本, "
+            f"{len(processor.pca_cols)} 个主成分"
+        )
+        return processor
 
     def run_backtest(self, strategy_instance):
         """核心路由：根据配置决定是跑单股还是组合"""
         mode = self.cfg["backtest"].get("mode", "individual")
-        # 获取所有股票的预测信号
-        signals_dict = strategy_instance.generate_all_signals(self.engine)
+        # 获取所有股票的预测信号. 组合模式下游只用到收盘价, 单股模式的特征重要性分析需要全部列
+        signals_dict = strategy_instance.generate_all_signals(
+            self.engine,
+            workers=self.workers,
+            columns=PORTFOLIO_COLUMNS if mode == "portfolio" else None,
+        )
 
         if mode == "individual":
-            self._run_individual_mode(signals_dict, strategy_instance.name)
+            # 特征重要性分析复用策略已训练的模型
+            fitted = {s: strategy_instance.fitted_model(s, df) for s, df in signals_dict.items()}
+            self._run_individual_mode(signals_dict, strategy_instance.name, fitted)
         elif mode == "portfolio":
             self._run_portfolio_mode(signals_dict, strategy_instance.name)
 
-    def _run_individual_mode(self, signals_dict, strategy_name):
-        """模式 A：单股独立回测（逐一分析）"""
+    def run_stream_backtest(self, strategy_instance, warmup: int = 0) -> list:
+        """
+        流式回测 (分钟线等超出内存的长序列): 逐块读取加工数据、生成信号并回测, 结果写入 reports/stream/
+        :param warmup: 策略信号需要的历史行数 (如最长均线周期), 从上一块末尾带入
+        :return: 每只股票的汇总
+        """
+        if not getattr(strategy_instance, "supports_stream", True):
+            raise ValueError(
+                f"{strategy_instance.name} 在 on_data 中训练模型, 不支持流式回测 (需 supports_stream = True)"
+            )
+        chunk_rows = self.cfg["backtest"].get("stream_chunk_rows", 65536)
+        out_dir = os.path.join(self.cfg["paths"]["reports"], "stream")
+        summaries = []
+        for s in strategy_instance.symbols:
+            summary = self.backtester.run_stream(
+                s,
+                self.engine.iter_chunks(s, chunk_rows, use_processed=True),
+                os.path.join(out_dir, f"{s}_backtest.parquet"),
+                signal_fn=lambda df, s=s: strategy_instance.on_data(s, df),
+                warmup=warmup,
+            )
+            print(
+                f"🌊 [{s}] 流式回测完成: {summary['rows']} 行 / {summary['chunks']} 块, "
+                f"最终净值: {summary['final_equity']:.2f}, 最大回撤: {summary['max_drawdown']:.2%}"
+            )
+            summaries.append(summary)
+        return summaries
+
+    def run_param_sweep(self, strategy_instance, param_grid: dict = None):
+        """参数扫描：对整个股票池一次性评估参数网格，排名表保存到报告目录"""
+        if param_grid is None:
+            param_grid = self.cfg["strategy"].get("sweep_grid", {})
+        print(f"🔍 正在扫描策略参数: {strategy_instance.name} {param_grid}")
+
+        data = self.engine.get_universe_data(
+            strategy_instance.symbols,
+            use_processed=True,
+            columns=strategy_instance.load_columns(SWEEP_COLUMNS),
+        )
+
+        sweeper = ParameterSweep(self.backtester)
+        table = sweeper.run_universe(strategy_instance, data, param_grid)
+
+        save_path = os.path.join(
+            self.cfg["paths"]["reports"], f"param_sweep_{strategy_instance.name}.csv"
+        )
+        table.to_csv(save_path, index=False)
+        sweeper.summarize(table).to_csv(
+            save_path.replace(".csv", "_summary.csv"), index=False
+        )
+        return table
+
+    def _run_individual_mode(self, signals_dict, strategy_name, fitted: dict = None):
+        """
+        模式 A：单股独立回测（逐一分析）
+        :param fitted: {symbol: (model, X, holdout_start)}, 策略已训练的模型, 特征重要性分析直接复用
+        """
+        fitted = fitted or {}
         print(f"🚩 正在以 [单股模式] 运行策略: {strategy_name}")
         pos_mgr = PositionManager(
             max_cap=self.cfg["backtest"].get("max_stock_weight", 0.25)
         )
 
-        for symbol, df_sig in signals_dict.items():
-            # 1. 预跑回测：获取该品种的基础统计信息，用于凯利公式
-            initial_res = self.backtester.run(symbol, df_sig, pos_size=0.1)
-            temp_m = self.backtester.calculate_advanced_metrics(symbol, initial_res)
+        if not signals_dict:
+            return
+
+        # 整个股票池对齐成面板，两轮回测都批量完成
+        panel = self.backtester.build_panel(signals_dict)
+        # 各股票的结果只保留自己的列 (PCA 维度等可能不同), 避免出现整列为 NaN 的字段
+        columns = self.backtester.panel_columns(signals_dict)
+
+        # 1. 预跑回测：获取各品种的基础统计信息，用于凯利公式
+        initial_batch = self.backtester.run_batch(panel, pos_size=0.1, columns=columns)
+
+        suggested_sizes = {}
+        for symbol in signals_dict:
+            temp_m = self.backtester.calculate_advanced_metrics(
+                symbol, initial_batch[symbol]
+            )
 
             # 2. 计算凯利建议仓位
             win_rate = float(temp_m["Win Rate"].strip("%")) / 100
             pf = temp_m["Profit Factor"]
             profit_factor = float(pf) if pf != "inf" and float(pf) > 0 else 1.0
 
-            suggested_size = pos_mgr.calculate_kelly_size(win_rate, profit_factor)
-            print(f"💰 [{symbol}] 凯利仓位建议: {suggested_size:.2%}")
+            suggested_sizes[symbol] = pos_mgr.calculate_kelly_size(
+                win_rate, profit_factor
+            )
+            print(f"💰 [{symbol}] 凯利仓位建议: {suggested_sizes[symbol]:.2%}")
 
-            # 3. 正式回测：使用 AI 建议的仓位
-            final_results = self.backtester.run(symbol, df_sig, pos_size=suggested_size)
+        # 3. 正式回测：使用 AI 建议的仓位
+        final_batch = self.backtester.run_batch(panel, pos_size=suggested_sizes, columns=columns)
 
-            # 4. AI 因子贡献度分析
-            top_drivers = self.ai_engine.analyze(symbol, final_results)
-            top_drivers_str = ", ".join(list(top_drivers.keys())[::-1][:3])
-
-            # 5. 结果收集与报告生成
-            m = self.backtester.calculate_advanced_metrics(symbol, final_results)
-            m["Top Drivers (AI)"] = top_drivers_str
-            m["Position Size"] = f"{suggested_size:.2%}"
-            self.all_metrics.append(m)
-            self.html_viz.generate_interactive_report(symbol, final_results)
+        # 4. 因子贡献度分析与报告生成：逐股独立，按股票池顺序收集指标
+        self.all_metrics.extend(
+            parallel_map(
+                _report_symbol,
+                [
+                    (
+                        self.backtester,
+                        self.ai_engine,
+                        self.html_viz,
+                        symbol,
+                        final_batch[symbol],
+                        suggested_sizes[symbol],
+                        fitted.get(symbol),
+                    )
+                    for symbol in signals_dict
+                ],
+                self.workers,
+            )
+        )
 
     def _run_portfolio_mode(self, signals_dict, strategy_name):
         """模式 B：组合投资模式（资产对冲与相关性过滤）"""
@@ -117,7 +320,21 @@ class WorkflowManager:
             max_stock_weight=self.cfg["backtest"].get("max_stock_weight", 0.15),
         )
 
-        portfolio_results = port_engine.run_portfolio(signals_dict)
+        # 矩阵模式一次性对齐价格/信号，逐日模式保留作为对照，事件模式额外模拟成交成本
+        mode = self.cfg["backtest"].get("portfolio_engine", "matrix")
+        if mode == "event":
+            port_engine = self._build_event_engine()
+            portfolio_results = port_engine.run_portfolio(signals_dict)
+            port_engine.fills().to_csv(
+                os.path.join(self.cfg["paths"]["reports"], "portfolio_fills.csv"), index=False
+            )
+            s = port_engine.stats
+            print(f"⚡ 事件驱动撮合: {s['orders']} 笔委托, {s['fills']} 笔成交, "
+                  f"{s['events_per_sec']:,.0f} 事件/秒")
+        elif mode == "matrix":
+            portfolio_results = port_engine.run_portfolio_matrix(signals_dict)
+        else:
+            portfolio_results = port_engine.run_portfolio(signals_dict)
 
         weights_path = os.path.join(
             self.cfg["paths"]["reports"], "portfolio_weights.csv"
@@ -144,6 +361,26 @@ class WorkflowManager:
             f"📈 组合回测完成，最终净值: {portfolio_results['Total_Equity'].iloc[-1]:.2f}"
         )
 
+    def _build_event_engine(self):
+        """按 backtest.execution 配置创建事件驱动引擎, 比例手续费沿用 BacktestEngine.commission"""
+        from core.event_engine import CommissionModel, EventEngine, SlippageModel
+
+        exec_cfg = self.cfg["backtest"].get("execution", {})
+        return EventEngine(
+            initial_capital=self.cfg["backtest"]["initial_capital"],
+            max_stock_weight=self.cfg["backtest"].get("max_stock_weight", 0.15),
+            commission=CommissionModel(
+                rate=self.backtester.commission,
+                per_share=exec_cfg.get("commission_per_share", 0.0),
+                minimum=exec_cfg.get("commission_min", 0.0),
+            ),
+            slippage=SlippageModel(
+                bps=exec_cfg.get("slippage_bps", 0.0),
+                impact=exec_cfg.get("impact", 0.0),
+            ),
+            fill_delay=exec_cfg.get("fill_delay", 1),
+        )
+
     def _apply_correlation_filter(self, signals_dict):
         """计算相关性，并在存在高相关性时抑制弱信号"""
         # 提取 Close 价构建矩阵
@@ -156,4 +393,42 @@ class WorkflowManager:
     def finalize(self):
         """第四步：生成可视化看板"""
         self.dashboard.generate_summary(self.all_metrics, self.cfg)
+        if self.engine.compact:
+            print(f"🗜️ {self.engine.memory_report}")
         print("✅ 全流程自动化任务运行结束")
+
+
+def _build_features(df: pd.DataFrame, prev: pd.DataFrame = None,
+                    spec: dict = None) -> pd.DataFrame:
+    """
+    单只股票的指标计算 (可在子进程中运行), PCA 因子由全股票池共用的 FeatureProcessor 统一合成
+    :param prev: 上次的加工结果, 给出时 df 只需包含新增行, 指标增量计算
+    :param spec: 指标链配置, 默认 DEFAULT_FEATURE_SPEC
+    """
+    spec = spec or DEFAULT_FEATURE_SPEC
+    dtype = np.dtype(spec.get("dtype", "float64"))
+    calc = IndicatorCalculator(df, prev=prev, dtype=dtype)
+    return (
+        calc.add_sma(spec["sma"])
+        .add_rsi(spec["rsi"])
+        .add_macd(*spec["macd"])
+        .add_bollinger_bands(*spec["bbands"])
+        .clean_data()
+        .get_result()
+    )
+
+
+def _report_symbol(backtester, ai_engine, html_viz, symbol, final_results, suggested_size, fitted=None):
+    """
+    单只股票的 AI 因子分析、指标汇总与 HTML 报告 (可在子进程中运行)
+    :param fitted: 策略已训练的 (model, X, holdout_start), None 时由 ai_engine 单独训练
+    """
+    model, X, holdout_start = fitted if fitted is not None else (None, None, None)
+    top_drivers = ai_engine.analyze(symbol, final_results, model=model, X=X, holdout_start=holdout_start)
+    top_drivers_str = ", ".join(list(top_drivers.keys())[::-1][:3])
+
+    m = backtester.calculate_advanced_metrics(symbol, final_results)
+    m["Top Drivers (AI)"] = top_drivers_str
+    m["Position Size"] = f"{suggested_size:.2%}"
+    html_viz.generate_interactive_report(symbol, final_results)
+    return m
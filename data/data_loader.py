@@ -1,16 +1,49 @@
 import os
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 from typing import Optional
 
 import pandas as pd
-import yfinance as yf
+import pyarrow.parquet as pq
+
+from data.sources import DataSource, YahooSource
+
+
+class RateLimiter:
+    """线程安全的限速器: 保证任意两次请求的发起时间间隔不小于 min_interval 秒"""
+
+    def __init__(self, min_interval: float = 0.0):
+        self.min_interval = min_interval
+        self._lock = threading.Lock()
+        self._next_time = 0.0
+
+    def wait(self):
+        if self.min_interval <= 0:
+            return
+        with self._lock:
+            now = time.monotonic()
+            wait_time = self._next_time - now
+            self._next_time = max(now, self._next_time) + self.min_interval
+        if wait_time > 0:
+            time.sleep(wait_time)
 
 
 class DataLoader:
-    def __init__(self, raw_path: str = None):
+    # Parquet 行组大小: 约 4 年日线一组, 按日期读取时可依据行组统计信息跳过无关数据
+    row_group_size = 1024
+
+    def __init__(self, raw_path: str = None, source: DataSource = None,
+                 max_workers: int = 8, min_interval: float = 0.0,
+                 retries: int = 3, backoff: float = 1.0):
         """
         类初始化，设置程序的存储仓库
         :param raw_path: 项目的数据存储仓库，也可以自定义
+        :param source: 数据源, 默认 Yahoo Finance; 离线时可换成 LocalFileSource / SyntheticSource
+        :param max_workers: 批量下载的最大并发数
+        :param min_interval: 两次请求之间的最小间隔 (秒), 用于限速
+        :param retries: 单只股票下载失败后的重试次数
+        :param backoff: 重试的初始等待时间 (秒), 每次重试翻倍
         """
         # 使用项目根目录作为基准, 避免 ../ 导致的路径混乱
         if raw_path is None:
@@ -22,11 +55,54 @@ class DataLoader:
         if not os.path.exists(self.base_path):
             os.makedirs(self.base_path, exist_ok=True)
 
+        self.source = source if source is not None else YahooSource()
+        self.max_workers = max_workers
+        self.rate_limiter = RateLimiter(min_interval)
+        self.retries = retries
+        self.backoff = backoff
+        # 最近一次同步中每只股票新增/变化的日期区间 (start, end), 无变化为 None
+        self.sync_changes = {}
+
+    def _download(self, symbol: str, start: str, end: str) -> pd.DataFrame:
+        """带限速与指数退避重试的下载"""
+        for attempt in range(self.retries + 1):
+            self.rate_limiter.wait()
+            try:
+                return self.source.fetch(symbol, start, end)
+            except Exception as e:
+                if attempt == self.retries:
+                    raise
+                wait_time = self.backoff * (2 ** attempt)
+                print(f"[DataLoader] {symbol} 下载失败 ({e}), {wait_time:.1f}s 后重试...")
+                time.sleep(wait_time)
+
+    @staticmethod
+    def _clean(data: pd.DataFrame) -> pd.DataFrame:
+        """下载结果的统一清理: 平刷多层列索引、转浮点、去除时区"""
+        # 1. 强制平刷多层索引
+        if isinstance(data.columns, pd.MultiIndex):
+            data.columns = data.columns.get_level_values(0)
+
+        # 2. 转换类型并出去可能的时区信息
+        data = data.astype(float)
+        if data.index.tz is not None:
+            data.index = data.index.tz_localize(None)
+        return data
+
+    @classmethod
+    def _save(cls, data: pd.DataFrame, save_path: str, use_parquet: bool):
+        if use_parquet:
+            data.to_parquet(save_path, row_group_size=cls.row_group_size)
+        else:
+            data.to_csv(save_path)
+
     def fetch_and_save(self, symbol: str, start: str, end: str,
                        force_download=False,
-                       use_parquet: bool = True) -> Optional[pd.DataFrame]:
+                       use_parquet: bool = True,
+                       incremental: bool = False) -> Optional[pd.DataFrame]:
         """
         抓取并保存数据. Parquet 格式更适合量化
+        :param incremental: 增量模式, 本地已有文件时只下载缺失的头尾区间并追加
         """
         try:
             # 简化文件名, 方便数据管理
@@ -34,54 +110,180 @@ class DataLoader:
             file_name = f"{symbol}.{ext}"
             save_path = os.path.join(self.base_path, file_name)
 
-            # 检查逻辑: 如果不是强制下载且文件存在, 直接加载
+            # 检查逻辑: 如果不是强制下载且文件存在, 直接加载 (或增量补齐)
             if os.path.exists(save_path) and not force_download:
+                if incremental:
+                    return self._sync_incremental(symbol, start, end, save_path, use_parquet)
                 print(f"[DataLoader] {symbol} 已存在, 正在从本地加载...")
+                self.sync_changes[symbol] = None
                 return self.load_local(save_path)
 
-            print(f"[DataLoader] 正在从 Yahoo Finance 下载 {symbol}...")
-            data = yf.download(symbol, start=start, end=end, auto_adjust=True)
+            print(f"[DataLoader] 正在从 {self.source.name} 下载 {symbol}...")
+            data = self._download(symbol, start, end)
 
             if data.empty:
                 print(f"警告: 未获取到 {symbol} 的数据")
+                self.sync_changes[symbol] = None
                 return None
 
             # --- 核心清理步骤 ---
-            # 1. 强制平刷多层索引
-            if isinstance(data.columns, pd.MultiIndex):
-                data.columns = data.columns.get_level_values(0)
-
-            # 2. 转换类型并出去可能的时区信息
-            data = data.astype(float)
-            if data.index.tz is not None:
-                data.index = data.index.tz_localize(None)
+            data = self._clean(data)
 
             # 3. 保存
-            if use_parquet:
-                data.to_parquet(save_path)
-            else:
-                data.to_csv(save_path)
+            self._save(data, save_path, use_parquet)
+            self.sync_changes[symbol] = (data.index[0], data.index[-1])
 
             print(f"[DataLoader] {symbol} 成功保存至: {save_path}")
             return data
 
         except Exception as e:
             print(f"[DataLoader] 错误: {symbol} 处理失败 - {e}")
+            # 本地文件没有被改写, 不能沿用上一次同步的变化区间
+            self.sync_changes[symbol] = None
             return None
 
+    def _sync_incremental(self, symbol: str, start: str, end: str,
+                          save_path: str, use_parquet: bool) -> pd.DataFrame:
+        """
+        增量同步: 读取本地首尾时间戳, 只下载缺失的头部/尾部, 去重后写回
+        尾部从最后一根 K 线开始重新拉取, 以刷新可能不完整的最后一根
+        """
+        existing = self.load_local(save_path).sort_index()
+        first, last = existing.index[0], existing.index[-1]
+
+        pieces = []
+        if pd.Timestamp(start) < first:
+            pieces.append(self._download(symbol, start, first.strftime("%Y-%m-%d")))
+        if pd.Timestamp(end) > last:
+            pieces.append(self._download(symbol, last.strftime("%Y-%m-%d"), end))
+        pieces = [self._clean(p) for p in pieces if p is not None and not p.empty]
+
+        if not pieces:
+            print(f"[DataLoader] {symbol} 已是最新, 无需下载")
+            self.sync_changes[symbol] = None
+            return existing
+
+        new_rows = pd.concat(pieces)
+        new_rows = new_rows[~new_rows.index.duplicated(keep="last")]
+
+        # 真正变化的行: 本地没有的日期 + 重叠日期中数值有变化的行
+        overlap = new_rows.index.intersection(existing.index)
+        cols = existing.columns.intersection(new_rows.columns)
+        modified = overlap[
+            (new_rows.loc[overlap, cols] != existing.loc[overlap, cols]).any(axis=1).to_numpy()
+        ]
+        affected = new_rows.index.difference(existing.index).union(modified)
+        if affected.empty:
+            print(f"[DataLoader] {symbol} 已是最新, 无需更新")
+            self.sync_changes[symbol] = None
+            return existing
+
+        merged = pd.concat([existing, new_rows])
+        merged = merged[~merged.index.duplicated(keep="last")].sort_index()
+        self._save(merged, save_path, use_parquet)
+        self.sync_changes[symbol] = (affected[0], affected[-1])
+
+        print(f"[DataLoader] {symbol} 增量更新 {len(affected)} 行 "
+              f"({affected[0]:%Y-%m-%d} ~ {affected[-1]:%Y-%m-%d})")
+        return merged
+
     @staticmethod
-    def load_local(file_path: str):
-        """支持自动识别 Parquet 或 CSV"""
+    def load_local(file_path: str, columns: list = None, start=None, end=None):
+        """
+        支持自动识别 Parquet 或 CSV
+        :param columns: 只读取这些列 (不存在的列忽略), None 表示全部
+        :param start: 起始日期 (含)
+        :param end: 结束日期 (含), 与 df.loc[start:end] 一致
+        Parquet 的列投影与日期过滤下推到 pyarrow, 只解码需要的列与行组
+        """
         if file_path.endswith('.parquet'):
-            return pd.read_parquet(file_path)
-        return pd.read_csv(file_path, index_col=0, parse_dates=True)
-
-    def batch_fetch(self, symbols: list, start: str, end: str, delay: int = 1):
-        """批量获取并返回结果字典"""
-        results = {}
-        for s in symbols:
-            df = self.fetch_and_save(s, start, end)
-            if df is not None:
-                results[s] = df
-            time.sleep(delay)
-        return results
+            schema = pq.read_schema(file_path)
+            if columns is not None:
+                columns = [c for c in columns if c in schema.names]
+            filters = []
+            index_cols = (schema.pandas_metadata or {}).get("index_columns", [])
+            if (start or end) and index_cols and isinstance(index_cols[0], str):
+                if start:
+                    filters.append((index_cols[0], ">=", pd.Timestamp(start)))
+                if end:
+                    # 粗筛到 end 次日, 精确切片交给 df.loc
+                    filters.append((index_cols[0], "<", pd.Timestamp(end) + pd.Timedelta(days=1)))
+            df = pd.read_parquet(file_path, columns=columns, filters=filters or None)
+        else:
+            df = pd.read_csv(file_path, index_col=0, parse_dates=True)
+            if columns is not None:
+                df = df[[c for c in columns if c in df.columns]]
+        if start or end:
+            if not df.index.is_monotonic_increasing:
+                df = df.sort_index()
+            df = df.loc[start:end]
+        return df
+
+    @staticmethod
+    def iter_local(file_path: str, chunk_rows: int = 65536, columns: list = None, start=None, end=None):
+        """
+        分块读取本地数据, 每次只解码 chunk_rows 行, 峰值内存与文件大小无关
+        参数含义同 load_local; Parquet 按行组统计信息跳过日期区间之外的行组
+        :return: 按时间顺序产出 DataFrame 块的生成器
+        """
+        if file_path.endswith('.parquet'):
+            pf = pq.ParquetFile(file_path)
+            schema = pf.schema_arrow
+            index_cols = [c for c in (schema.pandas_metadata or {}).get("index_columns", [])
+                          if isinstance(c, str)]
+            if columns is not None:
+                columns = [c for c in schema.names if c in set(columns) | set(index_cols)]
+
+            row_groups = list(range(pf.num_row_groups))
+            if (start or end) and index_cols:
+                pos = schema.names.index(index_cols[0])
+                lower = pd.Timestamp(start) if start else None
+                # 粗筛到 end 次日, 精确切片交给 df.loc
+                upper = pd.Timestamp(end) + pd.Timedelta(days=1) if end else None
+
+                def overlaps(i):
+                    stats = pf.metadata.row_group(i).column(pos).statistics
+                    if stats is None or not stats.has_min_max:
+                        return True
+                    return ((lower is None or pd.Timestamp(stats.max) >= lower)
+                            and (upper is None or pd.Timestamp(stats.min) < upper))
+
+                row_groups = [i for i in row_groups if overlaps(i)]
+            chunks = (batch.to_pandas() for batch in
+                      pf.iter_batches(batch_size=chunk_rows, row_groups=row_groups, columns=columns))
+        else:
+            chunks = pd.read_csv(file_path, index_col=0, parse_dates=True, chunksize=chunk_rows)
+            if columns is not None:
+                chunks = (df[[c for c in columns if c in df.columns]] for df in chunks)
+
+        for df in chunks:
+            if start or end:
+                df = df.loc[start:end]
+            if len(df):
+                yield df
+
+    def batch_fetch(self, symbols: list, start: str, end: str, delay: float = None,
+                    force_download: bool = False, incremental: bool = False):
+        """
+        并发批量获取并返回结果字典 (顺序与 symbols 一致)
+        :param delay: 本次调用的请求间最小间隔 (秒), 调用结束后恢复; 为 None 时沿用初始化时的 min_interval
+        :param incremental: 增量模式, 只补齐缺失的日期区间
+        """
+        # 变化区间只描述本次同步
+        self.sync_changes = {}
+        previous = self.rate_limiter.min_interval
+        if delay is not None:
+            self.rate_limiter.min_interval = delay
+
+        workers = max(1, min(self.max_workers, len(symbols)))
+        try:
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                frames = list(pool.map(
+                    lambda s: self.fetch_and_save(s, start, end, force_download=force_download,
+                                                  incremental=incremental),
+                    symbols,
+                ))
+        finally:
+            self.rate_limiter.min_interval = previous
+
+        return {s: df for s, df in zip(symbols, frames) if df is not None}
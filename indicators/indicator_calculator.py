@@ -1,70 +1,117 @@
 from typing import List
 
+import numpy as np
 import pandas as pd
-import pandas_ta as ta
+
+from indicators.plan import IndicatorPlan
 
 
 class IndicatorCalculator:
-    """指标计算器: 支持前缀管理和批量特征生成"""
+    """
+    指标计算器: 支持前缀管理和批量特征生成
+    add_* 只把指标登记到 IndicatorPlan, 在 clean_data / get_result 时整张计划一次求值:
+    共享的中间量只算一次, 结果写入一块预分配的 float64 矩阵后一次性拼接到行情表上
+    """
+
+    def __init__(self, df: pd.DataFrame, prev: pd.DataFrame = None, dtype=np.float64):
+        """
+        :param df: 原始行情. 增量模式下只需包含新增的行
+        :param prev: 增量模式: 上一次的计算结果 (包含原始列与指标列).
+                     此时只为新增行计算指标, 旧行直接沿用 prev 中的值
+        :param dtype: 指标列的存储类型, 紧凑模式用 float32 (内核计算仍为 float64)
+        """
+        if prev is None:
+            # 保持原始数据的副本，确保不破坏原数据
+            self.df = df.copy()
+            self._prev = None
+            self._n_new = len(self.df)
+        else:
+            new_rows = df[df.index > prev.index[-1]]
+            # 指标状态 = 上次结果尾部的原始行情窗口, 与新增行拼接后按需截取
+            self.df = pd.concat([prev[df.columns], new_rows])
+            self._prev = prev
+            self._n_new = len(new_rows)
 
-    def __init__(self, df: pd.DataFrame):
-        # 保持原始数据的副本，确保不破坏原数据
-        self.df = df.copy()
         # 预检查：确保 Close 列是浮点数，规避 Numba 类型错误
         if 'Close' in self.df.columns:
             self.df['Close'] = self.df['Close'].astype(float)
 
+        self.plan = IndicatorPlan()
+        self.dtype = np.dtype(dtype)
+
+    def _window(self, lookback: int) -> int:
+        """全量模式从第 0 行开始算; 增量模式只返回计算新增行所需的尾部窗口起点"""
+        if self._prev is None:
+            return 0
+        return max(len(self.df) - self._n_new - lookback, 0)
+
+    def _materialize(self):
+        """求值指标计划, 写入预分配的指标矩阵并一次性拼接到行情表上"""
+        names = self.plan.outputs
+        if not names:
+            return
+
+        start = self._window(self.plan.lookback())
+        results = self.plan.evaluate(lambda col: self.df[col].to_numpy(dtype=np.float64)[start:])
+
+        # 按列连续 (Fortran 序) 存放, 构造 DataFrame 时无需再转置拷贝
+        block = np.empty((len(self.df), len(names)), dtype=self.dtype, order="F")
+        n_old = len(self.df) - self._n_new
+        for j, name in enumerate(names):
+            values = results[name]
+            if self._prev is None:
+                block[:, j] = values
+            else:
+                # 增量模式: 旧行沿用上次结果, 只有新增行使用新值
+                block[:n_old, j] = self._prev[name].to_numpy(dtype=np.float64)
+                block[n_old:, j] = values[len(values) - self._n_new:]
+
+        indicators = pd.DataFrame(block, index=self.df.index, columns=names, copy=False)
+        self.df = pd.concat([self.df.drop(columns=names, errors="ignore"), indicators], axis=1)
+        self.plan = IndicatorPlan()
+
     def add_sma(self, periods: List[int], prefix: str = "SMA"):
-        """批量添加简单移动平均线"""
-        for p in periods:
-            column_name = f"{prefix}_{p}"
-            self.df[column_name] = ta.sma(self.df['Close'], length=p)
+        """批量添加简单移动平均线 (所有周期共用一次累加和)"""
+        self.plan.add_sma(periods, prefix=prefix)
         return self  # 支持链式调用
 
     def add_rsi(self, periods: List[int] = [14], prefix: str = "RSI"):
         """添加 RSI 指标"""
-        for p in periods:
-            self.df[f"{prefix}_{p}"] = ta.rsi(self.df['Close'], length=p)
+        self.plan.add_rsi(periods, prefix=prefix)
         return self
 
     def add_macd(self, fast=12, slow=26, signal=9, prefix: str = "MACD"):
-        """添加 MACD 指标，并自动规范化返回的列名"""
-        macd_df = ta.macd(self.df['Close'], fast=fast, slow=slow, signal=signal)
-        # 规范化列名，例如 MACD_12_26_9 -> MACD_line, MACDh_12_26_9 -> MACD_hist
-        macd_df.columns = [f"{prefix}_line", f"{prefix}_hist", f"{prefix}_signal"]
-        self.df = pd.concat([self.df, macd_df], axis=1)
+        """添加 MACD 指标, 列名规范为 MACD_line / MACD_hist / MACD_signal"""
+        self.plan.add_macd(fast, slow, signal, prefix=prefix)
         return self
 
     def add_bollinger_bands(self, period=20, std=2, prefix: str = "BB"):
-        """添加布林带"""
-        bb_df = ta.bbands(self.df['Close'], length=period, std=std)
-        # 简化布林带列名
-        bb_df.columns = [f"{prefix}_L", f"{prefix}_M", f"{prefix}_U", f"{prefix}_Bw", f"{prefix}_Bp"]
-        self.df = pd.concat([self.df, bb_df], axis=1)
+        """添加布林带 (中轨与同周期 SMA 共享)"""
+        self.plan.add_bollinger_bands(period, std, prefix=prefix)
         return self
 
     def add_volatility_atr(self, period=14, prefix: str = "ATR"):
-        """添加平均真实波幅 (ATR)"""
-        self.df[f"{prefix}_{period}"] = ta.atr(self.df['High'], self.df['Low'], self.df['Close'], length=period)
+        """添加平均真实波幅 (ATR, Wilder 平滑), 列名 ATR_{period}; RiskManager(atr_method="wilder") 会复用该列"""
+        self.plan.add_atr(period, prefix=prefix)
         return self
 
     def clean_data(self):
         """处理由于指标计算产生的冷启动空值"""
+        self._materialize()
         self.df.dropna(inplace=True)
         return self
 
     def get_result(self) -> pd.DataFrame:
         """返回计算后的完整的 DataFrame"""
+        self._materialize()
         return self.df
 
     def add_kdj(self, n=9, m1=3, m2=3, prefix: str = "KDJ"):
         """添加 KDJ 指标"""
-        kdj_df = ta.kdj(self.df['High'], self.df['Low'], self.df['Close'], length=n, signal=m1, runoff=m2)
-        kdj_df.columns = [f"{prefix}_K", f"{prefix}_D", f"{prefix}_J"]
-        self.df = pd.concat([self.df, kdj_df], axis=1)
+        self.plan.add_kdj(n, m1, m2, prefix=prefix)
         return self
 
     def add_momentum_slope(self, col: str, window: int = 5, prefix: str = "Slope"):
         """计算指定列的斜率（动量变化率）"""
-        self.df[f"{prefix}_{col}_{window}"] = self.df[col].diff(window) / window
+        self.plan.add_slope(col, window, prefix=prefix)
         return self
@@ -0,0 +1,128 @@
+"""
+原生 NumPy 指标内核: 与 pandas_ta (纯 pandas 实现) 的算法保持一致, 输入输出均为 float64 数组
+冷启动阶段与 pandas_ta 一样填 NaN. 这里只提供中间量, RSI / MACD / 布林带 / ATR / KDJ 由 IndicatorPlan 组合
+"""
+from typing import List
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+
+def _first_valid(x: np.ndarray) -> int:
+    valid = np.flatnonzero(~np.isnan(x))
+    return int(valid[0]) if len(valid) else len(x)
+
+
+def rolling_means(x: np.ndarray, windows: List[int]) -> np.ndarray:
+    """
+    一次累加和算出所有窗口的简单移动平均
+    :return: (len(x), len(windows)) 矩阵
+    """
+    n = len(x)
+    out = np.full((n, len(windows)), np.nan)
+    nan_mask = np.isnan(x)
+    # 减去参考值再累加, 降低累加和的量级以减小浮点误差
+    ref = x[_first_valid(x)] if not nan_mask.all() else 0.0
+    csum = np.concatenate(([0.0], np.cumsum(np.where(nan_mask, 0.0, x - ref))))
+    cnan = np.concatenate(([0], np.cumsum(nan_mask)))
+    for j, w in enumerate(windows):
+        if w > n:
+            continue
+        mean = (csum[w:] - csum[:-w]) / w + ref
+        has_nan = (cnan[w:] - cnan[:-w]) > 0
+        out[w - 1:, j] = np.where(has_nan, np.nan, mean)
+    return out
+
+
+def rolling_sum(x: np.ndarray, window: int) -> np.ndarray:
+    """
+    分块累加和计算滚动和: 每 window 行重新累加, 窗口和 = 本块前缀 + 上一块后缀
+    误差只与窗口内数值的量级有关, 不随序列长度累积
+    与 rolling_means 一样, 只有包含 NaN 的窗口输出 NaN
+    """
+    n = len(x)
+    out = np.full(n, np.nan)
+    if window > n:
+        return out
+    nan_mask = np.isnan(x)
+    n_blocks = -(-n // window)
+    padded = np.zeros(n_blocks * window)
+    padded[:n] = np.where(nan_mask, 0.0, x)
+    prefix = np.cumsum(padded.reshape(n_blocks, window), axis=1)
+    suffix = prefix[:, -1:] - prefix
+    suffix[:, -1] = 0.0
+    sums = prefix.copy()
+    sums[1:] += suffix[:-1]
+    cnan = np.concatenate(([0], np.cumsum(nan_mask)))
+    has_nan = (cnan[window:] - cnan[:-window]) > 0
+    out[window - 1:] = np.where(has_nan, np.nan, sums.ravel()[window - 1:n])
+    return out
+
+
+def rolling_std(x: np.ndarray, window: int, ddof: int = 0) -> np.ndarray:
+    """由 x 与 x² 的滚动和计算滚动标准差"""
+    ref = x[_first_valid(x)] if not np.isnan(x).all() else 0.0
+    d = x - ref
+    sum1 = rolling_sum(d, window)
+    sum2 = rolling_sum(d * d, window)
+    var = (sum2 - sum1 * sum1 / window) / (window - ddof)
+    return np.sqrt(np.maximum(var, 0.0))
+
+
+def rolling_max(x: np.ndarray, window: int) -> np.ndarray:
+    out = np.full(len(x), np.nan)
+    if window <= len(x):
+        out[window - 1:] = sliding_window_view(x, window).max(axis=1)
+    return out
+
+
+def rolling_min(x: np.ndarray, window: int) -> np.ndarray:
+    out = np.full(len(x), np.nan)
+    if window <= len(x):
+        out[window - 1:] = sliding_window_view(x, window).min(axis=1)
+    return out
+
+
+def ema(x: np.ndarray, length: int) -> np.ndarray:
+    """
+    指数移动平均 (pandas_ta 口径): 以前 length 个值 (自首个有效值起) 的均值作为种子,
+    之后按 alpha = 2 / (length + 1) 递推 (ewm(span=length, adjust=False))
+    中间的缺失值与 pandas ewm 一样跳过: 该处沿用上一个值, 之后的有效值按间隔的 K 线数衰减
+    """
+    n = len(x)
+    out = np.full(n, np.nan)
+    start = _first_valid(x)
+    seed_idx = start + length - 1
+    if seed_idx >= n:
+        return out
+
+    tail = x[start:].copy()
+    tail[length - 1] = np.nanmean(tail[:length])
+    tail[:length - 1] = np.nan
+    out[start:] = pd.Series(tail).ewm(span=length, adjust=False).mean().to_numpy()
+    return out
+
+
+def rma(x: np.ndarray, length: int) -> np.ndarray:
+    """
+    Wilder 平滑 (pandas_ta 口径): ewm(alpha=1/length, adjust=True, min_periods=length)
+    min_periods 按有效值计数, 缺失值的处理同 ema
+    """
+    return pd.Series(x).ewm(alpha=1.0 / length, min_periods=length).mean().to_numpy()
+
+
+def _non_zero_range(high: np.ndarray, low: np.ndarray) -> np.ndarray:
+    """high - low, 若存在 0 则整体加上机器精度 (与 pandas_ta 一致)"""
+    diff = high - low
+    if (diff == 0).any():
+        diff = diff + np.finfo(float).eps
+    return diff
+
+
+def true_range(high: np.ndarray, low: np.ndarray, close: np.ndarray) -> np.ndarray:
+    prev_close = np.concatenate(([np.nan], close[:-1]))
+    tr = np.fmax(np.fmax(np.abs(_non_zero_range(high, low)), np.abs(high - prev_close)),
+                 np.abs(prev_close - low))
+    tr[0] = np.nan
+    return tr
@@ -0,0 +1,267 @@
+"""
+声明式指标计划: 先登记需要的指标, 再把它们展开成共享中间量 (真实波幅、滚动均值、EMA 等) 的 DAG,
+每个中间量只算一次, 结果按规范列名 (SMA_20 / RSI_14 / ATR_14 / MACD_line / BB_L ...) 输出
+策略与 RiskManager 都通过 resolve_features 按规范列名取指标, 已有的列直接复用
+"""
+import math
+import re
+from typing import Callable, Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+from indicators import native
+
+# 增量计算时 EMA 类指标的截断误差上限: 预热窗口足够长, 使被丢弃的历史权重小于该值
+EMA_TOLERANCE = 1e-12
+
+
+def ema_lookback(alpha: float, tol: float = EMA_TOLERANCE) -> int:
+    """EMA 衰减到 tol 以下所需的 K 线数量, 即增量计算需要保留的历史状态长度"""
+    return int(math.ceil(math.log(tol) / math.log(1 - alpha)))
+
+
+def _col(name: str) -> tuple:
+    return ("col", name)
+
+
+class IndicatorPlan:
+    """
+    指标计划. 节点用元组作键, 例如 ("sma", ("col", "Close"), 20),
+    相同的键只登记、只计算一次, 因此 BB_M 与 SMA_20、MACD 与同周期的 EMA 等自动共享
+    """
+
+    def __init__(self):
+        # 节点键 -> (依赖的节点键, 计算函数)
+        self._nodes: Dict[tuple, Tuple[tuple, Callable]] = {}
+        # 规范列名 -> (节点键, 增量计算所需回看长度), 保持登记顺序
+        self._outputs: Dict[str, Tuple[tuple, int]] = {}
+
+    # ---------- 中间量 ----------
+    def _node(self, key: tuple, deps: tuple = (), fn: Callable = None) -> tuple:
+        if key not in self._nodes:
+            self._nodes[key] = (deps, fn)
+        return key
+
+    def _source(self, name: str) -> Tuple[tuple, int]:
+        """数据源: 已登记的指标输出 (带上其回看长度), 否则为行情列"""
+        if name in self._outputs:
+            return self._outputs[name]
+        return _col(name), 0
+
+    def _sma(self, src: tuple, n: int) -> tuple:
+        # 同一数据源的所有 SMA 在求值时共用一次累加和 (见 evaluate)
+        return self._node(("sma", src, n), (src,))
+
+    def _ema(self, src: tuple, n: int) -> tuple:
+        return self._node(("ema", src, n), (src,), lambda x: native.ema(x, n))
+
+    def _rma(self, src: tuple, n: int) -> tuple:
+        return self._node(("rma", src, n), (src,), lambda x: native.rma(x, n))
+
+    def _true_range(self) -> tuple:
+        return self._node(("tr",), (_col("High"), _col("Low"), _col("Close")), native.true_range)
+
+    def _true_range_hl(self) -> tuple:
+        """首行取 High - Low 的真实波幅 (前收盘缺失时忽略, 与 concat(...).max(axis=1) 一致)"""
+        def tr(high, low, close):
+            prev_close = np.concatenate(([np.nan], close[:-1]))
+            return np.fmax(np.fmax(high - low, np.abs(high - prev_close)), np.abs(low - prev_close))
+
+        return self._node(("tr_hl",), (_col("High"), _col("Low"), _col("Close")), tr)
+
+    def _emit(self, name: str, key: tuple, lookback: int):
+        self._outputs[name] = (key, lookback)
+
+    # ---------- 可登记的指标 ----------
+    def add_sma(self, periods: List[int], prefix: str = "SMA", src: str = "Close"):
+        source, base = self._source(src)
+        for p in periods:
+            self._emit(f"{prefix}_{p}", self._sma(source, p), base + p)
+        return self
+
+    def add_rsi(self, periods: List[int] = [14], prefix: str = "RSI", src: str = "Close"):
+        source, base = self._source(src)
+        change = self._node(("diff", source), (source,),
+                            lambda x: np.concatenate(([np.nan], np.diff(x))))
+        gain = self._node(("gain", change), (change,), lambda d: np.where(d < 0, 0.0, d))
+        loss = self._node(("loss", change), (change,), lambda d: np.where(d > 0, 0.0, d))
+        for p in periods:
+            key = self._node(("rsi", source, p), (self._rma(gain, p), self._rma(loss, p)),
+                             lambda up, down: 100 * up / (up + np.abs(down)))
+            self._emit(f"{prefix}_{p}", key, base + ema_lookback(1 / p) + p)
+        return self
+
+    def add_macd(self, fast=12, slow=26, signal=9, prefix: str = "MACD", src: str = "Close"):
+        source, base = self._source(src)
+        line = self._node(("macd", source, fast, slow), (self._ema(source, fast), self._ema(source, slow)),
+                          lambda f, s: f - s)
+        signal_line = self._ema(line, signal)
+        hist = self._node(("sub", line, signal_line), (line, signal_line), lambda a, b: a - b)
+        lookback = base + ema_lookback(2 / (slow + 1)) + slow + ema_lookback(2 / (signal + 1)) + signal
+        for suffix, key in zip(["line", "hist", "signal"], [line, hist, signal_line]):
+            self._emit(f"{prefix}_{suffix}", key, lookback)
+        return self
+
+    def add_bollinger_bands(self, period=20, std=2, prefix: str = "BB", src: str = "Close"):
+        source, base = self._source(src)
+        mid = self._sma(source, period)
+        sd = self._node(("rstd", source, period), (source,), lambda x: native.rolling_std(x, period))
+        lower = self._node(("band", mid, sd, -std), (mid, sd), lambda m, s: m - std * s)
+        upper = self._node(("band", mid, sd, std), (mid, sd), lambda m, s: m + std * s)
+        bandwidth = self._node(("bbw", lower, upper), (lower, upper, mid),
+                               lambda lo, up, m: 100 * (up - lo) / m)
+        percent = self._node(("bbp", lower, upper), (source, lower, upper),
+                             lambda x, lo, up: (x - lo) / (up - lo))
+        for suffix, key in zip(["L", "M", "U", "Bw", "Bp"], [lower, mid, upper, bandwidth, percent]):
+            self._emit(f"{prefix}_{suffix}", key, base + period)
+        return self
+
+    def add_atr(self, period=14, prefix: str = "ATR"):
+        self._emit(f"{prefix}_{period}", self._rma(self._true_range(), period),
+                   ema_lookback(1 / period) + period + 1)
+        return self
+
+    def add_atr_sma(self, period=14, name: str = None):
+        """
+        简单移动平均口径的 ATR (真实波幅的 period 期 SMA), RiskManager 默认使用的止损/止盈波幅
+        :param name: 输出列名, 默认 14 期为 ATR, 其他周期为 ATR_SMA_{period}
+        """
+        if name is None:
+            name = "ATR" if period == 14 else f"ATR_SMA_{period}"
+        self._emit(name, self._sma(self._true_range_hl(), period), period + 1)
+        return self
+
+    def add_kdj(self, n=9, m1=3, m2=3, prefix: str = "KDJ"):
+        hh = self._node(("rmax", _col("High"), n), (_col("High"),), lambda x: native.rolling_max(x, n))
+        ll = self._node(("rmin", _col("Low"), n), (_col("Low"),), lambda x: native.rolling_min(x, n))
+        fastk = self._node(("fastk", n), (_col("Close"), hh, ll),
+                           lambda c, h, l: 100 * (c - l) / native._non_zero_range(h, l))
+        k = self._rma(fastk, m1)
+        d = self._rma(k, m2)
+        j = self._node(("kdj_j", k, d), (k, d), lambda k_, d_: 3 * k_ - 2 * d_)
+        lookback = n + ema_lookback(1 / m1) + ema_lookback(1 / m2)
+        for suffix, key in zip(["K", "D", "J"], [k, d, j]):
+            self._emit(f"{prefix}_{suffix}", key, lookback)
+        return self
+
+    def add_slope(self, col: str, window: int = 5, prefix: str = "Slope"):
+        source, base = self._source(col)
+
+        def slope(x):
+            out = np.full(len(x), np.nan)
+            out[window:] = (x[window:] - x[:-window]) / window
+            return out
+
+        self._emit(f"{prefix}_{col}_{window}", self._node(("slope", source, window), (source,), slope),
+                   base + window)
+        return self
+
+    # ---------- 查询与求值 ----------
+    @property
+    def outputs(self) -> List[str]:
+        return list(self._outputs)
+
+    @property
+    def n_nodes(self) -> int:
+        """去重后的节点数 (不含行情列)"""
+        return len(self._nodes)
+
+    def lookback(self) -> int:
+        """增量计算时需要保留的最长历史窗口"""
+        return max((lb for _, lb in self._outputs.values()), default=0)
+
+    def evaluate(self, source: Callable[[str], np.ndarray]) -> Dict[str, np.ndarray]:
+        """
+        求值整张计划
+        :param source: 行情列名 -> float64 数组
+        :return: {规范列名: 数组}, 顺序与登记顺序一致
+        """
+        memo = {}
+
+        # 同一数据源上的所有 SMA 一次累加和批量算出
+        sma_groups: Dict[tuple, List[int]] = {}
+        for key in self._nodes:
+            if key[0] == "sma":
+                sma_groups.setdefault(key[1], []).append(key[2])
+
+        def get(key):
+            if key in memo:
+                return memo[key]
+            if key[0] == "col":
+                memo[key] = np.asarray(source(key[1]), dtype=np.float64)
+            elif key[0] == "sma":
+                periods = sma_groups[key[1]]
+                means = native.rolling_means(get(key[1]), periods)
+                for j, p in enumerate(periods):
+                    memo[("sma", key[1], p)] = means[:, j]
+            else:
+                deps, fn = self._nodes[key]
+                memo[key] = fn(*[get(d) for d in deps])
+            return memo[key]
+
+        return {name: get(key) for name, (key, _) in self._outputs.items()}
+
+    @classmethod
+    def from_names(cls, names: List[str]) -> "IndicatorPlan":
+        """
+        由规范列名反推计划, 无参数的列名 (MACD_* / BB_* / KDJ_*) 使用默认参数
+        """
+        plan = cls()
+        for name in names:
+            if not _add_by_name(plan, name):
+                raise KeyError(f"无法识别的指标列名: {name}")
+        return plan
+
+
+_NAME_PATTERNS = [
+    (re.compile(r"^SMA_(\d+)$"), lambda plan, m: plan.add_sma([int(m[1])])),
+    (re.compile(r"^RSI_(\d+)$"), lambda plan, m: plan.add_rsi([int(m[1])])),
+    (re.compile(r"^ATR_(\d+)$"), lambda plan, m: plan.add_atr(int(m[1]))),
+    (re.compile(r"^ATR$"), lambda plan, m: plan.add_atr_sma(14)),
+    (re.compile(r"^ATR_SMA_(\d+)$"), lambda plan, m: plan.add_atr_sma(int(m[1]))),
+    (re.compile(r"^MACD_(line|hist|signal)$"), lambda plan, m: plan.add_macd()),
+    (re.compile(r"^BB_(L|M|U|Bw|Bp)$"), lambda plan, m: plan.add_bollinger_bands()),
+    (re.compile(r"^KDJ_(K|D|J)$"), lambda plan, m: plan.add_kdj()),
+]
+
+
+def _add_by_name(plan: IndicatorPlan, name: str, available=()) -> bool:
+    """
+    按规范列名登记指标
+    :param available: 已存在的列, 作为斜率等指标的数据源时直接读取, 不再登记
+    """
+    if name in plan.outputs:
+        return True
+    for pattern, add in _NAME_PATTERNS:
+        m = pattern.match(name)
+        if m:
+            add(plan, m)
+            return True
+    m = re.match(r"^Slope_(.+)_(\d+)$", name)
+    if m:
+        # 斜率的数据源本身也可能是指标, 先登记数据源
+        if m[1] not in available:
+            _add_by_name(plan, m[1], available)
+        plan.add_slope(m[1], int(m[2]))
+        return True
+    return False
+
+
+def resolve_features(df: pd.DataFrame, names: List[str]) -> Dict[str, np.ndarray]:
+    """
+    按规范列名取指标: df 中已有的列直接返回, 缺失的列通过指标计划补算 (中间量共享)
+    :return: {列名: float64 数组}
+    """
+    missing = [n for n in names if n not in df.columns]
+    computed = {}
+    if missing:
+        plan = IndicatorPlan()
+        for n in missing:
+            if not _add_by_name(plan, n, available=df.columns):
+                raise KeyError(f"无法识别的指标列名: {n}")
+        computed = plan.evaluate(lambda col: df[col].to_numpy(dtype=np.float64))
+    return {
+        n: computed[n] if n in computed else df[n].to_numpy(dtype=np.float64)
+        for n in names
+    }
@@ -4,17 +4,70 @@ import os
 import matplotlib.pyplot as plt
 import pandas as pd
 from sklearn.ensemble import RandomForestClassifier
+from sklearn.inspection import permutation_importance
 
 
 class FeatureImportanceEngine:
-    def __init__(self, report_path: str = "reports"):
+    def __init__(self, report_path: str = "reports", method: str = "model", n_jobs: int = -1,
+                 holdout: float = 0.2):
+        """
+        :param method: 重要性来源
+            model       -- 直接读取策略已训练模型的 feature_importances_ (无需再训练)
+            permutation -- 在留出样本上计算置换重要性 (n_jobs 并行), 衡量特征对样本外预测的实际贡献
+            refit       -- 单独训练一个随机森林 (没有可复用的模型时也会回退到这种方式)
+        :param holdout: 不知道模型的样本外区间时, 置换重要性使用最后多少比例的样本 (与 MLStrategy 默认的测试段一致)
+        """
         project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
         self.save_dir = os.path.join(project_root, report_path)
+        if method not in ("model", "permutation", "refit"):
+            raise ValueError(f"未知的特征重要性计算方式: {method}")
+        self.method = method
+        self.n_jobs = n_jobs
+        self.holdout = holdout
 
-    def analyze(self, symbol: str, df: pd.DataFrame):
+    def analyze(self, symbol: str, df: pd.DataFrame, model=None, X: pd.DataFrame = None,
+                holdout_start=None):
         """
-        利用随机森林分析特征对未来涨跌的影响力
+        分析特征对未来涨跌的影响力
+        :param model: 策略已训练好的模型, 提供时不再训练新模型
+        :param X: 与 model 训练时列顺序一致的特征矩阵 (行与 df 对齐)
+        :param holdout_start: model 的样本外起始日期, 置换重要性只在此后的行上计算 (None 时取最后 holdout 比例)
         """
+        if model is None or X is None or self.method == "refit":
+            importances = self._refit_importances(df)
+        else:
+            importances = self._model_importances(df, model, X, holdout_start, symbol)
+        importances = importances.sort_values(ascending=True)
+
+        # 可视化并保存
+        plt.figure(figsize=(10, 8))
+        importances.plot(kind="barh", color="skyblue")
+        plt.title(f"Feature Importance Analysis: {symbol}")
+        plt.xlabel("Importance Score")
+        plt.tight_layout()
+
+        # --- 增加子文件夹路径 ---
+        symbol_dir = os.path.join(self.save_dir, symbol)
+        os.makedirs(symbol_dir, exist_ok=True)
+
+        img_path = os.path.join(symbol_dir, f"{symbol}_feature_importance.png")
+        plt.savefig(img_path)
+        plt.close()
+
+        # --- 保存为 JSON 数据 ---
+        json_save_path = os.path.join(symbol_dir, f"{symbol}_feature_importance.json")
+        with open(json_save_path, "w", encoding="utf-8") as f:
+            # 只取前 5 个最重要的特征存入 JSON，方便摘要显示
+            top_features = importances.tail(5).to_dict()
+            json.dump(top_features, f, indent=4)
+
+        print(f"🤖 [AI] 特征重要性分析已完成: {img_path}")
+
+        return top_features
+
+    @staticmethod
+    def _refit_importances(df: pd.DataFrame) -> pd.Series:
+        """利用随机森林分析特征对未来涨跌的影响力"""
         # 1. 准备标签：预测未来 5 天的收盘价是否高于今天 (1为涨, 0为跌)
         df = df.copy()
         df["Target"] = (df["Close"].shift(-5) > df["Close"]).astype(int)
@@ -50,32 +103,39 @@ class FeatureImportanceEngine:
         model.fit(X, y)
 
         # 4. 提取特征重要性
-        importances = pd.Series(model.feature_importances_, index=features).sort_values(
-            ascending=True
-        )
-
-        # 5. 可视化并保存
-        plt.figure(figsize=(10, 8))
-        importances.plot(kind="barh", color="skyblue")
-        plt.title(f"Feature Importance Analysis: {symbol}")
-        plt.xlabel("Importance Score")
-        plt.tight_layout()
-
-        # --- 增加子文件夹路径 ---
-        symbol_dir = os.path.join(self.save_dir, symbol)
-        os.makedirs(symbol_dir, exist_ok=True)
-
-        img_path = os.path.join(symbol_dir, f"{symbol}_feature_importance.png")
-        plt.savefig(img_path)
-        plt.close()
+        return pd.Series(model.feature_importances_, index=features)
 
-        # --- 保存为 JSON 数据 ---
-        json_save_path = os.path.join(symbol_dir, f"{symbol}_feature_importance.json")
-        with open(json_save_path, "w", encoding="utf-8") as f:
-            # 只取前 5 个最重要的特征存入 JSON，方便摘要显示
-            top_features = importances.tail(5).to_dict()
-            json.dump(top_features, f, indent=4)
-
-        print(f"🤖 [AI] 特征重要性分析已完成: {img_path}")
-
-        return top_features
+    def _model_importances(self, df: pd.DataFrame, model, X: pd.DataFrame, holdout_start=None,
+                           symbol: str = "") -> pd.Series:
+        """复用已训练模型: 直接读取树的重要性, 或在样本外的留出行上计算置换重要性"""
+        values = None
+        if self.method == "permutation":
+            # X 来自信号阶段的数据, 与回测结果 df 的行不一定相同; 先对齐到 df, 缺失的行由下面的掩码剔除
+            X = X.reindex(df.index)
+            future = df["Close"].shift(-5)
+            y = (future > df["Close"]).astype(int)
+            valid = (X.notna().all(axis=1) & future.notna()).to_numpy()
+            X_valid, y_valid = X[valid], y[valid]
+            if holdout_start is not None:
+                # 只用模型训练之后的行, 否则 (如滚动训练的最后一个模型) 留出样本大多在训练集内
+                in_holdout = (X_valid.index >= holdout_start)
+                X_holdout, y_holdout = X_valid[in_holdout], y_valid[in_holdout]
+            else:
+                n_holdout = max(int(len(X_valid) * self.holdout), 1)
+                X_holdout, y_holdout = X_valid.iloc[-n_holdout:], y_valid.iloc[-n_holdout:]
+            if len(X_holdout) == 0:
+                print(f"⚠️ [{symbol}] 模型训练之后没有可用的样本外数据, 改用模型自带的特征重要性")
+            else:
+                # 以 DataFrame 训练的模型带有列名, 以数组训练的 (混合/滚动训练) 则没有
+                if not hasattr(model, "feature_names_in_"):
+                    X_holdout = X_holdout.to_numpy()
+                result = permutation_importance(
+                    model, X_holdout, y_holdout, n_repeats=5,
+                    random_state=42, n_jobs=self.n_jobs,
+                )
+                values = result.importances_mean
+        if values is None:
+            values = model.feature_importances_
+        importances = pd.Series(values, index=X.columns)
+        # 混合训练的股票哑变量不属于因子, 不参与排名
+        return importances[~importances.index.str.startswith("Symbol_")]
@@ -1,47 +1,170 @@
+import os
+from typing import Callable, Dict, Iterable, List, Optional, Union
+
+import joblib
+import numpy as np
 import pandas as pd
-from sklearn.decomposition import PCA
+from sklearn.decomposition import PCA, IncrementalPCA
 from sklearn.preprocessing import StandardScaler
 
+Frames = Union[pd.DataFrame, Iterable[pd.DataFrame], Callable[[], Iterable[pd.DataFrame]]]
+
 
 class FeatureProcessor:
-    def __init__(self, n_components: float = 0.95):
+    """
+    标准化 + PCA 因子合成. fit 与 transform 分离:
+        fit       -- 只在训练区间 (fit_end 之前) 的样本上拟合一次, 可跨股票合并拟合, 拟合结果可持久化复用
+        transform -- 用拟合好的参数变换任意行, 增量追加的新 K 线不会改变旧行的 PCA 值
+    """
+
+    # 不参与因子合成的列
+    EXCLUDE = [
+        "Open",
+        "High",
+        "Low",
+        "Close",
+        "Volume",
+        "Signal",
+        "Target",
+        "Market_Return",
+        "Strategy_Return",
+    ]
+
+    def __init__(self, n_components: float = 0.95, incremental: bool = False, batch_size: int = 4096):
         """
-        :param n_components: 保留多少比例的方差（0.95 表示保留能解释 95% 信息的特征组合）
+        :param n_components: 保留多少比例的方差（0.95 表示保留能解释 95% 信息的特征组合）, 也可以是整数维度
+        :param incremental: 使用 IncrementalPCA 按块 partial_fit, 拟合大股票池时内存只与块大小有关
+        :param batch_size: 增量拟合时每块的行数
         """
+        self.n_components = n_components
+        self.incremental = incremental
+        self.batch_size = batch_size
         self.scaler = StandardScaler()
-        self.pca = PCA(n_components=n_components)
+        self.pca = IncrementalPCA() if incremental else PCA(n_components=n_components)
         self.feature_cols = []
+        self.pca_cols = []
+        # 标准化与投影合并成一次仿射变换: X @ weights + offset
+        self._weights = None
+        self._offset = None
+        # 持久化时记录拟合所用的配置与股票池, 用于判断能否复用
+        self.key = None
 
-    def fit_transform(self, df: pd.DataFrame):
+    def _select_features(self, df: pd.DataFrame) -> List[str]:
+        return [
+            c for c in df.columns
+            if c not in self.EXCLUDE and not c.startswith("Cumulative") and not c.startswith("PCA_")
+        ]
+
+    def _matrix(self, df: pd.DataFrame) -> np.ndarray:
+        """特征矩阵: 先向前填充, 再对剩余的空值填 0 (在一份 float64 数组上原地完成, 不复制 DataFrame)"""
+        X = df[self.feature_cols].to_numpy(dtype=np.float64, copy=True)
+        mask = np.isnan(X)
+        if mask.any():
+            idx = np.where(mask, 0, np.arange(len(X))[:, None])
+            np.maximum.accumulate(idx, axis=0, out=idx)
+            X = X[idx, np.arange(X.shape[1])]
+            X[np.isnan(X)] = 0.0
+        return X
+
+    @staticmethod
+    def _iter_frames(frames: Frames) -> Iterable[pd.DataFrame]:
+        if isinstance(frames, pd.DataFrame):
+            return [frames]
+        if callable(frames):
+            return frames()
+        return frames
+
+    def _batches(self, frames: Frames, fit_end) -> Iterable[np.ndarray]:
+        """逐块产出训练区间的特征矩阵, 块的行数不少于特征数 (IncrementalPCA 的要求)"""
+        carry = None
+        for df in self._iter_frames(frames):
+            if not self.feature_cols:
+                self.feature_cols = self._select_features(df)
+            X = self._matrix(df.loc[:fit_end] if fit_end is not None else df)
+            if carry is not None:
+                X, carry = np.vstack([carry, X]), None
+            for start in range(0, len(X), self.batch_size):
+                chunk = X[start:start + self.batch_size]
+                if len(chunk) < len(self.feature_cols):
+                    carry = chunk
+                else:
+                    yield chunk
+        if carry is not None and len(carry):
+            yield carry
+
+    def fit(self, frames: Frames, fit_end=None):
         """
-        对特征进行标准化和 PCA 降维（已修复 FutureWarning）
+        拟合标准化与 PCA
+        :param frames: 单个 DataFrame、多个 DataFrame (如各股票), 或返回其迭代器的无参函数;
+                       增量模式需要遍历两遍, 传入生成器时请包装成函数以便按需重新读取
+        :param fit_end: 只使用该日期 (含) 之前的行拟合, 避免测试区间的信息泄露到因子中
         """
-        # 1. 自动识别特征列
-        exclude = [
-            "Open",
-            "High",
-            "Low",
-            "Close",
-            "Volume",
-            "Signal",
-            "Target",
-            "Market_Return",
-            "Strategy_Return",
-        ]
-        self.feature_cols = [
-            c for c in df.columns if c not in exclude and not c.startswith("Cumulative")
-        ]
+        self.feature_cols = []
+        if not self.incremental:
+            blocks = []
+            for df in self._iter_frames(frames):
+                if not self.feature_cols:
+                    self.feature_cols = self._select_features(df)
+                blocks.append(self._matrix(df.loc[:fit_end] if fit_end is not None else df))
+            self.pca.fit(self.scaler.fit_transform(np.vstack(blocks)))
+            components, pca_mean = self.pca.components_, self.pca.mean_
+        else:
+            # 两遍流式拟合: 第一遍累计均值/方差, 第二遍在标准化后的块上 partial_fit
+            for chunk in self._batches(frames, fit_end):
+                self.scaler.partial_fit(chunk)
+            for chunk in self._batches(frames, fit_end):
+                self.pca.partial_fit(self.scaler.transform(chunk))
+            components, pca_mean = self.pca.components_, self.pca.mean_
+            k = self.n_components
+            if isinstance(k, float):
+                # 按累计解释方差比例截取主成分
+                k = int(np.searchsorted(np.cumsum(self.pca.explained_variance_ratio_), k) + 1)
+            components = components[:min(int(k), len(components))]
 
-        # 2. 现代化的缺失值处理：先向前填充，再对剩余的空值填 0
-        X = df[self.feature_cols].ffill().fillna(0)
+        scale = self.scaler.scale_
+        self._weights = (components / scale).T
+        self._offset = -(self.scaler.mean_ / scale + pca_mean) @ components.T
+        self.pca_cols = [f"PCA_{i+1}" for i in range(len(components))]
+        return self
 
-        # 3. 标准化
-        X_scaled = self.scaler.fit_transform(X)
+    def transform(self, df: pd.DataFrame) -> pd.DataFrame:
+        """:return: 只包含 PCA 列的 DataFrame (与 df 同索引)"""
+        return pd.DataFrame(self._matrix(df) @ self._weights + self._offset,
+                            columns=self.pca_cols, index=df.index)
 
-        # 4. PCA 正交化
-        X_pca = self.pca.fit_transform(X_scaled)
+    def transform_many(self, frames: Dict[str, pd.DataFrame]) -> Dict[str, pd.DataFrame]:
+        """所有股票的特征矩阵叠在一起, 一次矩阵乘法完成变换, 再按股票拆分"""
+        if not frames:
+            return {}
+        blocks = [self._matrix(df) for df in frames.values()]
+        Z = np.vstack(blocks) @ self._weights + self._offset
+        out, row = {}, 0
+        for (symbol, df), block in zip(frames.items(), blocks):
+            out[symbol] = pd.DataFrame(Z[row:row + len(block)], columns=self.pca_cols, index=df.index)
+            row += len(block)
+        return out
+
+    def fit_transform(self, df: pd.DataFrame):
+        """
+        对单只股票拟合并变换 (使用全部历史)
+        :return: (附加 PCA 列的 DataFrame, PCA 列名)
+        """
+        self.fit(df)
+        return pd.concat([df, self.transform(df)], axis=1), self.pca_cols
 
-        pca_cols = [f"PCA_{i+1}" for i in range(X_pca.shape[1])]
-        pca_df = pd.DataFrame(X_pca, columns=pca_cols, index=df.index)
+    # ---------- 持久化 ----------
+    def save(self, path: str):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + ".tmp"
+        joblib.dump(self, tmp_path)
+        os.replace(tmp_path, path)
 
-        return pd.concat([df, pca_df], axis=1), pca_cols
+    @staticmethod
+    def load(path: str, key: str = None) -> Optional["FeatureProcessor"]:
+        """:return: 已保存的处理器; 文件不存在或 key 不一致时返回 None"""
+        if not os.path.exists(path):
+            return None
+        processor = joblib.load(path)
+        if key is not None and processor.key != key:
+            return None
+        return processor
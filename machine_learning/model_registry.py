@@ -0,0 +1,153 @@
+import hashlib
+import json
+import os
+from typing import Any, Dict, List, Optional, Set
+
+import joblib
+import pandas as pd
+
+
+class ModelRegistry:
+    """
+    已训练模型的磁盘注册表: {root}/{key}.joblib + {key}.json (元数据)
+    key = 股票 + 特征顺序 + 超参数 + 训练区间 + 训练数据哈希, 任一项变化都会得到新 key,
+    因此命中即可直接加载, 无需判断过期; 特征与数据不变时重复回测跳过训练
+    数据每次更新都会产生新 key, 每只股票只保留最近使用的 keep_per_symbol 个模型, 更早的在保存时删除
+    """
+
+    SUFFIX = ".joblib"
+
+    def __init__(self, root: str = "storage/models", mmap: bool = False, keep_per_symbol: Optional[int] = 32):
+        """
+        :param root: 模型目录, 相对路径以项目根目录为基准
+        :param mmap: 以内存映射方式加载模型中的数组 (树的节点表等), 多进程加载同一模型时共享页缓存;
+                     单进程加载大量小模型时逐个映射反而更慢, 默认关闭
+        :param keep_per_symbol: 每只股票保留的模型数 (按最近保存/命中的时间), None 表示不清理;
+                                滚动训练每条重训链一个模型, 应不小于单次回测的链数, 否则会反复重训
+        """
+        project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        self.root = os.path.join(project_root, root)
+        self.mmap = mmap
+        self.keep_per_symbol = keep_per_symbol
+        # 股票 -> 该股票的 key 集合, 首次保存时扫描元数据建立
+        self._symbols: Optional[Dict[str, Set[str]]] = None
+        os.makedirs(self.root, exist_ok=True)
+
+    @staticmethod
+    def data_hash(df: pd.DataFrame) -> str:
+        """训练数据 (含索引) 的内容哈希"""
+        hashed = pd.util.hash_pandas_object(df, index=True).to_numpy()
+        h = hashlib.sha256(hashed.tobytes())
+        h.update(json.dumps(list(map(str, df.columns))).encode("utf-8"))
+        return h.hexdigest()
+
+    @staticmethod
+    def make_key(symbol: str, features: List[str], params: dict, start, end, data_hash: str) -> str:
+        payload = json.dumps(
+            {
+                "symbol": symbol,
+                "features": list(features),
+                "params": params,
+                "start": str(start),
+                "end": str(end),
+                "data": data_hash,
+            },
+            sort_keys=True, default=str,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, key + self.SUFFIX)
+
+    def _meta_path(self, key: str) -> str:
+        return os.path.join(self.root, key + ".json")
+
+    def has(self, key: str) -> bool:
+        return os.path.exists(self._path(key))
+
+    def load(self, key: str) -> Optional[Any]:
+        """:return: 已保存的对象, 未命中时返回 None"""
+        if not self.has(key):
+            return None
+        obj = joblib.load(self._path(key), mmap_mode="r" if self.mmap else None)
+        # 命中即刷新修改时间, 清理时按最近使用排序
+        try:
+            os.utime(self._path(key))
+        except OSError:
+            pass
+        return obj
+
+    def save(self, key: str, obj: Any, meta: dict = None):
+        """保存对象与元数据 (先写临时文件再替换, 并发写入同一个 key 也不会留下半个文件)"""
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        joblib.dump(obj, tmp_path)
+        os.replace(tmp_path, path)
+        if meta is not None:
+            with open(self._meta_path(key), "w", encoding="utf-8") as f:
+                json.dump(meta, f, indent=4, ensure_ascii=False, default=str)
+            if meta.get("symbol") is not None:
+                self._index().setdefault(str(meta["symbol"]), set()).add(key)
+                self.prune(str(meta["symbol"]))
+
+    def _index(self) -> Dict[str, Set[str]]:
+        """按元数据中的 symbol 对已保存的模型分组 (没有元数据的模型不参与清理)"""
+        if self._symbols is None:
+            self._symbols = {}
+            for name in os.listdir(self.root):
+                key, ext = os.path.splitext(name)
+                if ext != ".json" or not self.has(key):
+                    continue
+                try:
+                    with open(os.path.join(self.root, name), encoding="utf-8") as f:
+                        symbol = json.load(f).get("symbol")
+                except (OSError, ValueError):
+                    continue
+                if symbol is not None:
+                    self._symbols.setdefault(str(symbol), set()).add(key)
+        return self._symbols
+
+    def prune(self, symbol: str) -> List[str]:
+        """
+        删除该股票最近最少使用的模型, 只保留 keep_per_symbol 个
+        :return: 被删除的 key
+        """
+        keys = self._index().get(symbol)
+        if not keys or self.keep_per_symbol is None or len(keys) <= self.keep_per_symbol:
+            return []
+        mtimes = {}
+        for key in keys:
+            try:
+                mtimes[key] = os.path.getmtime(self._path(key))
+            except OSError:
+                # 已被其他进程删除
+                mtimes[key] = float("-inf")
+        stale = sorted(keys, key=mtimes.get)[:len(keys) - self.keep_per_symbol]
+        for key in stale:
+            for path in (self._path(key), self._meta_path(key)):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+            keys.discard(key)
+        return stale
+
+    def get_or_fit(self, symbol: str, features: List[str], params: dict, data: pd.DataFrame, fit):
+        """
+        命中则加载, 否则调用 fit() 训练并保存
+        :param data: 训练数据 (特征 + 标签), 用于计算数据哈希与训练区间
+        :param fit: 无参数的训练函数, 返回要保存的对象
+        :return: (对象, 是否命中)
+        """
+        data_hash = self.data_hash(data)
+        start, end = (data.index[0], data.index[-1]) if len(data) else (None, None)
+        key = self.make_key(symbol, features, params, start, end, data_hash)
+        obj = self.load(key)
+        if obj is not None:
+            return obj, True
+        obj = fit()
+        self.save(key, obj, meta={
+            "symbol": symbol, "features": list(features), "params": params,
+            "train_start": start, "train_end": end, "data_hash": data_hash,
+        })
+        return obj, False
@@ -0,0 +1,197 @@
+from typing import List, Optional
+
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestClassifier
+
+from utils.helpers import parallel_map
+
+
+class WalkForwardTrainer:
+    """
+    滚动 (walk-forward) 训练: 按 test_window 把样本外区间切成连续窗口, 每个窗口只用其之前的数据训练,
+    拼接各窗口的预测得到完整的样本外概率序列
+
+    每 retrain_every 个窗口组成一条"链", 链首完整训练一个新模型, 链内后续窗口按特征漂移决定:
+        漂移 <= drift_threshold      -> 直接复用上一个模型
+        否则且 warm_start_trees > 0  -> 热启动, 在新窗口上追加 warm_start_trees 棵树
+        否则                          -> 完整重训
+    各链互不依赖, 可多进程并行; 链长有上限, 森林规模与总耗时因此有界
+    """
+
+    def __init__(
+        self,
+        train_window: Optional[int] = 504,
+        test_window: int = 63,
+        retrain_every: int = 4,
+        warm_start_trees: int = 20,
+        drift_threshold: float = 0.25,
+        horizon: int = 5,
+        n_estimators: int = 100,
+        max_depth: int = 10,
+        random_state: int = 42,
+        workers: int = 1,
+    ):
+        """
+        :param train_window: 训练窗口长度 (K 线数), None 表示扩张窗口 (使用之前的全部数据)
+        :param test_window: 每个窗口的样本外预测长度, 即重训频率
+        :param retrain_every: 每隔多少个窗口完整重训一次 (1 表示每个窗口都重训)
+        :param warm_start_trees: 热启动时追加的树数量, 0 表示不热启动
+        :param drift_threshold: 特征漂移 (最大标准化均值偏移) 不超过该值时复用模型, 0 表示不复用
+        :param horizon: 标签的预测期 (K 线数); 训练集末尾留出同样长度的间隔, 避免标签偷看测试区间
+        :param workers: 并行处理各链的进程数, 含义同 resolve_workers
+        """
+        if test_window < 1 or retrain_every < 1:
+            raise ValueError("test_window 与 retrain_every 必须为正整数")
+        self.train_window = train_window
+        self.test_window = test_window
+        self.retrain_every = retrain_every
+        self.warm_start_trees = warm_start_trees
+        self.drift_threshold = drift_threshold
+        self.horizon = horizon
+        self.model_params = {
+            "n_estimators": n_estimators, "max_depth": max_depth, "random_state": random_state,
+        }
+        self.workers = workers
+        # 影响结果的全部参数, 用作模型注册表 key 的一部分
+        self.config = {
+            "train_window": train_window, "test_window": test_window, "retrain_every": retrain_every,
+            "warm_start_trees": warm_start_trees, "drift_threshold": drift_threshold,
+            "horizon": horizon, **self.model_params,
+        }
+
+    def windows(self, n: int) -> List[tuple]:
+        """
+        切分窗口
+        :param n: 样本行数
+        :return: [(train_start, train_end, test_start, test_end), ...] 位置区间, 左闭右开
+        """
+        first_test = (self.train_window or self.test_window) + self.horizon
+        out = []
+        for test_start in range(first_test, n, self.test_window):
+            train_end = test_start - self.horizon
+            train_start = 0 if self.train_window is None else max(0, train_end - self.train_window)
+            out.append((train_start, train_end, test_start, min(test_start + self.test_window, n)))
+        return out
+
+    def run(self, X: pd.DataFrame, y: pd.Series, registry=None, symbol: str = None):
+        """
+        :param X: 特征 (按时间排序, 无空值)
+        :param y: 标签, 末尾 horizon 行未知时为 NaN (不参与训练)
+        :param registry: ModelRegistry, 按链缓存训练结果; 链内数据未变时直接加载, 只训练新增或变化的链
+        :param symbol: 注册表 key 中的股票代码
+        :return: (probs, log, model)
+            probs: 与 X 等长的上涨概率, 不在任何测试窗口内的行为 NaN
+            log: 每个窗口一行的训练记录 (日期区间、动作、漂移、树数量)
+            model: 最后一个窗口使用的模型, 样本不足时为 None; 其样本外区间见 out_of_sample_start(log)
+        """
+        windows = self.windows(len(X))
+        probs = np.full(len(X), np.nan)
+        if not windows:
+            return probs, pd.DataFrame(), None
+
+        values = X.to_numpy(dtype=np.float64)
+        labels = y.to_numpy(dtype=np.float64)
+        chains = [windows[i:i + self.retrain_every] for i in range(0, len(windows), self.retrain_every)]
+        results, keys, tasks = [None] * len(chains), [None] * len(chains), {}
+        for i, chain in enumerate(chains):
+            # 每条链只传递它用到的行, 减少进程间拷贝
+            lo, hi = chain[0][0], chain[-1][3]
+            if registry is not None:
+                data = pd.concat([X.iloc[lo:hi], y.iloc[lo:hi].rename("Target")], axis=1)
+                keys[i] = registry.make_key(symbol, list(X.columns), self.config, X.index[lo],
+                                            X.index[hi - 1], registry.data_hash(data))
+                results[i] = registry.load(keys[i])
+                if results[i] is not None:
+                    continue
+            local = [(a - lo, b - lo, c - lo, d - lo) for a, b, c, d in chain]
+            tasks[i] = (values[lo:hi], labels[lo:hi], local, self)
+        for i, result in zip(tasks, parallel_map(_run_chain, tasks.values(), self.workers)):
+            results[i] = result
+            if registry is not None:
+                registry.save(keys[i], result, meta={
+                    "symbol": symbol, "features": list(X.columns), "params": self.config,
+                    "train_start": X.index[chains[i][0][0]], "test_end": X.index[chains[i][-1][3] - 1],
+                })
+
+        records = []
+        for chain, (chain_probs, chain_log, model) in zip(chains, results):
+            for (a, b, c, d), p, (action, drift, n_trees) in zip(chain, chain_probs, chain_log):
+                probs[c:d] = p
+                records.append({
+                    "train_start": X.index[a], "train_end": X.index[b - 1],
+                    "test_start": X.index[c], "test_end": X.index[d - 1],
+                    "action": action, "drift": drift, "n_trees": n_trees,
+                })
+        return probs, pd.DataFrame(records), model
+
+    @staticmethod
+    def out_of_sample_start(log: pd.DataFrame):
+        """
+        run 返回的模型的样本外起点: 该模型最近一次训练 (fit / warm_start) 所在窗口的 test_start,
+        之前的行可能属于它的训练数据 (包括训练窗口之后 horizon 行的标签间隔)
+        :return: 日期, log 为空时为 None
+        """
+        if log.empty:
+            return None
+        trained = log.loc[log["action"] != "reuse", "test_start"]
+        return trained.iloc[-1] if len(trained) else None
+
+    # ---------- 单条链 ----------
+    def _fit(self, X: np.ndarray, y: np.ndarray):
+        if len(np.unique(y)) < 2:
+            return None
+        model = RandomForestClassifier(**self.model_params)
+        model.fit(X, y.astype(int))
+        return model
+
+    def _warm_start(self, model, X: np.ndarray, y: np.ndarray):
+        """在原森林上追加 warm_start_trees 棵只用新窗口训练的树; 类别不一致时无法热启动, 改为重训"""
+        if not np.array_equal(np.unique(y), model.classes_):
+            return self._fit(X, y), "fit"
+        model.set_params(warm_start=True, n_estimators=model.n_estimators + self.warm_start_trees)
+        model.fit(X, y.astype(int))
+        return model, "warm_start"
+
+    @staticmethod
+    def _drift(reference: tuple, X: np.ndarray) -> float:
+        """当前训练窗口相对参考窗口的最大标准化均值偏移"""
+        mean, std = reference
+        return float(np.max(np.abs(X.mean(axis=0) - mean) / np.where(std > 0, std, 1.0)))
+
+    @staticmethod
+    def _predict_up(model, X: np.ndarray) -> np.ndarray:
+        if model is None or 1 not in model.classes_:
+            return np.zeros(len(X))
+        return model.predict_proba(X)[:, list(model.classes_).index(1)]
+
+
+def _run_chain(values: np.ndarray, labels: np.ndarray, chain: List[tuple], trainer: WalkForwardTrainer):
+    """
+    按顺序处理一条链 (可在子进程中运行)
+    :return: (每个窗口的预测概率, 每个窗口的 (动作, 漂移, 树数量), 最后的模型)
+    """
+    model, reference = None, None
+    chain_probs, chain_log = [], []
+    for i, (a, b, c, d) in enumerate(chain):
+        known = ~np.isnan(labels[a:b])
+        X_train, y_train = values[a:b][known], labels[a:b][known]
+
+        drift = np.nan
+        if i == 0 or model is None:
+            model, action = trainer._fit(X_train, y_train), "fit"
+        else:
+            drift = trainer._drift(reference, X_train)
+            if drift <= trainer.drift_threshold:
+                action = "reuse"
+            elif trainer.warm_start_trees > 0:
+                model, action = trainer._warm_start(model, X_train, y_train)
+            else:
+                model, action = trainer._fit(X_train, y_train), "fit"
+        if action != "reuse":
+            # 漂移始终相对模型最近一次训练所用的数据衡量
+            reference = (X_train.mean(axis=0), X_train.std(axis=0))
+
+        chain_probs.append(trainer._predict_up(model, values[c:d]))
+        chain_log.append((action, drift, model.n_estimators if model is not None else 0))
+    return chain_probs, chain_log, model
@@ -1,12 +1,16 @@
+from core.data_engine import enable_copy_on_write
 from core.workflow import WorkflowManager
+from machine_learning.model_registry import ModelRegistry
 from strategies.ml_strategy import MLStrategy
-
-# from strategies.simple_strategy import MaRsiStrategy # 也可以按需导入
+from strategies.simple_strategy import MaRsiStrategy
 
 
 def main():
     # 实例化指挥官
     flow = WorkflowManager()
+    # 只读缓存依赖写时复制, 它是进程级设置, 只在程序入口开启
+    if flow.cfg.get("cache", {}).get("read_only", False):
+        enable_copy_on_write()
 
     # 执行流水线
     flow.sync_data()
@@ -15,11 +19,24 @@ def main():
     # 动态选择策略
     # 你可以从配置中读取，这里演示直接传入 AI 策略
     ai_strategy = MLStrategy(
-        symbols=flow.cfg["backtest"]["symbols"], prob_threshold=0.52
+        symbols=flow.cfg["backtest"]["symbols"], prob_threshold=0.52,
+        walk_forward=flow.cfg["strategy"].get("walk_forward"),
+        pooled=flow.cfg["strategy"].get("pooled", False),
+        registry=ModelRegistry(flow.cfg["paths"].get("models", "storage/models"),
+                               keep_per_symbol=flow.cfg["strategy"].get("model_registry_keep", 32))
+        if flow.cfg["strategy"].get("model_registry", False) else None,
     )
 
     flow.run_backtest(ai_strategy)
 
+    # 可选: 对支持向量化扫描的规则策略做参数扫描
+    if flow.cfg["strategy"].get("param_sweep", False):
+        params = flow.cfg["strategy"]["params"]
+        flow.run_param_sweep(MaRsiStrategy(
+            symbols=flow.cfg["backtest"]["symbols"], sma_s=params["sma_short"],
+            sma_l=params["sma_long"], rsi_limit=params["rsi_limit"],
+        ))
+
     # 汇总
     flow.finalize()
 
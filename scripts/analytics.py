@@ -1,25 +1,29 @@
 import numpy as np
 
+from core.resampler import infer_bars_per_year
+
 
 class StrategyAnalytics:
     @staticmethod
-    def calculate_performance(df):
+    def calculate_performance(df, bars_per_year=None):
         """
         输入包含 Strategy_Return 的 DataFrame，输出各项性能指标
+        :param bars_per_year: 年化系数 (每年 K 线数), None 表示按索引的时间间隔推断 (日线 252)
         """
+        bars_per_year = bars_per_year or infer_bars_per_year(df.index)
         # 移除空值（第一行通常是 NaN）
         returns = df['Strategy_Return'].dropna()
 
         # 1. 累计收益
         total_return = (1 + returns).prod() - 1
 
-        # 2. 年化收益 (假设一年 252 个交易日)
-        ann_return = (1 + total_return) ** (252 / len(returns)) - 1
+        # 2. 年化收益
+        ann_return = (1 + total_return) ** (bars_per_year / len(returns)) - 1
 
         # 3. 夏普比率 (假设无风险利率为 2%)
         risk_free_rate = 0.02
-        excess_returns = returns - risk_free_rate / 252
-        sharpe_ratio = np.sqrt(252) * excess_returns.mean() / returns.std()
+        excess_returns = returns - risk_free_rate / bars_per_year
+        sharpe_ratio = np.sqrt(bars_per_year) * excess_returns.mean() / returns.std()
 
         # 4. 最大回撤
         cum_returns = (1 + returns).cumprod()
@@ -0,0 +1,38 @@
+"""
+事件驱动引擎基准测试: 吞吐量 (事件/秒) 以及 fill_delay=0、无成本时与矩阵模式的一致性
+用法: python scripts/bench_event.py
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.event_engine import EventEngine, PercentCommission, VolumeImpactSlippage
+from core.portfolio_engine import PortfolioEngine
+from scripts.bench_portfolio import make_signals
+
+
+def main():
+    # 预热: 触发 numba 编译 (或加载编译缓存)
+    EventEngine().run_portfolio(make_signals(2, 50))
+
+    print(f"{'symbols':>8} {'events':>10} {'seconds':>8} {'events/s':>12} {'max_diff':>10} {'cost_nav':>12}")
+    for n in [10, 100, 500, 1000]:
+        signals = make_signals(n, n_days=2500)
+
+        matrix = PortfolioEngine(initial_capital=100000, max_stock_weight=0.15).run_portfolio_matrix(signals)
+        engine = EventEngine(initial_capital=100000, max_stock_weight=0.15, fill_delay=0)
+        res = engine.run_portfolio(signals)
+        diff = (res["Total_Equity"] - matrix["Total_Equity"]).abs().max()
+
+        costly = EventEngine(initial_capital=100000, max_stock_weight=0.15, fill_delay=1,
+                             commission=PercentCommission(0.0005),
+                             slippage=VolumeImpactSlippage(impact=0.1, bps=2))
+        nav = costly.run_portfolio(signals)["Total_Equity"].iloc[-1]
+        s = costly.stats
+        print(f"{n:>8} {s['events']:>10} {s['seconds']:>8.3f} {s['events_per_sec']:>12,.0f} "
+              f"{diff:>10.2e} {nav:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
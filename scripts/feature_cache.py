@@ -0,0 +1,43 @@
+"""
+特征缓存管理
+用法:
+    python scripts/feature_cache.py list
+    python scripts/feature_cache.py invalidate AAPL NVDA
+    python scripts/feature_cache.py invalidate --all
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.feature_cache import FeatureCache
+from utils.helpers import load_config
+
+
+def main():
+    parser = argparse.ArgumentParser(description="特征缓存管理")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("list", help="列出所有缓存条目")
+    inv = sub.add_parser("invalidate", help="使缓存失效, 下次运行重新计算")
+    inv.add_argument("symbols", nargs="*", help="需要失效的股票代码")
+    inv.add_argument("--all", action="store_true", help="使全部缓存失效")
+    args = parser.parse_args()
+
+    cfg = load_config()
+    project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    cache = FeatureCache(os.path.join(project_root, cfg["paths"]["processed_data"]))
+
+    if args.command == "list":
+        for symbol, entry in cache.entries().items():
+            print(f"{symbol:<8} raw={entry['raw'][:12]} spec={entry['spec'][:12]}")
+        return
+
+    if not args.all and not args.symbols:
+        parser.error("请指定股票代码或使用 --all")
+    removed = cache.invalidate(None if args.all else args.symbols)
+    print(f"已失效 {len(removed)} 条特征缓存: {', '.join(removed)}")
+
+
+if __name__ == "__main__":
+    main()
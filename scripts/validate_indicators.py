@@ -0,0 +1,94 @@
+"""
+指标校验：用合成行情对比 IndicatorCalculator (生产环境的指标计划) 与 pandas_ta 的结果，并比较两者耗时
+用法: python scripts/validate_indicators.py  (需要安装 pandas_ta)
+"""
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from data.sources import SyntheticSource
+from indicators.indicator_calculator import IndicatorCalculator
+
+PERIODS = [5, 10, 20, 60, 120]
+RSI_PERIODS = [6, 14, 24]
+
+
+def max_rel_diff(ours: pd.Series, ref: pd.Series) -> float:
+    ours = ours.to_numpy(dtype=np.float64)
+    ref = ref.to_numpy(dtype=np.float64)
+    if not np.array_equal(np.isnan(ours), np.isnan(ref)):
+        return np.inf
+    mask = ~np.isnan(ref)
+    return float(np.max(np.abs(ours[mask] - ref[mask]) / np.maximum(np.abs(ref[mask]), 1.0)))
+
+
+def calculate(df: pd.DataFrame) -> pd.DataFrame:
+    """与特征工程相同的指标链 (保留冷启动的 NaN, 便于逐行对比), 另加 ATR / KDJ 与 RiskManager 的 SMA 口径 ATR"""
+    calc = (
+        IndicatorCalculator(df)
+        .add_sma(PERIODS)
+        .add_rsi(RSI_PERIODS)
+        .add_macd()
+        .add_bollinger_bands(20, 2)
+        .add_volatility_atr(14)
+        .add_kdj()
+    )
+    calc.plan.add_atr_sma(14)
+    return calc.get_result()
+
+
+def main(tol: float = 1e-9):
+    import pandas_ta as ta
+
+    df = SyntheticSource().fetch("VALIDATE", "2000-01-01", "2025-12-31")
+    out = calculate(df)
+
+    checks = {}
+    for p in PERIODS:
+        checks[f"SMA_{p}"] = ta.sma(df["Close"], length=p)
+    for p in RSI_PERIODS:
+        checks[f"RSI_{p}"] = ta.rsi(df["Close"], length=p)
+    for name, (_, ref) in zip(["MACD_line", "MACD_hist", "MACD_signal"], ta.macd(df["Close"]).items()):
+        checks[name] = ref
+    bbands = ta.bbands(df["Close"], length=20, std=2)
+    for name, (_, ref) in zip(["BB_L", "BB_M", "BB_U", "BB_Bw", "BB_Bp"], bbands.items()):
+        checks[name] = ref
+    checks["ATR_14"] = ta.atr(df["High"], df["Low"], df["Close"], length=14)
+    for name, (_, ref) in zip(["KDJ_K", "KDJ_D", "KDJ_J"], ta.kdj(df["High"], df["Low"], df["Close"]).items()):
+        checks[name] = ref
+    # RiskManager 默认的止损/止盈波幅: 真实波幅 (首行取 High - Low) 的 14 期简单移动平均
+    tr = pd.concat([df["High"] - df["Low"], (df["High"] - df["Close"].shift()).abs(),
+                    (df["Low"] - df["Close"].shift()).abs()], axis=1).max(axis=1)
+    checks["ATR"] = tr.rolling(14).mean()
+
+    failed = 0
+    for name, ref in checks.items():
+        diff = max_rel_diff(out[name], ref)
+        status = "OK" if diff <= tol else "FAIL"
+        failed += status == "FAIL"
+        print(f"{name:<16} {diff:>10.2e}  {status}")
+
+    t0 = time.perf_counter()
+    calculate(df)
+    t_plan = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    for p in PERIODS:
+        ta.sma(df["Close"], length=p)
+    for p in RSI_PERIODS:
+        ta.rsi(df["Close"], length=p)
+    ta.macd(df["Close"])
+    ta.bbands(df["Close"], length=20, std=2)
+    ta.atr(df["High"], df["Low"], df["Close"], length=14)
+    ta.kdj(df["High"], df["Low"], df["Close"])
+    t_ta = time.perf_counter() - t0
+    print(f"\n全部指标: IndicatorCalculator {t_plan * 1e3:.2f} ms, pandas_ta {t_ta * 1e3:.2f} ms")
+    return failed
+
+
+if __name__ == "__main__":
+    sys.exit(1 if main() else 0)
@@ -1,9 +1,20 @@
 from abc import ABC, abstractmethod
+from typing import List, Optional
 
 import pandas as pd
 
+from indicators.plan import resolve_features
+from utils.helpers import parallel_map, resolve_workers
+
 
 class BaseStrategy(ABC):
+    # on_data 需要读取的列, None 表示需要全部列 (如机器学习策略)
+    required_columns: Optional[List[str]] = None
+    # 是否实现了 sweep_signals (向量化参数扫描), ParameterSweep 据此拒绝不支持的策略
+    supports_sweep: bool = False
+    # on_data 是否只依赖传入的数据本身 (不在其中训练模型), 流式回测按块调用 on_data, 据此拒绝不支持的策略
+    supports_stream: bool = True
+
     def __init__(self, name: str, symbols: list):
         """
         :param name: 策略名称
@@ -23,14 +34,88 @@ class BaseStrategy(ABC):
         """
         pass
 
-    def generate_all_signals(self, engine) -> dict:
-        """通过 DataEngine 批量为股票池生成信号"""
+    @staticmethod
+    def require_features(df: pd.DataFrame, names: list) -> pd.DataFrame:
+        """
+        按规范列名 (如 SMA_20 / RSI_14 / MACD_hist) 确保指标列存在
+        已有的列直接复用, 缺失的列通过指标计划补算
+        """
+        missing = [n for n in names if n not in df.columns]
+        if missing:
+            df = df.assign(**resolve_features(df, missing))
+        return df
+
+    def sweep_signals(self, df: pd.DataFrame, param_grid: dict):
+        """
+        参数扫描用的向量化信号：一次性生成所有参数组合的信号矩阵
+        子类可选实现 (同时把 supports_sweep 设为 True)，供 ParameterSweep 调用
+        :param param_grid: {参数名: 候选值列表}，缺省的参数沿用 self.params
+        :return: (params_df, signals) —— 每行一个组合的参数表，以及 (日期 x 组合) 的信号矩阵
+        """
+        raise NotImplementedError(f"{self.name} 暂不支持向量化参数扫描")
+
+    def export_state(self, symbol: str) -> dict:
+        """导出 on_data 在该股票上产生的内部状态 (如模型), 供多进程合并. 默认无状态"""
+        return {}
+
+    def import_state(self, symbol: str, state: dict):
+        """合并子进程 export_state 返回的状态"""
+        pass
+
+    def fitted_model(self, symbol: str, df: pd.DataFrame):
+        """
+        on_data 为该股票训练的模型及其输入, 供特征重要性分析复用, 避免重复训练
+        :param df: on_data 返回的 DataFrame
+        :return: (model, X, holdout_start), X 的列顺序与训练时一致;
+                 holdout_start 为该模型的样本外起始日期 (未知时为 None); 策略没有模型时返回 None
+        """
+        return None
+
+    def load_columns(self, columns: Optional[List[str]] = None) -> Optional[List[str]]:
+        """
+        从 DataEngine 读取时的列投影
+        :param columns: 下游 (回测、报告) 还需要的列, None 表示需要全部
+        :return: 策略与下游所需列的并集; 任一方需要全部列时返回 None
+        """
+        if self.required_columns is None or columns is None:
+            return None
+        return list(dict.fromkeys(list(self.required_columns) + list(columns)))
+
+    def generate_all_signals(self, engine, workers: int = 1, columns: Optional[List[str]] = None) -> dict:
+        """
+        通过 DataEngine 批量为股票池生成信号 (workers > 1 时多进程并行)
+        :param columns: 下游还需要的列, 与 required_columns 一起决定读取哪些列, None 表示全部
+        """
+        if resolve_workers(workers) > 1:
+            return self._generate_all_signals_parallel(engine, workers, columns)
+
         all_signals = {}
-        for symbol in self.symbols:
-            # 从 engine 获取 processed 数据
-            df = engine.get_symbol_data(symbol, use_processed=True)
-            if df is not None:
-                # 调用子类实现的逻辑
-                df_with_signal = self.on_data(symbol, df)
-                all_signals[symbol] = df_with_signal
+        # 从 engine 批量获取 processed 数据 (只读需要的列; 面板存储下只扫描一次)
+        data = engine.get_universe_data(self.symbols, use_processed=True,
+                                        columns=self.load_columns(columns))
+        for symbol, df in data.items():
+            # 调用子类实现的逻辑
+            df_with_signal = self.on_data(symbol, df)
+            all_signals[symbol] = df_with_signal
         return all_signals
+
+    def _generate_all_signals_parallel(self, engine, workers: int, columns: Optional[List[str]] = None) -> dict:
+        """多进程版本: 主进程读数据, 子进程跑 on_data, 再按股票池顺序合并结果与状态"""
+        data = engine.get_universe_data(self.symbols, use_processed=True,
+                                        columns=self.load_columns(columns))
+
+        results = parallel_map(
+            _run_on_data, [(self, s, df) for s, df in data.items()], workers
+        )
+
+        all_signals = {}
+        for symbol, (df_with_signal, state) in zip(data, results):
+            self.import_state(symbol, state)
+            all_signals[symbol] = df_with_signal
+        return all_signals
+
+
+def _run_on_data(strategy: BaseStrategy, symbol: str, df: pd.DataFrame):
+    """子进程入口: 生成信号并带回策略状态"""
+    df_with_signal = strategy.on_data(symbol, df)
+    return df_with_signal, strategy.export_state(symbol)
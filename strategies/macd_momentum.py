@@ -4,11 +4,13 @@ from strategies.base import BaseStrategy
 
 
 class MacdMomentumStrategy(BaseStrategy):
+    required_columns = ['Close', 'MACD_hist']
+
     def __init__(self, symbols: list):
         super().__init__("MACD_Momentum", symbols)
 
     def on_data(self, symbol: str, df: pd.DataFrame) -> pd.DataFrame:
-        df = df.copy()
+        df = self.require_features(df.copy(), ['MACD_hist'])
         df['Signal'] = 0
         # MACD_hist > 0 且 比昨天更高
         buy_cond = (df['MACD_hist'] > 0) & (df['MACD_hist'] > df['MACD_hist'].shift(1))
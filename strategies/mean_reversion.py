@@ -4,11 +4,13 @@ from strategies.base import BaseStrategy
 
 
 class BollingerMeanReversion(BaseStrategy):
+    required_columns = ['Close', 'BB_L', 'BB_M']
+
     def __init__(self, symbols: list):
         super().__init__("BB_Mean_Reversion", symbols)
 
     def on_data(self, symbol: str, df: pd.DataFrame) -> pd.DataFrame:
-        df = df.copy()
+        df = self.require_features(df.copy(), ['BB_L', 'BB_M'])
         df['Signal'] = 0
         # BB_L: 下轨, BB_U: 上轨
         buy_cond = (df['Close'] < df['BB_L'])
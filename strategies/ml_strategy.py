@@ -1,21 +1,51 @@
+import numpy as np
 import pandas as pd
 from sklearn.ensemble import RandomForestClassifier
 
+from machine_learning.model_registry import ModelRegistry
+from machine_learning.walk_forward import WalkForwardTrainer
 from strategies.base import BaseStrategy
 
 
 class MLStrategy(BaseStrategy):
+    # 随机森林超参数 (参与模型注册表的 key)
+    model_params = {"n_estimators": 100, "max_depth": 10, "random_state": 42}
+    # on_data 内训练模型: 逐块调用会在每块上重新训练, 且只能看到块内数据
+    supports_stream = False
+
     def __init__(
-        self, symbols: list, train_size: float = 0.8, prob_threshold: float = 0.6
+        self, symbols: list, train_size: float = 0.8, prob_threshold: float = 0.6,
+        walk_forward: dict = None, pooled: bool = False, n_jobs: int = -1,
+        registry: ModelRegistry = None,
     ):
         """
         :param train_size: 用于训练的数据比例（前 80% 训练，后 20% 回测预测）
         :param prob_threshold: 买入的概率阈值
+        :param walk_forward: 滚动训练配置 (WalkForwardTrainer 的参数, 另含 enabled 开关),
+                             开启后忽略 train_size, 信号为逐窗口的样本外预测
+        :param pooled: 截面混合训练: 所有股票的样本 (按股票标准化 + 股票哑变量) 叠成一个设计矩阵,
+                       只训练一个模型, 一次 predict_proba 为全部股票预测
+        :param n_jobs: 混合训练时随机森林的并行线程数, -1 为全部核心
+        :param registry: 模型注册表, 训练数据与配置不变时加载已保存的模型而不是重新训练
         """
         super().__init__("Machine_Learning_Strategy", symbols)
         self.feature_order = None
-        self.params = {"train_size": train_size, "prob_threshold": prob_threshold}
-        self.models = {}  # 为每只股票存储独立的模型
+        self.params = {"train_size": train_size, "prob_threshold": prob_threshold,
+                       "pooled": pooled, "n_jobs": n_jobs}
+        self.models = {}  # 为每只股票存储独立的模型 (混合训练时各股票共享同一个模型)
+        self.walk_forward_logs = {}  # 滚动训练的逐窗口记录
+        self.feature_stats = {}  # 混合训练: 每只股票训练段的特征 (均值, 标准差)
+        self.model_features = {}  # 每只股票模型的输入列顺序 (各股票的 PCA 维度可能不同)
+        self.holdout_start = {}  # 每只股票模型的样本外起始日期 (此后的行未参与该模型的训练)
+        self.registry = registry
+
+        self.trainer = None
+        if walk_forward is not None:
+            walk_forward = dict(walk_forward)
+            if walk_forward.pop("enabled", True):
+                self.trainer = WalkForwardTrainer(**walk_forward)
+        if pooled and self.trainer is not None:
+            raise ValueError("混合训练 (pooled) 暂不支持与滚动训练 (walk_forward) 同时开启")
 
     @staticmethod
     def _prepare_features(df: pd.DataFrame):
@@ -35,21 +65,193 @@ class MLStrategy(BaseStrategy):
         features = [col for col in df.columns if col not in exclude]
         return features
 
+    def export_state(self, symbol: str) -> dict:
+        return {
+            "model": self.models.get(symbol),
+            "feature_order": self.feature_order,
+            "walk_forward_log": self.walk_forward_logs.get(symbol),
+            "feature_stats": self.feature_stats.get(symbol),
+            "model_features": self.model_features.get(symbol),
+            "holdout_start": self.holdout_start.get(symbol),
+        }
+
+    def import_state(self, symbol: str, state: dict):
+        if state.get("model") is not None:
+            self.models[symbol] = state["model"]
+            self.feature_order = state["feature_order"]
+        if state.get("model_features") is not None:
+            self.model_features[symbol] = state["model_features"]
+        if state.get("feature_stats") is not None:
+            self.feature_stats[symbol] = state["feature_stats"]
+        if state.get("walk_forward_log") is not None:
+            self.walk_forward_logs[symbol] = state["walk_forward_log"]
+        if state.get("holdout_start") is not None:
+            self.holdout_start[symbol] = state["holdout_start"]
+
+    def _on_data_walk_forward(self, symbol: str, df: pd.DataFrame) -> pd.DataFrame:
+        """滚动训练: 每个窗口只用之前的数据训练, 信号全部来自样本外预测"""
+        horizon = self.trainer.horizon
+        future = df["Close"].shift(-horizon)
+        # 末尾 horizon 行的标签未知, 置为 NaN 而不是 0, 不参与训练
+        df["Target"] = (future > df["Close"]).astype(float).where(future.notna())
+        features = self._prepare_features(df)
+        data = df.dropna(subset=features)
+
+        probs, log, model = self.trainer.run(data[features], data["Target"],
+                                             registry=self.registry, symbol=symbol)
+        if log.empty:
+            print(f"⚠️ {symbol} 数据量太小，无法进行滚动训练")
+            return df
+
+        self.feature_order = features.copy()
+        self.models[symbol] = model
+        self.model_features[symbol] = features.copy()
+        self.walk_forward_logs[symbol] = log
+        # 保存的是最后一条链的模型, 只有它最近一次训练之后的窗口才是样本外
+        self.holdout_start[symbol] = self.trainer.out_of_sample_start(log)
+
+        tested = ~np.isnan(probs)
+        signals = (probs[tested] > self.params["prob_threshold"]).astype(int)
+        df.loc[data.index[tested], "Signal"] = signals
+        counts = log["action"].value_counts()
+        print(
+            f"🔁 [{symbol}] 滚动训练完成: {len(log)} 个窗口 (重训 {counts.get('fit', 0)} / "
+            f"热启动 {counts.get('warm_start', 0)} / 复用 {counts.get('reuse', 0)}), "
+            f"样本外信号数: {signals.sum()}"
+        )
+        return df
+
+    def _split(self, df: pd.DataFrame, features: list):
+        """添加标签列 Target (原地), 清理空值后按 train_size 切分为 (训练集, 测试集)"""
+        df["Target"] = (df["Close"].shift(-5) > df["Close"]).astype(int)
+        clean_df = df.dropna(subset=features + ["Target"])
+        split_idx = int(len(clean_df) * self.params["train_size"])
+        return clean_df.iloc[:split_idx], clean_df.iloc[split_idx:]
+
+    def _fit_or_load(self, symbol: str, features: list, data: pd.DataFrame, fit):
+        """有注册表时先按 key 查找已保存的模型, 未命中才调用 fit() 训练并保存"""
+        if self.registry is None:
+            return fit()
+        model, hit = self.registry.get_or_fit(symbol, features, self.model_params, data, fit)
+        if hit:
+            print(f"💾 [{symbol}] 命中已保存的模型, 跳过训练")
+        return model
+
+    def fitted_model(self, symbol: str, df: pd.DataFrame):
+        model = self.models.get(symbol)
+        if model is None or symbol not in self.model_features:
+            return None
+        columns = self.model_features[symbol]
+        holdout_start = self.holdout_start.get(symbol)
+        if not self.params["pooled"]:
+            return model, df[columns], holdout_start
+        # 混合模型的输入: 按该股票训练段统计量标准化的特征 + 股票哑变量
+        features = [c for c in columns if not c.startswith("Symbol_")]
+        mean, std = self.feature_stats[symbol]
+        X = (df[features] - mean) / std
+        for c in columns[len(features):]:
+            X[c] = float(c == f"Symbol_{symbol}")
+        return model, X, holdout_start
+
+    def generate_all_signals(self, engine, workers: int = 1, columns=None) -> dict:
+        if not self.params["pooled"]:
+            return super().generate_all_signals(engine, workers, columns)
+        # 混合训练只有一个模型, 并行由随机森林的 n_jobs 完成
+        data = engine.get_universe_data(self.symbols, use_processed=True,
+                                        columns=self.load_columns(columns))
+        return self.on_universe(data)
+
+    def on_universe(self, data: dict) -> dict:
+        """
+        截面混合训练: 各股票训练段叠成一个设计矩阵训练一个模型, 测试段叠在一起一次预测
+        特征按各自股票训练段的均值/标准差标准化 (消除价格量级差异), 并附加股票哑变量 Symbol_*
+        :param data: {symbol: processed DataFrame}
+        :return: {symbol: 带 Signal 列的 DataFrame}
+        """
+        frames = {s: df.copy() for s, df in data.items()}
+        for df in frames.values():
+            df["Signal"] = 0
+        # 各股票的 PCA 维度可能不同, 只使用所有股票共有的特征
+        feature_sets = [set(self._prepare_features(df)) for df in frames.values()]
+        features = [c for c in self._prepare_features(next(iter(frames.values())))
+                    if all(c in fs for fs in feature_sets)] if frames else []
+
+        splits = {}
+        for symbol, df in frames.items():
+            train_df, test_df = self._split(df, features)
+            if len(train_df) < 100:
+                print(f"⚠️ {symbol} 数据量太小，不参与混合训练")
+                continue
+            splits[symbol] = (train_df, test_df)
+        if not splits:
+            return frames
+
+        pooled = list(splits)
+        dummies = [f"Symbol_{s}" for s in pooled]
+
+        def design(part: int) -> np.ndarray:
+            # 随机森林内部以 float32 建树, 直接按 float32 预分配避免再拷贝一次
+            n_rows = sum(len(splits[s][part]) for s in pooled)
+            X = np.zeros((n_rows, len(features) + len(pooled)), dtype=np.float32)
+            row = 0
+            for j, s in enumerate(pooled):
+                block = splits[s][part][features].to_numpy(dtype=np.float64)
+                mean, std = self.feature_stats[s]
+                X[row:row + len(block), :len(features)] = (block - mean) / std
+                X[row:row + len(block), len(features) + j] = 1.0
+                row += len(block)
+            return X
+
+        for s in pooled:
+            train = splits[s][0][features].to_numpy(dtype=np.float64)
+            std = train.std(axis=0)
+            self.feature_stats[s] = (train.mean(axis=0), np.where(std > 0, std, 1.0))
+
+        X_train = design(0)
+        y_train = np.concatenate([splits[s][0]["Target"].to_numpy() for s in pooled])
+        print(
+            f"🤖 [Pooled] 正在训练混合模型... 股票数: {len(pooled)}, 样本数: {len(X_train)}, "
+            f"特征数: {len(features)} + {len(pooled)} 个股票哑变量"
+        )
+        self.feature_order = features + dummies
+
+        def fit():
+            model = RandomForestClassifier(**self.model_params, n_jobs=self.params["n_jobs"])
+            return model.fit(X_train, y_train)
+
+        train_data = pd.concat({s: splits[s][0][features + ["Target"]] for s in pooled})
+        model = self._fit_or_load("POOLED", self.feature_order, train_data, fit)
+        for s in pooled:
+            self.models[s] = model
+            self.model_features[s] = self.feature_order
+            test_index = splits[s][1].index
+            self.holdout_start[s] = test_index[0] if len(test_index) else None
+
+        # 所有股票的测试段一次批量预测
+        probs = model.predict_proba(design(1))[:, 1]
+        row = 0
+        for s in pooled:
+            test_df = splits[s][1]
+            test_probs = probs[row:row + len(test_df)]
+            row += len(test_df)
+            test_signals = (test_probs > self.params["prob_threshold"]).astype(int)
+            frames[s].loc[test_df.index, "Signal"] = test_signals
+            if len(test_probs):
+                print(
+                    f"📈 [{s}] 预测完成，最大上涨概率: {test_probs.max():.2%}, 产生信号数: {sum(test_signals)}"
+                )
+        return frames
+
     def on_data(self, symbol: str, df: pd.DataFrame) -> pd.DataFrame:
         df = df.copy()
         df["Signal"] = 0
+        if self.trainer is not None:
+            return self._on_data_walk_forward(symbol, df)
 
         # 1. 准备目标标签 (未来 5 天是否上涨)
-        df["Target"] = (df["Close"].shift(-5) > df["Close"]).astype(int)
         features = self._prepare_features(df)
-
-        # 清理空值
-        clean_df = df.dropna(subset=features + ["Target"])
-
         # 2. 划分训练集和测试集 (按时间顺序)
-        split_idx = int(len(clean_df) * self.params["train_size"])
-        train_df = clean_df.iloc[:split_idx]
-        test_df = clean_df.iloc[split_idx:]
+        train_df, test_df = self._split(df, features)
 
         if len(train_df) < 100:
             print(f"⚠️ {symbol} 数据量太小，无法训练模型")
@@ -65,9 +267,13 @@ class MLStrategy(BaseStrategy):
         # 记录训练时的特征顺序，确保预测时完全一致
         self.feature_order = features.copy()
 
-        model = RandomForestClassifier(n_estimators=100, max_depth=10, random_state=42)
-        model.fit(X_train, y_train)
+        model = self._fit_or_load(
+            symbol, features, train_df[features + ["Target"]],
+            lambda: RandomForestClassifier(**self.model_params).fit(X_train, y_train),
+        )
         self.models[symbol] = model  # 持久化模型
+        self.model_features[symbol] = features.copy()
+        self.holdout_start[symbol] = test_df.index[0] if len(test_df) else None
 
         # 4. 预测 (在整个数据集上生成概率，或仅在测试集生成)
         # 为了回测展示完整性，我们在测试集上应用信号
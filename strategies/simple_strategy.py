@@ -1,9 +1,15 @@
+import itertools
+
+import numpy as np
 import pandas as pd
 
+from indicators.plan import resolve_features
 from strategies.base import BaseStrategy
 
 
 class MaRsiStrategy(BaseStrategy):
+    supports_sweep = True
+
     def __init__(self, symbols: list, sma_s=20, sma_l=60, rsi_limit=70):
         super().__init__("MA_RSI_Strategy", symbols)
         self.params = {
@@ -12,6 +18,11 @@ class MaRsiStrategy(BaseStrategy):
             'rsi_limit': rsi_limit
         }
 
+    @property
+    def required_columns(self) -> list:
+        # 缺失的均线可由 Close 补算
+        return ['Close', f"SMA_{self.params['sma_short']}", f"SMA_{self.params['sma_long']}", 'RSI_14']
+
     def on_data(self, symbol: str, df: pd.DataFrame) -> pd.DataFrame:
         df - df.copy()
         # 初始化信号列
@@ -21,6 +32,7 @@ class MaRsiStrategy(BaseStrategy):
         s_ma = f"SMA_{self.params['sma_short']}"
         l_ma = f"SMA_{self.params['sma_long']}"
         rsi = "RSI_14"
+        df = self.require_features(df, [s_ma, l_ma, rsi])
 
         # 生成买入信号
         buy_cond = (df[s_ma] > df[l_ma]) & (df[s_ma].shift(1) <= df[l_ma].shift(1)) & (
@@ -32,3 +44,39 @@ class MaRsiStrategy(BaseStrategy):
         df.loc[sell_cond, 'Signal'] = -1
 
         return df
+
+    def sweep_signals(self, df: pd.DataFrame, param_grid: dict):
+        """所有 (短均线, 长均线, RSI 上限) 组合的信号矩阵，每个均线窗口只算一次"""
+        shorts = list(param_grid.get('sma_short', [self.params['sma_short']]))
+        longs = list(param_grid.get('sma_long', [self.params['sma_long']]))
+        limits = list(param_grid.get('rsi_limit', [self.params['rsi_limit']]))
+
+        # 1. 每个不同的窗口只算一次均线 (优先复用已加工好的 SMA 列, 缺失的经指标计划共用一次累加和补算)
+        windows = sorted(set(shorts) | set(longs))
+        features = resolve_features(df, [f"SMA_{w}" for w in windows] + ['RSI_14'])
+        sma = {w: features[f"SMA_{w}"] for w in windows}
+
+        s_ma = np.column_stack([sma[w] for w in shorts])[:, :, None]
+        l_ma = np.column_stack([sma[w] for w in longs])[:, None, :]
+        s_prev = np.roll(s_ma, 1, axis=0)
+        l_prev = np.roll(l_ma, 1, axis=0)
+        s_prev[0], l_prev[0] = np.nan, np.nan
+
+        # 2. 金叉/死叉：(日期 x 短 x 长)
+        cross_up = (s_ma > l_ma) & (s_prev <= l_prev)
+        cross_down = (s_ma < l_ma) & (s_prev >= l_prev)
+
+        # 3. RSI 过滤：(日期 x RSI 上限)，广播成 (日期 x 短 x 长 x 上限)
+        rsi_ok = features['RSI_14'][:, None] < np.asarray(limits)
+        buy = cross_up[..., None] & rsi_ok[:, None, None, :]
+        sell = np.broadcast_to(cross_down[..., None], buy.shape)
+
+        # 卖出条件后写入，覆盖买入 (与 on_data 一致)
+        signals = np.where(sell, -1, np.where(buy, 1, 0)).astype(np.int8)
+        signals = signals.reshape(len(df), -1)
+
+        params_df = pd.DataFrame(
+            list(itertools.product(shorts, longs, limits)),
+            columns=['sma_short', 'sma_long', 'rsi_limit'],
+        )
+        return params_df, signals
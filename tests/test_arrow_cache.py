@@ -0,0 +1,53 @@
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from core import arrow_cache
+from core.arrow_cache import ArrowMirror
+
+
+def write_parquet(path, seed: int) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({"Close": rng.normal(size=50), "Volume": rng.normal(size=50)},
+                      index=pd.bdate_range("2021-01-01", periods=50, name="Date"))
+    df.to_parquet(path)
+    return df
+
+
+def track_maps(monkeypatch) -> list:
+    """记录 load 打开的每个内存映射"""
+    opened = []
+    original = pa.memory_map
+
+    def memory_map(path, mode="r"):
+        source = original(path, mode)
+        opened.append(source)
+        return source
+
+    monkeypatch.setattr(arrow_cache.pa, "memory_map", memory_map)
+    return opened
+
+
+def test_load_round_trip_closes_map(tmp_path, monkeypatch):
+    path = str(tmp_path / "AAA.parquet")
+    df = write_parquet(path, 0)
+    ArrowMirror.write(df, path)
+    opened = track_maps(monkeypatch)
+
+    out = ArrowMirror.load(path, columns=["Close"])
+    assert opened and all(s.closed for s in opened)
+    # 句柄关闭后映射的数据仍然可用
+    pd.testing.assert_frame_equal(out, df[["Close"]], check_freq=False)
+
+
+def test_stale_mirror_is_closed_before_rebuild(tmp_path, monkeypatch):
+    path = str(tmp_path / "AAA.parquet")
+    ArrowMirror.write(write_parquet(path, 0), path)
+    fresh = write_parquet(path, 1)
+    opened = track_maps(monkeypatch)
+
+    assert ArrowMirror.load(path) is None
+    assert opened and all(s.closed for s in opened)
+
+    ArrowMirror.write(fresh, path)
+    pd.testing.assert_frame_equal(ArrowMirror.load(path), fresh, check_freq=False)
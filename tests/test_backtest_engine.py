@@ -0,0 +1,82 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from core.backtest_engine import BacktestEngine
+
+
+def make_frame(seed: int, n: int = 300, start: str = "2020-01-01", n_pca: int = 2) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, n)))
+    df = pd.DataFrame(
+        {
+            "Open": close * (1 + rng.normal(0, 0.005, n)),
+            "High": close * (1 + np.abs(rng.normal(0, 0.01, n))),
+            "Low": close * (1 - np.abs(rng.normal(0, 0.01, n))),
+            "Close": close,
+            "Volume": rng.integers(1_000, 10_000, n).astype(float),
+        },
+        index=pd.bdate_range(start, periods=n, name="Date"),
+    )
+    for k in range(n_pca):
+        df[f"PCA_{k + 1}"] = rng.normal(size=n)
+    df["Signal"] = rng.choice([0, 1, -1], n, p=[0.8, 0.1, 0.1])
+    return df
+
+
+def test_run_batch_matches_run():
+    engine = BacktestEngine(commission=0.001)
+    signals = {"A": make_frame(0), "B": make_frame(1, n=250, start="2020-03-02")}
+    panel = engine.build_panel(signals)
+    batch = engine.run_batch(panel, pos_size={"A": 0.5, "B": 1.0},
+                             columns=engine.panel_columns(signals))
+
+    for s, size in [("A", 0.5), ("B", 1.0)]:
+        single = engine.run(s, signals[s].copy(), pos_size=size)
+        pd.testing.assert_frame_equal(batch[s], single, check_dtype=False, check_freq=False,
+                                      check_names=False)
+
+
+def test_run_batch_keeps_each_symbols_own_columns():
+    """PCA 维度不同的股票: 结果中不能出现其他股票才有的全 NaN 列"""
+    engine = BacktestEngine()
+    signals = {"A": make_frame(0, n_pca=2), "B": make_frame(1, n_pca=4)}
+    batch = engine.run_batch(engine.build_panel(signals), columns=engine.panel_columns(signals))
+
+    assert "PCA_3" not in batch["A"].columns
+    assert list(batch["B"].filter(like="PCA_").columns) == ["PCA_1", "PCA_2", "PCA_3", "PCA_4"]
+    features = [c for c in batch["A"].columns if c.startswith("PCA_")]
+    assert len(batch["A"].dropna(subset=features)) == len(batch["A"])
+
+
+def test_run_batch_requires_signal():
+    engine = BacktestEngine()
+    panel = engine.build_panel({"A": make_frame(0).drop(columns="Signal")})
+    with pytest.raises(ValueError):
+        engine.run_batch(panel)
+
+
+def sma_cross(df: pd.DataFrame) -> pd.DataFrame:
+    """只依赖最近 20 行的信号, 用于检验流式回测的预热"""
+    df = df.copy()
+    fast, slow = df["Close"].rolling(5).mean(), df["Close"].rolling(20).mean()
+    df["Signal"] = np.where(fast > slow, 1, np.where(fast < slow, -1, 0))
+    return df
+
+
+@pytest.mark.parametrize("chunk_rows", [37, 100, 1000])
+def test_run_stream_matches_run(tmp_path, chunk_rows):
+    engine = BacktestEngine(commission=0.001)
+    df = make_frame(0, n=600).drop(columns="Signal")
+    chunks = (df.iloc[i:i + chunk_rows] for i in range(0, len(df), chunk_rows))
+    path = str(tmp_path / "A.parquet")
+
+    summary = engine.run_stream("A", chunks, path, pos_size=0.5, signal_fn=sma_cross, warmup=20)
+    full = engine.run("A", sma_cross(df), pos_size=0.5)
+    stream = pd.read_parquet(path)
+
+    assert summary["rows"] == len(df) and summary["chunks"] == -(-len(df) // chunk_rows)
+    # 逐块的滚动均值与整段的只差浮点舍入
+    pd.testing.assert_frame_equal(stream, full, check_dtype=False, check_freq=False,
+                                  check_names=False, rtol=1e-9)
+    assert summary["final_equity"] == pytest.approx(full["Equity_Curve"].iloc[-1], rel=1e-9)
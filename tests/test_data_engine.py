@@ -0,0 +1,26 @@
+import pandas as pd
+import pytest
+
+from core.data_engine import DataEngine
+
+PANDAS_3 = int(pd.__version__.split(".")[0]) >= 3
+
+
+@pytest.mark.skipif(PANDAS_3, reason="pandas 3 起写时复制始终开启, 没有全局选项")
+def test_read_only_does_not_change_global_pandas_mode(tmp_path):
+    before = pd.get_option("mode.copy_on_write")
+    DataEngine([], raw_path=str(tmp_path / "raw"), processed_path=str(tmp_path / "processed"),
+               read_only=True)
+    assert pd.get_option("mode.copy_on_write") == before
+
+
+def test_exported_frames_do_not_alias_cache(tmp_path):
+    engine = DataEngine(["A"], raw_path=str(tmp_path / "raw"),
+                        processed_path=str(tmp_path / "processed"), read_only=True)
+    df = pd.DataFrame({"Close": [1.0, 2.0, 3.0]}, index=pd.bdate_range("2020-01-01", periods=3))
+    (tmp_path / "raw").mkdir(exist_ok=True)
+    df.to_parquet(tmp_path / "raw" / "A.parquet")
+
+    first = engine.get_symbol_data("A")
+    first.iloc[0, 0] = -1.0
+    assert engine.get_symbol_data("A")["Close"].iloc[0] == 1.0
@@ -0,0 +1,23 @@
+from data.data_loader import DataLoader
+from data.sources import SyntheticSource
+
+
+def test_batch_fetch_delay_applies_to_single_call(tmp_path):
+    loader = DataLoader(raw_path=str(tmp_path), source=SyntheticSource(), min_interval=0.0)
+    loader.batch_fetch(["A"], "2020-01-01", "2020-02-01", delay=0.01)
+    assert loader.rate_limiter.min_interval == 0.0
+
+
+def test_sync_changes_only_describe_the_latest_call(tmp_path, monkeypatch):
+    loader = DataLoader(raw_path=str(tmp_path), source=SyntheticSource(), min_interval=0.0)
+    loader.batch_fetch(["A", "B"], "2020-01-01", "2020-02-01")
+    assert loader.sync_changes["A"] is not None and loader.sync_changes["B"] is not None
+
+    def fail(symbol, start, end):
+        raise ConnectionError("offline")
+
+    monkeypatch.setattr(loader, "_download", fail)
+    frames = loader.batch_fetch(["A"], "2020-01-01", "2020-03-01", force_download=True)
+    # 下载失败: 没有写入任何数据, 不报告变化; 本次未同步的 B 也不再带着旧的区间
+    assert frames == {}
+    assert loader.sync_changes == {"A": None}
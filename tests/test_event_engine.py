@@ -0,0 +1,89 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from core.event_engine import EventEngine, PercentCommission, SlippageModel
+from core.portfolio_engine import PortfolioEngine
+from tests.test_backtest_engine import make_frame
+
+
+def make_signals(n_symbols: int = 6) -> dict:
+    """上市日期错开、持仓信号较密的股票池"""
+    signals = {}
+    for i in range(n_symbols):
+        df = make_frame(i, n=250 - 20 * i, start=f"2020-0{1 + i % 6}-01", n_pca=0)
+        df["Signal"] = (np.random.default_rng(i).random(len(df)) > 0.5).astype(int)
+        signals[f"S{i}"] = df
+    return signals
+
+
+def test_matches_matrix_engine_without_costs():
+    signals = make_signals()
+    portfolio = PortfolioEngine(initial_capital=100000, max_stock_weight=0.2)
+    matrix = portfolio.run_portfolio_matrix(signals)
+    engine = EventEngine(initial_capital=100000, max_stock_weight=0.2, fill_delay=0)
+    events = engine.run_portfolio(signals)
+
+    np.testing.assert_allclose(events["Total_Equity"], matrix["Total_Equity"], rtol=1e-9)
+    np.testing.assert_allclose(events["Cash"], matrix["Cash"], rtol=1e-9, atol=1e-6)
+    np.testing.assert_allclose(engine.weights_df.to_numpy(), portfolio.weights_df.to_numpy(), atol=1e-9)
+    assert engine.stats["fills"] == len(engine.fills()) > 0
+
+
+def test_ledger_is_consistent_with_costs():
+    signals = make_signals()
+    engine = EventEngine(initial_capital=100000, max_stock_weight=0.2, fill_delay=1,
+                         commission=PercentCommission(0.001), slippage=SlippageModel(bps=5, impact=0.1))
+    res = engine.run_portfolio(signals)
+    fills = engine.fills()
+
+    assert (res["Cash"] >= -1e-6).all()
+    assert res["Commission"].sum() == pytest.approx(fills["Commission"].sum())
+    assert res["Trades"].sum() == len(fills)
+    # 期末净值 = 现金 + 按最后收盘价计的持仓市值
+    last_close = np.array([df["Close"].iloc[-1] for df in signals.values()])
+    positions = engine.positions()["qty"].to_numpy()
+    assert res["Total_Equity"].iloc[-1] == pytest.approx(res["Cash"].iloc[-1] + positions @ last_close)
+    # 持仓等于成交股数之和
+    np.testing.assert_allclose(fills.groupby("Symbol")["Qty"].sum().reindex(signals, fill_value=0), positions)
+    # 成本会拖累净值
+    free = EventEngine(initial_capital=100000, max_stock_weight=0.2, fill_delay=1).run_portfolio(signals)
+    assert res["Total_Equity"].iloc[-1] < free["Total_Equity"].iloc[-1]
+
+
+def delisted_signals() -> dict:
+    """B 只有前 20 根 K 线且一直持有信号 (退市), A 有 500 根 K 线但从不发出信号"""
+    index = pd.bdate_range("2020-01-01", periods=500)
+    rng = np.random.default_rng(0)
+    return {
+        "A": pd.DataFrame({"Close": 100 + rng.normal(size=500).cumsum(), "Signal": 0}, index=index),
+        "B": pd.DataFrame({"Close": 50 + rng.normal(size=20).cumsum(), "Signal": 1}, index=index[:20]),
+    }
+
+
+@pytest.mark.parametrize("fill_delay", [0, 1])
+def test_missing_bars_keep_a_single_live_sell(fill_delay):
+    signals = delisted_signals()
+    engine = EventEngine(initial_capital=100000, fill_delay=fill_delay)
+    res = engine.run_portfolio(signals)
+    orders = engine.orders()
+
+    sells = orders[orders["Qty"] < 0]
+    assert len(sells) == 1
+    if fill_delay:
+        # 退市后没有行情, 清仓单一直挂着, 持仓按最后收盘价估值
+        assert sells["Status"].iloc[0] == "pending"
+        assert engine.positions().loc["B", "qty"] > 0
+    else:
+        matrix = PortfolioEngine(initial_capital=100000).run_portfolio_matrix(signals)
+        np.testing.assert_allclose(res["Total_Equity"], matrix["Total_Equity"], rtol=1e-9)
+
+
+def test_ledger_grows_instead_of_raising(monkeypatch):
+    signals = make_signals()
+    expected = EventEngine(initial_capital=100000, max_stock_weight=0.2).run_portfolio(signals)
+    monkeypatch.setattr(EventEngine, "_order_capacity", staticmethod(lambda s: 1))
+    engine = EventEngine(initial_capital=100000, max_stock_weight=0.2)
+
+    pd.testing.assert_frame_equal(engine.run_portfolio(signals), expected)
+    assert len(engine.ledger.orders) >= engine.stats["orders"] > 1
@@ -0,0 +1,74 @@
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestClassifier
+
+from machine_learning import feature_importance
+from machine_learning.feature_importance import FeatureImportanceEngine
+from strategies.ml_strategy import MLStrategy
+from tests.test_backtest_engine import make_frame
+
+
+def test_permutation_aligns_features_to_results(tmp_path):
+    rng = np.random.default_rng(0)
+    index = pd.bdate_range("2021-01-01", periods=200, name="Date")
+    X = pd.DataFrame(rng.normal(size=(200, 3)), index=index, columns=["RSI", "MACD", "PCA_1"])
+    model = RandomForestClassifier(n_estimators=10, random_state=0).fit(X, rng.integers(0, 2, 200))
+    # 回测结果比特征矩阵少开头几行, 且多出特征矩阵没有的日期
+    extra = pd.bdate_range(index[-1] + pd.offsets.BDay(), periods=5, name="Date")
+    df = pd.DataFrame({"Close": 100 + rng.normal(size=195 + 5).cumsum()},
+                      index=index[5:].append(extra))
+
+    engine = FeatureImportanceEngine(report_path=str(tmp_path), method="permutation", n_jobs=1)
+    importances = engine._model_importances(df, model, X)
+
+    assert list(importances.index) == ["RSI", "MACD", "PCA_1"]
+    assert importances.notna().all()
+
+
+def capture_holdout(monkeypatch) -> list:
+    """记录 permutation_importance 实际使用的留出行数"""
+    sizes = []
+
+    def fake(model, X, y, **kwargs):
+        sizes.append(len(X))
+        return type("Result", (), {"importances_mean": np.zeros(X.shape[1])})()
+
+    monkeypatch.setattr(feature_importance, "permutation_importance", fake)
+    return sizes
+
+
+def test_permutation_holdout_starts_after_model_training(tmp_path, monkeypatch):
+    rng = np.random.default_rng(1)
+    index = pd.bdate_range("2021-01-01", periods=200, name="Date")
+    X = pd.DataFrame(rng.normal(size=(200, 2)), index=index, columns=["RSI", "MACD"])
+    model = RandomForestClassifier(n_estimators=5, random_state=0).fit(X, rng.integers(0, 2, 200))
+    df = pd.DataFrame({"Close": 100 + rng.normal(size=200).cumsum()}, index=index)
+    engine = FeatureImportanceEngine(report_path=str(tmp_path), method="permutation", n_jobs=1)
+    sizes = capture_holdout(monkeypatch)
+
+    engine._model_importances(df, model, X, holdout_start=index[180])
+    # 第 180 行起到最后一个有标签的行 (末尾 5 行没有未来收盘价)
+    assert sizes == [15]
+
+    # 训练之后没有样本外行: 退回模型自带的重要性
+    importances = engine._model_importances(df, model, X, holdout_start=index[-1] + pd.Timedelta(days=1))
+    assert sizes == [15]
+    np.testing.assert_allclose(importances.to_numpy(), model.feature_importances_)
+
+
+def test_walk_forward_model_holdout_is_out_of_sample():
+    df = make_frame(0, n=700, n_pca=3).drop(columns="Signal")
+    strategy = MLStrategy(symbols=["A"], walk_forward={
+        "train_window": 200, "test_window": 50, "retrain_every": 4, "n_estimators": 5,
+        "drift_threshold": 100.0, "warm_start_trees": 0,
+    })
+    out = strategy.on_data("A", df)
+    log = strategy.walk_forward_logs["A"]
+    model, X, holdout_start = strategy.fitted_model("A", out)
+
+    # 链内后续窗口复用链首的模型, 样本外区间从链首的测试窗口开始, 而不是最后一个窗口
+    assert log["action"].iloc[-1] == "reuse"
+    last_fit = log[log["action"] == "fit"].iloc[-1]
+    assert holdout_start == last_fit["test_start"] > last_fit["train_end"]
+    assert holdout_start < log["test_start"].iloc[-1]
+    assert model is strategy.models["A"] and list(X.columns) == strategy.model_features["A"]
@@ -0,0 +1,59 @@
+import numpy as np
+import pandas as pd
+
+from machine_learning.feature_processor import FeatureProcessor
+from tests.test_backtest_engine import make_frame
+
+
+def make_features(seed: int, n: int = 300) -> pd.DataFrame:
+    df = make_frame(seed, n=n, n_pca=0).drop(columns="Signal")
+    rng = np.random.default_rng(seed)
+    base = rng.normal(size=(n, 3))
+    for i in range(6):
+        df[f"F{i}"] = base @ rng.normal(size=3) + 0.1 * rng.normal(size=n)
+    df.iloc[:5, df.columns.get_loc("F0")] = np.nan
+    return df
+
+
+def test_transform_matches_scaler_and_pca():
+    df = make_features(0)
+    processor = FeatureProcessor(n_components=3).fit(df)
+    X = df[processor.feature_cols].ffill().fillna(0).to_numpy()
+    expected = processor.pca.transform(processor.scaler.transform(X))
+    np.testing.assert_allclose(processor.transform(df).to_numpy(), expected, atol=1e-10)
+
+
+def test_appended_rows_leave_old_rows_unchanged():
+    df = make_features(1, n=400)
+    processor = FeatureProcessor().fit(df.iloc[:300], fit_end=df.index[250])
+    old = processor.transform(df.iloc[:300])
+    new = processor.transform(df)
+    pd.testing.assert_frame_equal(new.iloc[:300], old)
+
+
+def test_fit_end_ignores_later_rows():
+    df = make_features(2)
+    cut = df.index[200]
+    a = FeatureProcessor(n_components=3).fit(df, fit_end=cut).transform(df)
+    b = FeatureProcessor(n_components=3).fit(df.loc[:cut]).transform(df)
+    pd.testing.assert_frame_equal(a, b)
+
+
+def test_transform_many_matches_transform():
+    frames = {s: make_features(i, n=200 + 50 * i) for i, s in enumerate(["A", "B", "C"])}
+    processor = FeatureProcessor().fit(list(frames.values()))
+    batched = processor.transform_many(frames)
+    for s, df in frames.items():
+        pd.testing.assert_frame_equal(batched[s], processor.transform(df))
+
+
+def test_save_and_load_checks_key(tmp_path):
+    df = make_features(3)
+    processor = FeatureProcessor(n_components=3).fit(df)
+    processor.key = "v1"
+    path = str(tmp_path / "processor.joblib")
+    processor.save(path)
+
+    assert FeatureProcessor.load(path, key="v2") is None
+    loaded = FeatureProcessor.load(path, key="v1")
+    pd.testing.assert_frame_equal(loaded.transform(df), processor.transform(df))
@@ -0,0 +1,113 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from core import kernels
+from core.backtest_engine import BacktestEngine
+from core.kernels import KERNEL_OUTPUTS, backtest_kernel, backtest_kernel_batch, new_carry
+from core.risk_manager import RiskManager
+from tests.test_backtest_engine import make_frame
+
+COMMISSION, CAPITAL = 0.001, 100000.0
+
+
+def legacy_run(df: pd.DataFrame, pos_size: float) -> pd.DataFrame:
+    """内核化之前的 BacktestEngine.run: 逐行止损/止盈循环 + pandas 逐列计算"""
+    df = RiskManager().calculate_atr_exits(df)
+    signals, close = df["Signal"].values, df["Close"].values
+    sl, tp = df["Initial_SL"].values, df["Initial_TP"].values
+    position, stop_loss, take_profit = 0, 0, 0
+    exits = np.zeros(len(df))
+    for i in range(1, len(df)):
+        if position == 1 and (close[i] <= stop_loss or close[i] >= take_profit):
+            position = 0
+            exits[i] = -1
+            continue
+        if position == 0 and signals[i] == 1:
+            position, stop_loss, take_profit = 1, sl[i], tp[i]
+    df.loc[exits == -1, "Signal"] = -1
+
+    results = df.copy()
+    results["Market_Return"] = results["Close"].pct_change()
+    results["Position"] = results["Signal"].replace(0, np.nan).ffill().fillna(0)
+    results["Position"] = results["Position"].apply(lambda x: 1 if x == 1 else 0)
+    results["Strategy_Return"] = results["Position"].shift(1) * results["Market_Return"] * pos_size
+    results["Trades"] = results["Position"].diff().abs()
+    results["Strategy_Return"] -= results["Trades"] * COMMISSION
+    results["Cumulative_Return"] = (1 + results["Strategy_Return"].fillna(0)).cumprod()
+    results["Equity_Curve"] = results["Cumulative_Return"] * CAPITAL
+    results["Peak"] = results["Equity_Curve"].cummax()
+    results["Drawdown"] = (results["Equity_Curve"] - results["Peak"]) / results["Peak"]
+    return results
+
+
+def make_stop_frame(seed: int, n: int = 400) -> pd.DataFrame:
+    """卖出信号很少的数据, 持仓大多由止损/止盈平仓"""
+    df = make_frame(seed, n=n)
+    rng = np.random.default_rng(seed + 100)
+    df["Signal"] = np.where(df["Signal"] == -1, np.where(rng.random(n) < 0.1, -1, 0), df["Signal"])
+    # ATR 预热期内止损/止盈价为 NaN, 在其中开仓的持仓永远不会被强制平仓
+    df.iloc[:20, df.columns.get_loc("Signal")] = 0
+    return df
+
+
+def kernel_inputs(df: pd.DataFrame):
+    df = RiskManager().calculate_atr_exits(df)
+    return [df[c].to_numpy(dtype=np.float64) for c in ("Signal", "Close", "Initial_SL", "Initial_TP")]
+
+
+def assert_outputs_match(out: dict, expected: pd.DataFrame):
+    for col in KERNEL_OUTPUTS[1:]:
+        np.testing.assert_allclose(out[col], expected[col].to_numpy(dtype=np.float64),
+                                   rtol=1e-12, atol=0, equal_nan=True, err_msg=col)
+
+
+@pytest.mark.parametrize("seed", range(4))
+def test_run_matches_legacy_loop(seed):
+    df = make_stop_frame(seed) if seed % 2 else make_frame(seed, n=400)
+    expected = legacy_run(df, pos_size=0.6)
+    results = BacktestEngine(initial_capital=CAPITAL, commission=COMMISSION).run("A", df, pos_size=0.6)
+    pd.testing.assert_frame_equal(results, expected, check_dtype=False, check_freq=False)
+
+
+@pytest.mark.parametrize("kernel", [
+    kernels._backtest_kernel_numpy,
+    pytest.param(kernels._backtest_kernel_jit, marks=pytest.mark.skipif(
+        not kernels.HAS_NUMBA, reason="numba 未安装")),
+])
+def test_kernels_match_legacy_loop(kernel):
+    df = make_stop_frame(3)
+    expected = legacy_run(df, pos_size=0.6)
+    out = dict(zip(KERNEL_OUTPUTS, kernel(*kernel_inputs(df), 0.6, COMMISSION, CAPITAL)))
+    assert_outputs_match(out, expected)
+    np.testing.assert_array_equal(out["Position"], expected["Position"])
+    assert (out["Exit"] == -1).any()
+
+
+@pytest.mark.parametrize("use_numba", [False, pytest.param(True, marks=pytest.mark.skipif(
+    not kernels.HAS_NUMBA, reason="numba 未安装"))])
+def test_carry_chunks_match_legacy_loop(monkeypatch, use_numba):
+    monkeypatch.setattr(kernels, "HAS_NUMBA", use_numba)
+    df = make_stop_frame(5)
+    expected = legacy_run(df, pos_size=1.0)
+    inputs = kernel_inputs(df)
+
+    carry, parts = new_carry(), []
+    for lo in range(0, len(df), 57):
+        chunk = [a[lo:lo + 57] for a in inputs]
+        parts.append(backtest_kernel(*chunk, pos_size=1.0, commission=COMMISSION,
+                                     initial_capital=CAPITAL, carry=carry))
+    out = {col: np.concatenate([p[col] for p in parts]) for col in KERNEL_OUTPUTS}
+    assert_outputs_match(out, expected)
+
+
+def test_batch_kernel_matches_single():
+    frames = [make_stop_frame(seed, n=300) for seed in range(3)]
+    inputs = [kernel_inputs(df) for df in frames]
+    sizes = [0.3, 0.6, 1.0]
+    batch = backtest_kernel_batch(*(np.column_stack(arrays) for arrays in zip(*inputs)),
+                                  pos_size=sizes, commission=COMMISSION, initial_capital=CAPITAL)
+    for j, (arrays, size) in enumerate(zip(inputs, sizes)):
+        single = backtest_kernel(*arrays, pos_size=size, commission=COMMISSION, initial_capital=CAPITAL)
+        for col in KERNEL_OUTPUTS:
+            np.testing.assert_array_equal(batch[col][:, j], single[col], err_msg=col)
@@ -0,0 +1,41 @@
+import os
+
+from machine_learning.model_registry import ModelRegistry
+
+
+def save_models(registry: ModelRegistry, symbol: str, n: int) -> list:
+    """依次保存 n 个模型, 修改时间递增"""
+    keys = []
+    for i in range(n):
+        key = f"{symbol}-{i}"
+        registry.save(key, {"i": i}, meta={"symbol": symbol})
+        os.utime(registry._path(key), (1_000_000 + i, 1_000_000 + i))
+        keys.append(key)
+    return keys
+
+
+def test_save_keeps_latest_per_symbol(tmp_path):
+    registry = ModelRegistry(str(tmp_path), keep_per_symbol=2)
+    keys = save_models(registry, "AAA", 4)
+    other = save_models(registry, "BBB", 1)
+
+    assert [registry.has(k) for k in keys] == [False, False, True, True]
+    assert not os.path.exists(tmp_path / f"{keys[0]}.json")
+    assert registry.has(other[0])
+
+
+def test_load_refreshes_recency(tmp_path):
+    registry = ModelRegistry(str(tmp_path), keep_per_symbol=2)
+    keys = save_models(registry, "AAA", 2)
+    assert registry.load(keys[0]) == {"i": 0}
+
+    registry.save("AAA-new", {"i": 2}, meta={"symbol": "AAA"})
+    assert registry.has(keys[0]) and not registry.has(keys[1])
+
+
+def test_prune_sees_models_from_earlier_runs(tmp_path):
+    keys = save_models(ModelRegistry(str(tmp_path), keep_per_symbol=None), "AAA", 3)
+    registry = ModelRegistry(str(tmp_path), keep_per_symbol=1)
+
+    assert sorted(registry.prune("AAA")) == keys[:2]
+    assert registry.has(keys[2])
@@ -0,0 +1,66 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from indicators import native
+from indicators.plan import IndicatorPlan
+
+
+def series_with_nans(nan_rows, n=100, seed=0):
+    x = 100 + np.cumsum(np.random.default_rng(seed).normal(0, 1, n))
+    x[list(nan_rows)] = np.nan
+    return x
+
+
+@pytest.mark.parametrize("nan_rows", [[], [5], list(range(3)), [40, 41, 90]])
+@pytest.mark.parametrize("window", [1, 5, 20])
+def test_rolling_sum_and_std_match_pandas(nan_rows, window):
+    x = series_with_nans(nan_rows)
+    s = pd.Series(x)
+    np.testing.assert_allclose(native.rolling_sum(x, window), s.rolling(window).sum(), rtol=1e-9)
+    np.testing.assert_allclose(native.rolling_std(x, window), s.rolling(window).std(ddof=0),
+                               rtol=1e-7, atol=1e-9)
+
+
+def test_rolling_sum_nan_only_in_windows_containing_it():
+    x = series_with_nans([5])
+    out = native.rolling_sum(x, 20)
+    # 冷启动 19 行 + 包含第 5 行的 20 个窗口中落在冷启动之后的 6 个
+    assert np.isnan(out).sum() == pd.Series(x).rolling(20).sum().isna().sum() == 25
+
+
+def pandas_ema(x: np.ndarray, length: int) -> pd.Series:
+    """pandas_ta.ema 的写法: 前 length 个值的均值作种子, 再 ewm(adjust=False)"""
+    s = pd.Series(x)
+    start = s.first_valid_index()
+    tail = s.loc[start:].copy()
+    seed = tail.iloc[:length].mean()
+    tail.iloc[:length - 1] = np.nan
+    tail.iloc[length - 1] = seed
+    return tail.ewm(span=length, adjust=False).mean().reindex(s.index)
+
+
+@pytest.mark.parametrize("nan_rows", [[], list(range(3)), [40], [40, 41, 90]])
+def test_ema_and_rma_skip_interior_nans_like_pandas(nan_rows):
+    x = series_with_nans(nan_rows)
+    np.testing.assert_allclose(native.ema(x, 12), pandas_ema(x, 12), rtol=1e-12)
+    np.testing.assert_allclose(native.rma(x, 14),
+                               pd.Series(x).ewm(alpha=1 / 14, min_periods=14).mean(), rtol=1e-12)
+    # 中间的缺失值不会让之后的结果全部变成 NaN
+    assert not np.isnan(native.ema(x, 12)[-5:]).any()
+
+
+def test_plan_rsi_and_macd_match_pandas_formulas():
+    close = series_with_nans([], n=300)
+    out = IndicatorPlan().add_rsi([14]).add_macd().evaluate(lambda col: close)
+
+    change = pd.Series(close).diff()
+    up = change.clip(lower=0).ewm(alpha=1 / 14, min_periods=14).mean()
+    down = change.clip(upper=0).ewm(alpha=1 / 14, min_periods=14).mean()
+    np.testing.assert_allclose(out["RSI_14"], 100 * up / (up + down.abs()), rtol=1e-12)
+
+    line = pandas_ema(close, 12) - pandas_ema(close, 26)
+    signal = pandas_ema(line.to_numpy(), 9)
+    np.testing.assert_allclose(out["MACD_line"], line, rtol=1e-12)
+    np.testing.assert_allclose(out["MACD_signal"], signal, rtol=1e-12)
+    np.testing.assert_allclose(out["MACD_hist"], line - signal, rtol=1e-12, atol=1e-12)
@@ -0,0 +1,28 @@
+import pandas as pd
+import pytest
+
+from core.backtest_engine import BacktestEngine
+from core.optimizer import ParameterSweep
+from strategies.base import BaseStrategy
+from strategies.simple_strategy import MaRsiStrategy
+from tests.test_backtest_engine import make_frame
+
+
+class _NoSweepStrategy(BaseStrategy):
+    def on_data(self, symbol: str, df: pd.DataFrame) -> pd.DataFrame:
+        return df
+
+
+def test_sweep_rejects_strategy_without_sweep_support():
+    sweeper = ParameterSweep(BacktestEngine())
+    with pytest.raises(ValueError, match="不支持向量化参数扫描"):
+        sweeper.run_universe(_NoSweepStrategy("no_sweep", ["A"]), {"A": make_frame(0)}, {})
+
+
+def test_sweep_runs_supported_strategy():
+    sweeper = ParameterSweep(BacktestEngine())
+    strategy = MaRsiStrategy(["A", "B"])
+    data = {"A": make_frame(0), "B": make_frame(1)}
+    table = sweeper.run_universe(strategy, data, {"sma_short": [5, 10], "sma_long": [30]})
+    assert len(table) == 4
+    assert table["Sharpe Ratio"].is_monotonic_decreasing
@@ -0,0 +1,50 @@
+import numpy as np
+import pandas as pd
+
+from core.risk_manager import RiskManager
+from tests.test_backtest_engine import make_frame
+
+
+def legacy_true_range(df: pd.DataFrame) -> pd.Series:
+    high_low = df["High"] - df["Low"]
+    high_cp = np.abs(df["High"] - df["Close"].shift())
+    low_cp = np.abs(df["Low"] - df["Close"].shift())
+    return pd.concat([high_low, high_cp, low_cp], axis=1).max(axis=1)
+
+
+def legacy_atr(df: pd.DataFrame) -> pd.Series:
+    """重构前的补算口径: 真实波幅的 14 日简单移动平均"""
+    return legacy_true_range(df).rolling(window=14).mean()
+
+
+def test_default_fallback_keeps_legacy_sma_atr():
+    df = make_frame(0)
+    out = RiskManager().calculate_atr_exits(df)
+    expected = legacy_atr(df)
+    np.testing.assert_allclose(out["ATR"], expected, rtol=1e-10)
+    np.testing.assert_allclose(out["Initial_SL"], df["Close"] - 2.0 * expected, rtol=1e-10)
+    np.testing.assert_allclose(out["Initial_TP"], df["Close"] + 3.0 * expected, rtol=1e-10)
+
+
+def test_wilder_is_opt_in_and_reuses_calculator_column():
+    df = make_frame(0)
+    wilder = RiskManager(atr_method="wilder")
+    assert wilder.atr_col == "ATR_14"
+    # pandas_ta.atr 的写法: 首行真实波幅为 NaN, Wilder 平滑
+    tr = legacy_true_range(df)
+    tr.iloc[0] = np.nan
+    expected = tr.ewm(alpha=1 / 14, min_periods=14).mean()
+    np.testing.assert_allclose(wilder.calculate_atr_exits(df)["ATR_14"], expected, rtol=1e-12)
+
+    # 默认口径不会误用 Wilder 的 ATR_14 列
+    df["ATR_14"] = expected
+    np.testing.assert_allclose(RiskManager().calculate_atr_exits(df)["ATR"], legacy_atr(df), rtol=1e-10)
+
+
+def test_panel_matches_single_symbol():
+    frames = [make_frame(0), make_frame(1)]
+    rm = RiskManager()
+    stack = lambda col: np.column_stack([f[col].to_numpy() for f in frames])
+    atr, sl, tp = rm.calculate_atr_exits_panel(stack("Close"), stack("High"), stack("Low"))
+    for j, f in enumerate(frames):
+        np.testing.assert_allclose(atr[:, j], legacy_atr(f), rtol=1e-10)
@@ -0,0 +1,69 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from core.backtest_engine import TRADE_METRICS, BacktestEngine
+from core.portfolio_engine import PortfolioEngine
+from core.trades import extract_trades, trade_metrics
+from tests.test_backtest_engine import make_frame
+
+
+def brute_force_trades(results: pd.DataFrame) -> list:
+    """逐根 K 线扫描持仓, 作为 extract_trades 的参照"""
+    position = results["Position"].fillna(0).to_numpy() > 0
+    close, high, low = (results[c].to_numpy() for c in ("Close", "High", "Low"))
+    cum = results["Cumulative_Return"].to_numpy()
+    trades, entry = [], None
+    for i in range(len(results) + 1):
+        held = i < len(results) and position[i]
+        if held and entry is None:
+            entry = i
+        elif not held and entry is not None:
+            exit_ = min(i, len(results) - 1)
+            before = cum[entry - 1] if entry > 0 else 1.0
+            window = slice(entry + 1, exit_ + 1)
+            trades.append({
+                "Entry_Index": entry, "Exit_Index": exit_,
+                "Return": cum[exit_] / before - 1, "Holding": exit_ - entry,
+                "MAE": min(0.0, low[window].min() / close[entry] - 1) if exit_ > entry else 0.0,
+                "MFE": max(0.0, high[window].max() / close[entry] - 1) if exit_ > entry else 0.0,
+                "Open": i == len(results),
+            })
+            entry = None
+    return trades
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_extract_trades_matches_brute_force(seed):
+    results = BacktestEngine(commission=0.001).run("A", make_frame(seed), pos_size=0.7)
+    # 第一根即持仓、最后仍持仓的边界情况
+    if seed % 2:
+        results.loc[results.index[:3], "Position"] = 1
+        results.loc[results.index[-4:], "Position"] = 1
+
+    expected = pd.DataFrame(brute_force_trades(results))
+    trades = extract_trades(results)
+    assert len(trades) == len(expected) > 0
+    pd.testing.assert_frame_equal(trades[expected.columns], expected, check_dtype=False)
+
+    ret = expected["Return"]
+    t = trade_metrics(trades)
+    assert t["count"] == len(ret)
+    assert t["win_rate"] == pytest.approx((ret > 0).mean())
+    assert t["profit_factor"] == pytest.approx(ret[ret > 0].sum() / -ret[ret < 0].sum())
+    assert t["expectancy"] == pytest.approx(ret.mean())
+
+
+def test_no_position_yields_empty_trades():
+    trades = extract_trades(pd.DataFrame({"Close": [1.0, 2.0]}))
+    assert trades.empty
+    assert trade_metrics(trades)["count"] == 0
+
+
+def test_portfolio_metrics_report_na_trade_stats():
+    signals = {s: make_frame(i) for i, s in enumerate(["A", "B", "C"])}
+    results = PortfolioEngine(initial_capital=100000).run_portfolio_matrix(signals)
+    m = BacktestEngine().calculate_advanced_metrics("PORTFOLIO_TOTAL", results)
+
+    assert all(m[k] == "N/A" for k in TRADE_METRICS)
+    assert m["Total Return"].endswith("%")
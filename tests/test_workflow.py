@@ -0,0 +1,11 @@
+import pytest
+
+from core.workflow import WorkflowManager
+from strategies.ml_strategy import MLStrategy
+
+
+def test_stream_backtest_rejects_strategies_that_train_in_on_data():
+    # 检查发生在读取配置与数据之前, 不需要完整初始化
+    flow = WorkflowManager.__new__(WorkflowManager)
+    with pytest.raises(ValueError, match="不支持流式回测"):
+        flow.run_stream_backtest(MLStrategy(symbols=["AAA"]))
@@ -1,4 +1,5 @@
 import os
+from concurrent.futures import ProcessPoolExecutor
 
 import yaml
 
@@ -15,3 +16,32 @@ def load_config(config_name="settings.yaml"):
     with open(config_path, 'r', encoding='utf-8') as f:
         config = yaml.safe_load(f)
     return config
+
+
+def resolve_workers(workers) -> int:
+    """
+    解析并行进程数配置
+    :param workers: 1 或 None 为串行, -1 表示使用全部 CPU 核心
+    """
+    if workers is None:
+        return 1
+    workers = int(workers)
+    if workers < 0:
+        return os.cpu_count() or 1
+    return max(workers, 1)
+
+
+def parallel_map(func, arg_tuples, workers=1) -> list:
+    """
+    对每组参数调用 func(*args), 结果顺序与输入顺序一致 (保证串行/并行输出相同)
+    :param func: 模块级函数 (需可被 pickle)
+    :param arg_tuples: 参数元组列表
+    :param workers: 进程数, 含义同 resolve_workers
+    """
+    arg_tuples = list(arg_tuples)
+    workers = min(resolve_workers(workers), len(arg_tuples))
+    if workers <= 1:
+        return [func(*args) for args in arg_tuples]
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(func, *zip(*arg_tuples)))